@@ -0,0 +1,238 @@
+import argparse
+import os
+import socket
+import time
+
+import numpy as np
+import pandas as pd
+
+from main import DATA_FILE, TARGET_COLUMN, EVAL_REPORT_FILE, model_input_columns
+from ingest import load_transactions, load_schema_features, schema_dtypes, read_csv_arrow, _apply_dtypes, _read_header, SCHEMA_FILE
+from scoring import RiskScorer, MODEL_FILE, DEFAULT_CHUNK_ROWS, DEFAULT_ID_COLUMNS, DEFAULT_MAX_MISSING_FEATURES
+from preprocessing import PREPROCESSOR_OUTPUT_FILE
+
+#---Global Configuration---
+IPC_OUTPUT_FILE = 'transactions.arrows'
+UNIX_SOCKET_PREFIX = 'unix:'
+HANDOFF_WORK_DIR = 'arrow_handoff'
+# Columns of the Rust ETL `Transaction` batches (src/etl/arrow_export.rs) renamed onto the behavioral
+# schema. The ETL carries only these three model inputs; the rest would get the preprocessor's imputation
+# defaults, so score_file rejects such a stream unless profile features are filled from --profile-warmup
+# and --max-missing-features is raised to accept the remaining gaps.
+ETL_COLUMN_MAP = {
+    'amount': 'tx_amount',
+    'currency': 'currency',
+    'source_account': 'user_id',
+}
+# ETL columns the scorer never reads; dropped before conversion so their bytes are not turned into Python objects
+ETL_SKIPPED_COLUMNS = {'encrypted_payload'}
+
+
+#---Reading---
+# Arrow IPC stream sources: a file path (memory-mapped, so record batch buffers point straight into the
+# page cache; put the file on /dev/shm for a shared-memory handoff) or 'unix:/path/to.sock', where this
+# side listens and the producer connects and streams its batches.
+def open_ipc_stream(source):
+    import pyarrow as pa
+    if source.startswith(UNIX_SOCKET_PREFIX):
+        path = source[len(UNIX_SOCKET_PREFIX):]
+        if os.path.exists(path):
+            os.remove(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(path)
+            server.listen(1)
+            print(f"Waiting for an Arrow IPC producer on {path}")
+            conn, _ = server.accept()
+        finally:
+            server.close()
+            os.remove(path)
+        return pa.ipc.open_stream(conn.makefile('rb'))
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Arrow IPC stream '{source}' not found.")
+    return pa.ipc.open_stream(pa.memory_map(source, 'r'))
+
+
+def batch_to_frame(batch, dtypes, datetime_columns, columns=None):
+    # Column-wise conversion: fixed-width columns without nulls become numpy views over the Arrow
+    # buffers, dictionary columns become categoricals without decoding a Python string per row
+    if any(name in ETL_COLUMN_MAP for name in batch.schema.names):
+        batch = batch.select([name for name in batch.schema.names if name not in ETL_SKIPPED_COLUMNS])
+        batch = batch.rename_columns([ETL_COLUMN_MAP.get(name, name) for name in batch.schema.names])
+    if columns is not None:
+        batch = batch.select([name for name in batch.schema.names if name in columns])
+    df = batch.to_pandas(split_blocks=True)
+    return _apply_dtypes(df, dtypes, datetime_columns)
+
+
+def iter_ipc_frames(source, columns=None, schema_file=SCHEMA_FILE):
+    dtypes, datetime_columns = schema_dtypes(load_schema_features(schema_file))
+    for batch in open_ipc_stream(source):
+        if batch.num_rows:
+            yield batch_to_frame(batch, dtypes, datetime_columns, columns)
+
+
+#---Writing---
+def _ipc_sink(output):
+    import pyarrow as pa
+    if output.startswith(UNIX_SOCKET_PREFIX):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(output[len(UNIX_SOCKET_PREFIX):])
+        return conn.makefile('wb'), conn
+    return pa.OSFile(output, 'wb'), None
+
+
+def export_ipc_stream(data_path=DATA_FILE, output=IPC_OUTPUT_FILE, batch_rows=DEFAULT_CHUNK_ROWS, columns=None):
+    # Python-side producer with the same typed columns as the fast CSV ingest path; used to benchmark the
+    # handoff and to feed the scorer where the Rust exporter is not built
+    import pyarrow as pa
+    dtypes, datetime_columns = schema_dtypes(load_schema_features())
+    usecols = [col for col in _read_header(data_path) if columns is None or col in columns]
+    table = read_csv_arrow(data_path, usecols, {col: dtype for col, dtype in dtypes.items() if col in usecols}, datetime_columns)
+    sink, conn = _ipc_sink(output)
+    try:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=batch_rows)
+    finally:
+        sink.close()
+        if conn is not None:
+            conn.close()
+    return table.num_rows
+
+
+#---CSV vs Arrow IPC Handoff---
+def _arrow_buffer_ranges(batch):
+    return [(buf.address, buf.address + buf.size) for column in batch.columns for buf in column.buffers() if buf is not None]
+
+
+def _column_copies(df, batch):
+    # Columns whose pandas data lives outside the batch's Arrow buffers were copied during conversion
+    ranges = _arrow_buffer_ranges(batch)
+    copied_columns, copied_bytes = 0, 0
+    for col in df.columns:
+        values = df[col].array
+        data = values.codes if isinstance(values, pd.Categorical) else np.asarray(values)
+        address = data.__array_interface__['data'][0]
+        if not any(start <= address < end for start, end in ranges):
+            copied_columns += 1
+            copied_bytes += df[col].memory_usage(index=False, deep=False)
+    return copied_columns, copied_bytes
+
+
+def _score_frames(scorer, frames):
+    scores, rows = [], 0
+    start = time.perf_counter()
+    for df in frames:
+        scores.append(scorer.score_frame(df))
+        rows += len(df)
+    return np.concatenate(scores) if scores else np.empty(0), rows, time.perf_counter() - start
+
+
+def compare_handoff(data_path=DATA_FILE, model_path=MODEL_FILE, preprocessor_path=PREPROCESSOR_OUTPUT_FILE,
+                    batch_rows=DEFAULT_CHUNK_ROWS, work_dir=HANDOFF_WORK_DIR, engine='flat'):
+    # Same rows handed to the scorer twice: written as CSV and re-parsed, or written as an Arrow IPC stream
+    # and read back through a memory map. Producer write, consumer read and scoring are timed separately.
+    import pyarrow as pa
+    print(f"--- Comparing CSV and Arrow IPC handoff of {data_path} ---")
+    os.makedirs(work_dir, exist_ok=True)
+    scorer = RiskScorer.load(model_path, preprocessor_path, n_jobs=1, engine=engine)
+    columns = [col for col in model_input_columns() if col != TARGET_COLUMN] + DEFAULT_ID_COLUMNS
+    dtypes, datetime_columns = schema_dtypes(load_schema_features())
+    source = load_transactions(data_path, columns=columns)
+    rows = len(source)
+    results = {"rows": rows, "columns": source.shape[1], "batch_rows": batch_rows}
+
+    csv_path = os.path.join(work_dir, 'handoff.csv')
+    start = time.perf_counter()
+    source.to_csv(csv_path, index=False)
+    write_s = time.perf_counter() - start
+    start = time.perf_counter()
+    csv_frame = load_transactions(csv_path, columns=columns)
+    read_s = time.perf_counter() - start
+    csv_scores, _, score_s = _score_frames(scorer, (csv_frame[i:i + batch_rows] for i in range(0, rows, batch_rows)))
+    results["csv"] = {
+        "bytes": os.path.getsize(csv_path), "write_s": write_s, "read_s": read_s, "score_s": score_s,
+        # Every value is formatted to text, parsed into Arrow and converted again into pandas
+        "copied_columns": csv_frame.shape[1], "copied_bytes": int(csv_frame.memory_usage(index=False, deep=False).sum()),
+    }
+
+    ipc_path = os.path.join(work_dir, 'handoff.arrows')
+    start = time.perf_counter()
+    table = pa.Table.from_pandas(source, preserve_index=False)
+    with pa.OSFile(ipc_path, 'wb') as sink, pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=batch_rows)
+    write_s = time.perf_counter() - start
+    del table
+    copied_columns = copied_bytes = 0
+    frames = []
+    pool_before = pa.total_allocated_bytes()
+    start = time.perf_counter()
+    for batch in open_ipc_stream(ipc_path):
+        df = batch_to_frame(batch, dtypes, datetime_columns)
+        n_copied, n_bytes = _column_copies(df, batch)
+        copied_columns = max(copied_columns, n_copied)
+        copied_bytes += n_bytes
+        frames.append(df)
+    read_s = time.perf_counter() - start
+    pool_bytes = pa.total_allocated_bytes() - pool_before
+    ipc_scores, _, score_s = _score_frames(scorer, frames)
+    results["ipc"] = {
+        "bytes": os.path.getsize(ipc_path), "write_s": write_s, "read_s": read_s, "score_s": score_s,
+        "copied_columns": copied_columns, "copied_bytes": int(copied_bytes), "arrow_pool_bytes": int(pool_bytes),
+    }
+    results["max_score_difference"] = float(np.max(np.abs(csv_scores - ipc_scores))) if rows else 0.0
+
+    print(f"\n{'Route':<8}{'File MB':>10}{'Write s':>10}{'Read s':>10}{'Score s':>10}{'Rows/s':>14}{'Copied cols':>14}{'Copied MB':>12}")
+    for route in ('csv', 'ipc'):
+        r = results[route]
+        total = r["write_s"] + r["read_s"] + r["score_s"]
+        r["rows_per_sec"] = rows / total if total > 0 else float('inf')
+        print(f"{route:<8}{r['bytes'] / 1e6:>10.1f}{r['write_s']:>10.3f}{r['read_s']:>10.3f}{r['score_s']:>10.3f}"
+              f"{r['rows_per_sec']:>14,.0f}{r['copied_columns']:>9} / {results['columns']:<3}{r['copied_bytes'] / 1e6:>12.1f}")
+    print(f"Largest score difference between routes: {results['max_score_difference']:.2e}")
+    append_handoff_report(results)
+    return results
+
+
+def append_handoff_report(results, report_file=EVAL_REPORT_FILE):
+    print(f"Appending handoff comparison to {report_file}")
+    csv, ipc = results["csv"], results["ipc"]
+    with open(report_file, 'a') as f:
+        f.write(f"\n## ETL Handoff: CSV vs Arrow IPC\n")
+        f.write(f"-**Rows / columns:** {results['rows']} / {results['columns']} (batches of {results['batch_rows']} rows)\n")
+        f.write(f"-**Handoff speedup (write + read):** {(csv['write_s'] + csv['read_s']) / max(ipc['write_s'] + ipc['read_s'], 1e-9):.1f}x\n")
+        f.write(f"-**Largest score difference between routes:** {results['max_score_difference']:.2e}\n")
+        f.write(f"-**Arrow memory pool allocations while reading IPC:** {ipc['arrow_pool_bytes'] / 1e6:.1f} MB\n\n")
+        f.write(f"| Route | File MB | Write (s) | Read (s) | Score (s) | End-to-end rows/s | Columns copied into pandas | Bytes copied (MB) |\n")
+        f.write(f"|---|---|---|---|---|---|---|---|\n")
+        for name, r in (('CSV', csv), ('Arrow IPC (memory-mapped)', ipc)):
+            f.write(f"| {name} | {r['bytes'] / 1e6:.1f} | {r['write_s']:.3f} | {r['read_s']:.3f} | {r['score_s']:.3f} | "
+                    f"{r['rows_per_sec']:,.0f} | {r['copied_columns']} / {results['columns']} | {r['copied_bytes'] / 1e6:.1f} |\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hand transactions to the risk scorer as Arrow IPC record batches.")
+    parser.add_argument('--export', metavar='OUTPUT', help="Write the dataset as an Arrow IPC stream (file path or unix:/socket/path).")
+    parser.add_argument('--score', metavar='SOURCE', help="Score an Arrow IPC stream (file path, or unix:/socket/path to listen on).")
+    parser.add_argument('--compare', action='store_true', help="Benchmark the CSV and Arrow IPC handoff routes.")
+    parser.add_argument('--data', default=DATA_FILE)
+    parser.add_argument('--batch-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per record batch.")
+    parser.add_argument('--output', default='risk_scores.csv', help="Scores file written by --score.")
+    parser.add_argument('--model', default=MODEL_FILE)
+    parser.add_argument('--preprocessor', default=PREPROCESSOR_OUTPUT_FILE)
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='flat')
+    parser.add_argument('--profile-warmup', default=None, metavar='FILE', help="Fill per-user profile features missing from the stream from this transaction file.")
+    parser.add_argument('--max-missing-features', type=int, default=DEFAULT_MAX_MISSING_FEATURES, help="Refuse streams missing more model features than this.")
+    args = parser.parse_args()
+
+    if args.export:
+        n = export_ipc_stream(args.data, args.export, args.batch_rows)
+        print(f"Wrote {n} rows to {args.export} as Arrow IPC record batches of up to {args.batch_rows} rows")
+    if args.score:
+        from scoring import score_file
+        score_file(args.score, args.output, args.model, args.preprocessor, args.batch_rows, n_jobs=1, engine=args.engine,
+                   profile_warmup=args.profile_warmup, max_missing_features=args.max_missing_features)
+    if args.compare:
+        compare_handoff(args.data, args.model, args.preprocessor, args.batch_rows, engine=args.engine)
+    if not (args.export or args.score or args.compare):
+        parser.print_help()
@@ -0,0 +1,240 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+from data_generator import generate_behavioral_data_streaming
+from ingest import load_transactions
+from preprocessing import matrix_nbytes
+from main import TARGET_COLUMN, model_input_columns, build_preprocessor
+from scoring import RiskScorer
+from forest_engine import FlatForest
+
+#---Global Configuration---
+BENCHMARK_RESULTS_FILE = 'benchmark_results.json'
+BENCHMARK_SEED = 1234
+# Dataset sizes swept by the suite: name -> (normal users, anomalous users). Each user has ~20-30 transactions.
+BENCHMARK_SIZES = {
+    'small': (1_000, 100),
+    'medium': (5_000, 500),
+    'large': (20_000, 2_000),
+}
+DEFAULT_SIZES = ['small', 'medium']
+TREE_COUNTS = [10, 50, 100]
+SCORING_BATCH_SIZES = [1, 10, 100, 1_000, 10_000]
+DEFAULT_REPEATS = 3
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+# Absolute slowdowns below this are treated as timer noise, whatever their relative size
+NOISE_FLOOR_SECONDS = 0.001
+
+
+#---Measurement Helpers---
+def _measure(fn, repeats):
+    # Median / min wall time over `repeats` calls; returns the last result as well
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings), min(timings)
+
+
+def _record(results, key, seconds, min_seconds=None, rows=None, **extra):
+    # Every result carries seconds (lower is better); rows_per_sec is added when the step processes rows
+    entry = {"seconds": seconds}
+    if min_seconds is not None:
+        entry["min_seconds"] = min_seconds
+    if rows:
+        entry["rows"] = rows
+        entry["rows_per_sec"] = rows / seconds if seconds > 0 else float('inf')
+    entry.update(extra)
+    results[key] = entry
+    print(f"{key:<52}{seconds * 1000:>12.2f} ms" + (f"{entry['rows_per_sec']:>16,.0f} rows/s" if rows else ""))
+
+
+#---Benchmark Groups---
+def bench_generation(results, size, data_path, num_normal_users, num_anomalous_users):
+    # One single-process run, so rows/sec is comparable across machines with different core counts
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        rows = generate_behavioral_data_streaming(data_path, 'csv', num_normal_users, num_anomalous_users, workers=1, seed=BENCHMARK_SEED)
+        seconds = time.perf_counter() - start
+    _record(results, f"{size}/generation/stream_csv", seconds, rows=rows)
+    return rows
+
+
+def bench_load(results, size, data_path, repeats):
+    raw, seconds, min_seconds = _measure(lambda: pd.read_csv(data_path), repeats)
+    rows = len(raw)
+    del raw
+    _record(results, f"{size}/load/read_csv", seconds, min_seconds, rows=rows)
+    df, seconds, min_seconds = _measure(lambda: load_transactions(data_path, columns=model_input_columns()), repeats)
+    _record(results, f"{size}/load/schema_model_columns", seconds, min_seconds, rows=len(df),
+            memory_mb=df.memory_usage(deep=True).sum() / 1e6)
+    return df
+
+
+def bench_preprocessing(results, size, df, repeats):
+    # The steps of train_evaluate_model, timed separately
+    rows = len(df)
+    _, seconds, min_seconds = _measure(lambda: df.dropna(subset=[TARGET_COLUMN]), repeats)
+    _record(results, f"{size}/preprocess/dropna_target", seconds, min_seconds, rows=rows)
+
+    preprocessor, seconds, min_seconds = _measure(lambda: build_preprocessor().fit(df), repeats)
+    _record(results, f"{size}/preprocess/fit", seconds, min_seconds, rows=rows)
+    block, seconds, min_seconds = _measure(lambda: preprocessor.dense_block(df, impute=False), repeats)
+    _record(results, f"{size}/preprocess/numeric_and_time_features", seconds, min_seconds, rows=rows)
+    _, seconds, min_seconds = _measure(lambda: preprocessor.categorical_block(df), repeats)
+    _record(results, f"{size}/preprocess/categorical_encoding", seconds, min_seconds, rows=rows)
+    _, seconds, min_seconds = _measure(lambda: preprocessor.impute(block.copy()), repeats)
+    _record(results, f"{size}/preprocess/imputation", seconds, min_seconds, rows=rows)
+    X, seconds, min_seconds = _measure(lambda: preprocessor.transform(df), repeats)
+    _record(results, f"{size}/preprocess/transform", seconds, min_seconds, rows=rows, width=X.shape[1], matrix_mb=matrix_nbytes(X) / 1e6)
+
+    y = df[TARGET_COLUMN].to_numpy()
+    split, seconds, min_seconds = _measure(lambda: train_test_split(X, y, test_size=0.25, random_state=42, stratify=y), repeats)
+    _record(results, f"{size}/preprocess/train_test_split", seconds, min_seconds, rows=rows)
+    return preprocessor, split
+
+
+def bench_training(results, size, split, tree_counts):
+    # Fit once per tree count (fits dominate the suite's runtime); also reports seconds per tree
+    X_train, _, y_train, _ = split
+    model = None
+    for n_trees in tree_counts:
+        model = RandomForestClassifier(n_estimators=n_trees, random_state=42, n_jobs=-1)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        seconds = time.perf_counter() - start
+        _record(results, f"{size}/fit/trees_{n_trees}", seconds, rows=X_train.shape[0], seconds_per_tree=seconds / n_trees)
+    return model
+
+
+def bench_scoring(results, size, model, preprocessor, df, batch_sizes, repeats):
+    # End-to-end score_frame (preprocessing + predict_proba) on raw transaction batches
+    engines = {'sklearn': model, 'flat': FlatForest.from_sklearn(model)}
+    for engine, forest in engines.items():
+        scorer = RiskScorer(forest, preprocessor)
+        if engine == 'sklearn':
+            forest.set_params(n_jobs=1)
+        for batch_size in batch_sizes:
+            batch = df.iloc[np.arange(batch_size) % len(df)]
+            calls = max(repeats, min(100, 1_000 // batch_size))
+            timings = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                scorer.score_frame(batch)
+                timings.append(time.perf_counter() - start)
+            timings = np.array(timings)
+            _record(results, f"{size}/score/{engine}/batch_{batch_size}", float(np.median(timings)), float(timings.min()),
+                    rows=batch_size, p95_ms=float(np.percentile(timings, 95) * 1000))
+    model.set_params(n_jobs=-1)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeats=DEFAULT_REPEATS, tree_counts=TREE_COUNTS, batch_sizes=SCORING_BATCH_SIZES, data_dir=None):
+    results = {}
+    work_dir = data_dir or tempfile.mkdtemp(prefix='risk_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    start = time.perf_counter()
+    try:
+        for size in sizes:
+            num_normal_users, num_anomalous_users = BENCHMARK_SIZES[size]
+            print(f"\n--- Benchmark size '{size}' ({num_normal_users} normal / {num_anomalous_users} anomalous users) ---")
+            data_path = os.path.join(work_dir, f"bench_{size}.csv")
+            bench_generation(results, size, data_path, num_normal_users, num_anomalous_users)
+            df = bench_load(results, size, data_path, repeats)
+            preprocessor, split = bench_preprocessing(results, size, df, repeats)
+            model = bench_training(results, size, split, tree_counts)
+            bench_scoring(results, size, model, preprocessor, df, batch_sizes, repeats)
+    finally:
+        if data_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "meta": {
+            "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "total_seconds": time.perf_counter() - start,
+            "seed": BENCHMARK_SEED,
+            "sizes": {size: BENCHMARK_SIZES[size] for size in sizes},
+            "repeats": repeats,
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+#---Baseline Comparison---
+def compare_results(current, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    # Compares every benchmark present in both runs, on the fastest repetition when both runs have one
+    # (less sensitive to background load than the median). Slower by more than `threshold` (relative) and
+    # NOISE_FLOOR_SECONDS (absolute) is a regression. Returns the regressed keys.
+    regressions = []
+    shared = [key for key in current["results"] if key in baseline["results"]]
+    print(f"\n{'Benchmark':<52}{'Baseline ms':>14}{'Current ms':>14}{'Change':>10}")
+    for key in shared:
+        metric = 'min_seconds' if 'min_seconds' in baseline["results"][key] and 'min_seconds' in current["results"][key] else 'seconds'
+        before = baseline["results"][key][metric]
+        after = current["results"][key][metric]
+        change = (after - before) / before if before > 0 else 0.0
+        flag = ''
+        if abs(after - before) < NOISE_FLOOR_SECONDS:
+            pass
+        elif change > threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        elif change < -threshold:
+            flag = '  improved'
+        print(f"{key:<52}{before * 1000:>14.2f}{after * 1000:>14.2f}{change:>+10.1%}{flag}")
+    missing = sorted(set(baseline["results"]) - set(current["results"]))
+    if missing:
+        print(f"{len(missing)} baseline benchmarks were not run: {', '.join(missing[:5])}{' ...' if len(missing) > 5 else ''}")
+    if baseline["meta"].get("platform") != current["meta"].get("platform") or baseline["meta"].get("cpu_count") != current["meta"].get("cpu_count"):
+        print("Warning: baseline was recorded on a different platform; timings may not be comparable.")
+    print(f"\n{len(regressions)} regression(s) over {threshold:.0%} out of {len(shared)} compared benchmarks.")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark data generation, loading, preprocessing, training and scoring.")
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help=f"Comma-separated dataset sizes from {list(BENCHMARK_SIZES)}.")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="Repetitions per timed step (median is reported).")
+    parser.add_argument('--trees', default=','.join(map(str, TREE_COUNTS)), help="Comma-separated tree counts for the fit benchmark.")
+    parser.add_argument('--batch-sizes', default=','.join(map(str, SCORING_BATCH_SIZES)), help="Comma-separated scoring batch sizes.")
+    parser.add_argument('--output', default=BENCHMARK_RESULTS_FILE, help="JSON file the results are written to.")
+    parser.add_argument('--data-dir', default=None, help="Keep generated datasets here instead of a temporary directory.")
+    parser.add_argument('--compare', metavar='BASELINE_JSON', help="Compare against a stored baseline and exit non-zero on regressions.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="Relative slowdown counted as a regression.")
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        sizes=[size for size in args.sizes.split(',') if size], repeats=args.repeats,
+        tree_counts=[int(n) for n in args.trees.split(',') if n], batch_sizes=[int(n) for n in args.batch_sizes.split(',') if n],
+        data_dir=args.data_dir,
+    )
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark results saved to {args.output} ({report['meta']['total_seconds']:.1f}s)")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare_results(report, baseline, args.threshold):
+            sys.exit(1)
@@ -4,6 +4,10 @@ from datetime import datetime, timedelta
 import random
 import os
 import json
+import time
+import argparse
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 
 #---Global Configuration---
 DATA_FILE = 'synthetic_behavioral_data.csv' # Changed filename
@@ -18,6 +22,116 @@ TRANSACTIONS_PER_ANOMALOUS_USER_MEAN = 20 # Can be adjusted
 START_DATE = datetime(2023, 1, 1)
 END_DATE = datetime(2023, 12, 31)
 TARGET_COLUMN = 'risk_flag_manual'
+STREAM_CHUNK_USERS = 10000 # Users per shard in streaming mode; bounds per-process memory
+
+#---Categorical Value Pools---
+# Define common ranges for categorical features
+COMMON_MERCHANTS = [f'merchant_{i}' for i in range(1, 100)]
+COMMON_LOCATIONS = [f'loc_{i}' for i in range(1, 50)]
+COMMON_DEVICES = [f'dev_{i}' for i in range(1, 20)]
+COMMON_IPS = [f'192.168.1.{i}' for i in range(1, 200)] # Smaller range for common IPs
+
+# Define less common/anomalous ranges for categorical features
+ANOMALOUS_MERCHANTS = [f'merchant_{i}' for i in range(50, 150)] # Overlap with common
+ANOMALOUS_LOCATIONS = [f'loc_{i}' for i in range(30, 80)] # Overlap with common
+ANOMALOUS_DEVICES = [f'dev_{i}' for i in range(10, 30)] # Overlap with common
+ANOMALOUS_IPS = [f'10.0.0.{i}' for i in range(1, 100)] + [f'192.168.1.{i}' for i in range(150, 255)] # Mix of new and "risky" common
+
+#---Vectorized Generation Profiles---
+# Parameters of the per-row logic in _generate_behavioral_frame_loop, one profile per user population.
+# Ranges are half-open [low, high) as in np.random.uniform / Generator.integers.
+NORMAL_USER_PROFILE = {
+    "label": 0,
+    "tx_count_mean": TRANSACTIONS_PER_NORMAL_USER_MEAN,
+    "tx_count_std": 10,
+    "avg_amount_range": (50, 800),
+    "std_amount_ratio_range": (0.05, 0.2),
+    "hour_ranges": [(9, 20)],
+    "login_hour_spread": 2,
+    "device_change_range": (0, 0.02),
+    "location_change_range": (0, 0.05),
+    "ip_risk_base_range": (0.01, 0.1),
+    "ip_risk_jitter_range": (0.8, 1.2),
+    "ip_risk_noise": 0.01,
+    "amount_std_jitter_range": (0.8, 1.2),
+    "session_mean": 180,
+    "session_std": 90,
+    "session_min": 30,
+    "geo_mean": 10,
+    "geo_std": 20,
+    "txs_24h_factor_range": (0.8, 1.2),
+    "txs_24h_std": 2,
+    "txs_7d_factor_range": (0.8, 1.2),
+    "txs_7d_std": 5,
+    "currencies": ['PLN', 'EUR', 'USD'],
+    "tx_types": ['purchase', 'transfer', 'withdrawal', 'online_payment'],
+    "primary_pool_prob": 0.9,
+    "categorical_pools": {
+        "merchant_id": (COMMON_MERCHANTS, ANOMALOUS_MERCHANTS),
+        "tx_location": (COMMON_LOCATIONS, ANOMALOUS_LOCATIONS),
+        "device_id": (COMMON_DEVICES, ANOMALOUS_DEVICES),
+        "ip_address": (COMMON_IPS, ANOMALOUS_IPS),
+    },
+    "is_vpn_prob": 0.02,
+    "password_reset_prob": 0.01,
+    "new_device_prob": 0.03,
+    "country_mismatch_prob": 0.01,
+    "anomaly_score_range": (0, 0.3),
+}
+
+ANOMALOUS_USER_PROFILE = {
+    "label": 1,
+    "tx_count_mean": TRANSACTIONS_PER_ANOMALOUS_USER_MEAN,
+    "tx_count_std": 15,
+    "avg_amount_range": (500, 5000),
+    "std_amount_ratio_range": (0.3, 1.0),
+    "hour_ranges": [(0, 9), (20, 24)], # Picked with equal probability
+    "login_hour_spread": 3,
+    "device_change_range": (0.1, 0.8),
+    "location_change_range": (0.2, 0.9),
+    "ip_risk_base_range": (0.2, 0.9),
+    "ip_risk_jitter_range": (0.9, 1.1),
+    "ip_risk_noise": 0.05,
+    "amount_std_jitter_range": (0.8, 1.5),
+    "session_mean": 90,
+    "session_std": 60,
+    "session_min": 5,
+    "geo_mean": 100,
+    "geo_std": 200,
+    "txs_24h_factor_range": (1.0, 3.0),
+    "txs_24h_std": 5,
+    "txs_7d_factor_range": (1.0, 2.0),
+    "txs_7d_std": 10,
+    "currencies": ['PLN', 'EUR', 'USD', 'GBP', 'JPY'],
+    "tx_types": ['purchase', 'transfer', 'withdrawal', 'online_payment', 'international_transfer'],
+    "primary_pool_prob": 0.8,
+    "categorical_pools": {
+        "merchant_id": (ANOMALOUS_MERCHANTS, COMMON_MERCHANTS),
+        "tx_location": (ANOMALOUS_LOCATIONS, COMMON_LOCATIONS),
+        "device_id": (ANOMALOUS_DEVICES, COMMON_DEVICES),
+        "ip_address": (ANOMALOUS_IPS, COMMON_IPS),
+    },
+    "is_vpn_prob": 0.6,
+    "password_reset_prob": 0.3,
+    "new_device_prob": 0.4,
+    "country_mismatch_prob": 0.5,
+    "anomaly_score_range": (0.4, 1.0),
+}
+
+POPULATION_PROFILES = {'normal': NORMAL_USER_PROFILE, 'anomalous': ANOMALOUS_USER_PROFILE}
+
+# All "HH:MM" labels, indexed by hour * 60 + minute, so login patterns are built with one take()
+_LOGIN_TIME_LABELS = np.array([f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)], dtype=object)
+
+#---Generated Dataset Layout---
+GENERATED_DF_COLUMNS = [
+    'session_duration', 'login_time_pattern', 'avg_tx_amount', 'geo_distance_delta',
+    'user_id', 'tx_id', 'timestamp', 'tx_amount', 'currency', 'tx_type', 'merchant_id',
+    'tx_location', 'device_id', 'ip_address', 'is_vpn', 'avg_tx_amount_user', 'std_tx_amount_user',
+    'avg_tx_hour_user', 'device_change_freq', 'location_change_freq', 'txs_last_24h', 'txs_last_7d',
+    'has_recent_password_reset', 'is_new_device', 'tx_hour', 'risk_flag_manual',
+    'anomaly_score_baseline', 'country_mismatch', 'is_weekend', 'ip_risk_score'
+]
 
 #---Feature Schema Definition (unchanged, as the features themselves are the same)---
 FEATURE_SCHEMA_DEFINITIONS = [
@@ -54,26 +168,22 @@ FEATURE_SCHEMA_DEFINITIONS = [
 ]
 
 
-def generate_behavioral_data():
-    print(f"Starting synthetic behavioral data generation to file: {DATA_FILE}")
+def _generate_behavioral_frame_loop(num_normal_users=NUM_NORMAL_USERS, num_anomalous_users=NUM_ANOMALOUS_USERS):
     data = []
     user_id_counter = 1
     tx_id_counter = 1
 
-    # Define common ranges for categorical features
-    common_merchants = [f'merchant_{i}' for i in range(1, 100)]
-    common_locations = [f'loc_{i}' for i in range(1, 50)]
-    common_devices = [f'dev_{i}' for i in range(1, 20)]
-    common_ips = [f'192.168.1.{i}' for i in range(1, 200)] # Smaller range for common IPs
-
-    # Define less common/anomalous ranges for categorical features
-    anomalous_merchants = [f'merchant_{i}' for i in range(50, 150)] # Overlap with common
-    anomalous_locations = [f'loc_{i}' for i in range(30, 80)] # Overlap with common
-    anomalous_devices = [f'dev_{i}' for i in range(10, 30)] # Overlap with common
-    anomalous_ips = [f'10.0.0.{i}' for i in range(1, 100)] + [f'192.168.1.{i}' for i in range(150, 255)] # Mix of new and "risky" common
-
-    print(f"Generating data for {NUM_NORMAL_USERS} normal users...")
-    for _ in range(NUM_NORMAL_USERS):
+    common_merchants = COMMON_MERCHANTS
+    common_locations = COMMON_LOCATIONS
+    common_devices = COMMON_DEVICES
+    common_ips = COMMON_IPS
+    anomalous_merchants = ANOMALOUS_MERCHANTS
+    anomalous_locations = ANOMALOUS_LOCATIONS
+    anomalous_devices = ANOMALOUS_DEVICES
+    anomalous_ips = ANOMALOUS_IPS
+
+    print(f"Generating data for {num_normal_users} normal users...")
+    for _ in range(num_normal_users):
         user_id = f'user_{user_id_counter}'
         user_id_counter += 1
         # Normal user patterns - more consistent, lower risk
@@ -135,8 +245,8 @@ def generate_behavioral_data():
             ])
             tx_id_counter += 1
 
-    print(f"Generating data for {NUM_ANOMALOUS_USERS} anomalous users...")
-    for _ in range(NUM_ANOMALOUS_USERS):
+    print(f"Generating data for {num_anomalous_users} anomalous users...")
+    for _ in range(num_anomalous_users):
         user_id = f'user_{user_id_counter}'
         user_id_counter += 1
         # Anomalous user patterns - more extreme, but with some overlap with normal
@@ -198,16 +308,279 @@ def generate_behavioral_data():
             ])
             tx_id_counter += 1
 
-    generated_df_columns = [
-        'session_duration', 'login_time_pattern', 'avg_tx_amount', 'geo_distance_delta',
-        'user_id', 'tx_id', 'timestamp', 'tx_amount', 'currency', 'tx_type', 'merchant_id',
-        'tx_location', 'device_id', 'ip_address', 'is_vpn', 'avg_tx_amount_user', 'std_tx_amount_user',
-        'avg_tx_hour_user', 'device_change_freq', 'location_change_freq', 'txs_last_24h', 'txs_last_7d',
-        'has_recent_password_reset', 'is_new_device', 'tx_hour', 'risk_flag_manual',
-        'anomaly_score_baseline', 'country_mismatch', 'is_weekend', 'ip_risk_score'
+    return pd.DataFrame(data, columns=GENERATED_DF_COLUMNS)
+
+def draw_transaction_counts(rng, profile, num_users):
+    counts = rng.normal(profile["tx_count_mean"], profile["tx_count_std"], num_users).astype(np.int64)
+    return np.maximum(1, counts)
+
+
+def _pick_from_pools(rng, primary_pool, secondary_pool, primary_prob, n):
+    primary = np.array(primary_pool, dtype=object)
+    secondary = np.array(secondary_pool, dtype=object)
+    from_primary = rng.random(n) < primary_prob
+    primary_values = primary[rng.integers(0, len(primary), n)]
+    secondary_values = secondary[rng.integers(0, len(secondary), n)]
+    return np.where(from_primary, primary_values, secondary_values)
+
+
+# Draws every column for one user population as whole arrays, mirroring the per-row
+# draws of _generate_behavioral_frame_loop. Returns a dict of column name -> array.
+def generate_population_columns(rng, profile, num_users, user_id_start=1, tx_id_start=1, tx_counts=None):
+    if tx_counts is None:
+        tx_counts = draw_transaction_counts(rng, profile, num_users)
+    n = int(tx_counts.sum())
+
+    #---Per-user patterns---
+    avg_amount = rng.uniform(*profile["avg_amount_range"], num_users)
+    std_amount = avg_amount * rng.uniform(*profile["std_amount_ratio_range"], num_users)
+    hour_ranges = profile["hour_ranges"]
+    range_choice = rng.integers(0, len(hour_ranges), num_users)
+    avg_hour = np.empty(num_users, dtype=np.int64)
+    for i, (low, high) in enumerate(hour_ranges):
+        avg_hour = np.where(range_choice == i, rng.integers(low, high, num_users), avg_hour)
+    device_change = rng.uniform(*profile["device_change_range"], num_users)
+    location_change = rng.uniform(*profile["location_change_range"], num_users)
+    ip_risk_base = rng.uniform(*profile["ip_risk_base_range"], num_users)
+
+    # Broadcast user patterns onto their transactions
+    user_index = np.repeat(np.arange(num_users), tx_counts)
+    avg_amount_tx = avg_amount[user_index]
+    std_amount_tx = std_amount[user_index]
+    avg_hour_tx = avg_hour[user_index]
+    counts_tx = tx_counts[user_index].astype(np.float64)
+    user_ids = np.char.add('user_', np.arange(user_id_start, user_id_start + num_users).astype(str)).astype(object)
+
+    #---Per-transaction draws---
+    total_seconds = int((END_DATE - START_DATE).total_seconds())
+    offsets = rng.integers(0, total_seconds + 1, n)
+    timestamps = np.datetime64(START_DATE, 's') + offsets.astype('timedelta64[s]')
+    tx_hour = (offsets % 86400) // 3600
+    is_weekend = ((START_DATE.weekday() + offsets // 86400) % 7 >= 5).astype(np.int64)
+
+    tx_amount = np.maximum(1, rng.normal(avg_amount_tx, std_amount_tx * rng.uniform(*profile["amount_std_jitter_range"], n)))
+    session_duration = np.maximum(profile["session_min"], rng.normal(profile["session_mean"], profile["session_std"], n).astype(np.int64))
+    geo_distance_delta = np.maximum(0, rng.normal(profile["geo_mean"], profile["geo_std"], n))
+
+    spread = profile["login_hour_spread"]
+    login_hour = rng.integers(np.maximum(0, avg_hour_tx - spread), np.minimum(23, avg_hour_tx + spread))
+    login_minute = rng.integers(0, 59, n)
+    login_time_pattern = _LOGIN_TIME_LABELS[login_hour * 60 + login_minute]
+
+    period_years = (END_DATE - START_DATE).days / 365
+    txs_last_24h = rng.normal(counts_tx / (period_years * 24) * rng.uniform(*profile["txs_24h_factor_range"], n), profile["txs_24h_std"]).astype(np.int64)
+    txs_last_7d = rng.normal(counts_tx / (period_years * 7) * rng.uniform(*profile["txs_7d_factor_range"], n), profile["txs_7d_std"]).astype(np.int64)
+
+    currencies = np.array(profile["currencies"], dtype=object)
+    tx_types = np.array(profile["tx_types"], dtype=object)
+    currency = currencies[rng.integers(0, len(currencies), n)]
+    tx_type = tx_types[rng.integers(0, len(tx_types), n)]
+
+    pools = profile["categorical_pools"]
+    primary_prob = profile["primary_pool_prob"]
+    categoricals = {col: _pick_from_pools(rng, primary, secondary, primary_prob, n) for col, (primary, secondary) in pools.items()}
+
+    is_vpn = (rng.random(n) < profile["is_vpn_prob"]).astype(np.int64)
+    has_recent_password_reset = (rng.random(n) < profile["password_reset_prob"]).astype(np.int64)
+    is_new_device = (rng.random(n) < profile["new_device_prob"]).astype(np.int64)
+    country_mismatch = (rng.random(n) < profile["country_mismatch_prob"]).astype(np.int64)
+    noise = profile["ip_risk_noise"]
+    ip_risk_score = np.clip(ip_risk_base[user_index] * rng.uniform(*profile["ip_risk_jitter_range"], n) + rng.uniform(-noise, noise, n), 0.01, 0.99)
+    anomaly_score_baseline = rng.uniform(*profile["anomaly_score_range"], n)
+
+    return {
+        'session_duration': session_duration,
+        'login_time_pattern': login_time_pattern,
+        'avg_tx_amount': avg_amount_tx,
+        'geo_distance_delta': geo_distance_delta,
+        'user_id': user_ids[user_index],
+        'tx_id': np.arange(tx_id_start, tx_id_start + n, dtype=np.int64),
+        'timestamp': timestamps,
+        'tx_amount': tx_amount,
+        'currency': currency,
+        'tx_type': tx_type,
+        'merchant_id': categoricals['merchant_id'],
+        'tx_location': categoricals['tx_location'],
+        'device_id': categoricals['device_id'],
+        'ip_address': categoricals['ip_address'],
+        'is_vpn': is_vpn,
+        'avg_tx_amount_user': avg_amount_tx,
+        'std_tx_amount_user': std_amount_tx,
+        'avg_tx_hour_user': avg_hour_tx,
+        'device_change_freq': device_change[user_index],
+        'location_change_freq': location_change[user_index],
+        'txs_last_24h': txs_last_24h,
+        'txs_last_7d': txs_last_7d,
+        'has_recent_password_reset': has_recent_password_reset,
+        'is_new_device': is_new_device,
+        'tx_hour': tx_hour,
+        'risk_flag_manual': np.full(n, profile["label"], dtype=np.int64),
+        'anomaly_score_baseline': anomaly_score_baseline,
+        'country_mismatch': country_mismatch,
+        'is_weekend': is_weekend,
+        'ip_risk_score': ip_risk_score,
+    }
+
+
+def generate_behavioral_frame_vectorized(rng, num_normal_users=NUM_NORMAL_USERS, num_anomalous_users=NUM_ANOMALOUS_USERS):
+    print(f"Generating data for {num_normal_users} normal users (vectorized)...")
+    normal = generate_population_columns(rng, NORMAL_USER_PROFILE, num_normal_users)
+    print(f"Generating data for {num_anomalous_users} anomalous users (vectorized)...")
+    anomalous = generate_population_columns(
+        rng, ANOMALOUS_USER_PROFILE, num_anomalous_users,
+        user_id_start=num_normal_users + 1, tx_id_start=len(normal['tx_id']) + 1,
+    )
+    return pd.DataFrame({col: np.concatenate([normal[col], anomalous[col]]) for col in GENERATED_DF_COLUMNS})
+
+
+def benchmark_generation(num_normal_users=200, num_anomalous_users=20, seed=42):
+    print(f"\nBenchmarking data generation engines ({num_normal_users} normal / {num_anomalous_users} anomalous users)...")
+    results = {}
+    frames = {}
+    for engine in ['loop', 'vectorized']:
+        start = time.perf_counter()
+        if engine == 'loop':
+            frames[engine] = _generate_behavioral_frame_loop(num_normal_users, num_anomalous_users)
+        else:
+            frames[engine] = generate_behavioral_frame_vectorized(np.random.default_rng(seed), num_normal_users, num_anomalous_users)
+        elapsed = time.perf_counter() - start
+        rows = frames[engine].shape[0]
+        results[engine] = {"rows": rows, "seconds": elapsed, "rows_per_sec": rows / elapsed if elapsed > 0 else float('inf')}
+
+    print(f"\n{'Engine':<12}{'Rows':>10}{'Seconds':>12}{'Rows/sec':>16}")
+    for engine, r in results.items():
+        print(f"{engine:<12}{r['rows']:>10}{r['seconds']:>12.3f}{r['rows_per_sec']:>16,.0f}")
+    print(f"Speedup: {results['vectorized']['rows_per_sec'] / results['loop']['rows_per_sec']:.1f}x")
+
+    # Side-by-side per-class means, as a quick check that both engines draw from the same distributions
+    numeric_cols = frames['loop'].select_dtypes(include='number').columns.drop(['tx_id', TARGET_COLUMN])
+    comparison = pd.concat(
+        {engine: df.groupby(TARGET_COLUMN)[numeric_cols].mean().T for engine, df in frames.items()}, axis=1
+    )
+    print("\nPer-class column means (loop vs vectorized):")
+    print(comparison.round(3).to_string())
+    return results
+
+#---Streaming / Sharded Generation---
+# A shard is a fixed block of STREAM_CHUNK_USERS users from one population. Transaction counts for all
+# users are drawn up front from one seed stream, so every shard knows its user_id/tx_id range before it
+# runs and the output does not depend on how many worker processes generate the shards.
+def _plan_shards(seed, num_normal_users, num_anomalous_users, chunk_users):
+    counts_rng = np.random.default_rng([seed, 0])
+    shards = []
+    user_id_start = 1
+    tx_id_start = 1
+    for population, num_users in [('normal', num_normal_users), ('anomalous', num_anomalous_users)]:
+        tx_counts = draw_transaction_counts(counts_rng, POPULATION_PROFILES[population], num_users)
+        for offset in range(0, num_users, chunk_users):
+            shard_counts = tx_counts[offset:offset + chunk_users]
+            shards.append({
+                "index": len(shards),
+                "population": population,
+                "user_id_start": user_id_start,
+                "tx_id_start": tx_id_start,
+                "tx_counts": shard_counts,
+            })
+            user_id_start += len(shard_counts)
+            tx_id_start += int(shard_counts.sum())
+    return shards
+
+
+def _generate_shard(task):
+    shard = task["shard"]
+    rng = np.random.default_rng([task["seed"], 1, shard["index"]])
+    columns = generate_population_columns(
+        rng, POPULATION_PROFILES[shard["population"]], len(shard["tx_counts"]),
+        user_id_start=shard["user_id_start"], tx_id_start=shard["tx_id_start"], tx_counts=shard["tx_counts"],
+    )
+    df = pd.DataFrame(columns, columns=GENERATED_DF_COLUMNS)
+    if task["output_format"] == 'parquet':
+        df.to_parquet(task["part_path"], index=False)
+    else:
+        df.to_csv(task["part_path"], index=False, header=shard["index"] == 0)
+    return shard["index"], df.shape[0]
+
+
+def generate_behavioral_data_streaming(output_path=DATA_FILE, output_format='csv', num_normal_users=NUM_NORMAL_USERS,
+                                       num_anomalous_users=NUM_ANOMALOUS_USERS, chunk_users=STREAM_CHUNK_USERS,
+                                       workers=None, seed=None):
+    if output_format not in ('csv', 'parquet'):
+        raise ValueError(f"Unknown output format '{output_format}'. Use 'csv' or 'parquet'.")
+    if output_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet output requires the 'pyarrow' package (pip install pyarrow).")
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 63))
+        print(f"No seed given, using seed {seed}")
+    workers = workers or os.cpu_count() or 1
+
+    shards = _plan_shards(seed, num_normal_users, num_anomalous_users, chunk_users)
+    print(f"Streaming {num_normal_users + num_anomalous_users} users in {len(shards)} shards of up to {chunk_users} users "
+          f"to {output_path} ({output_format}, {workers} workers)")
+
+    # CSV shards are written as part files and appended to the output in shard order as they finish;
+    # Parquet output is a directory holding one part file per shard. Both are built under temporary
+    # names, cleared of leftovers from interrupted runs, and renamed over the output only when complete,
+    # so a reader never sees a partial dataset or parts of an earlier one.
+    tmp_output = f"{output_path}.tmp"
+    parts_dir = tmp_output if output_format == 'parquet' else f"{output_path}.parts"
+    part_name = 'part-{:05d}.parquet' if output_format == 'parquet' else 'part-{:05d}.csv'
+    for path in (tmp_output, parts_dir):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    os.makedirs(parts_dir)
+    tasks = [
+        {"seed": seed, "shard": shard, "output_format": output_format, "part_path": os.path.join(parts_dir, part_name.format(shard["index"]))}
+        for shard in shards
     ]
 
-    df = pd.DataFrame(data, columns=generated_df_columns)
+    total_rows = 0
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    results = executor.map(_generate_shard, tasks) if executor else map(_generate_shard, tasks)
+    try:
+        out = open(tmp_output, 'wb') if output_format == 'csv' else None
+        try:
+            for (shard_index, rows), task in zip(results, tasks):
+                if out is not None:
+                    with open(task["part_path"], 'rb') as part:
+                        shutil.copyfileobj(part, out)
+                    os.remove(task["part_path"])
+                total_rows += rows
+                elapsed = time.perf_counter() - start
+                print(f"Shard {shard_index + 1}/{len(shards)}: {rows} rows (total {total_rows}, {total_rows / elapsed:,.0f} rows/sec)")
+        finally:
+            if out is not None:
+                out.close()
+    finally:
+        if executor:
+            executor.shutdown()
+        if output_format == 'csv':
+            shutil.rmtree(parts_dir, ignore_errors=True)
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    elif output_format == 'parquet' and os.path.exists(output_path):
+        os.remove(output_path)
+    os.replace(tmp_output, output_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"Generated {total_rows} rows in {elapsed:.2f}s ({total_rows / elapsed:,.0f} rows/sec) to {output_path}")
+    return total_rows
+
+
+def generate_behavioral_data(engine='loop', seed=None):
+    print(f"Starting synthetic behavioral data generation to file: {DATA_FILE} (engine: {engine})")
+    if engine == 'vectorized':
+        df = generate_behavioral_frame_vectorized(np.random.default_rng(seed))
+    elif engine == 'loop':
+        df = _generate_behavioral_frame_loop()
+    else:
+        raise ValueError(f"Unknown generation engine '{engine}'. Use 'loop' or 'vectorized'.")
+
     print(f"\nSaving data to file: {DATA_FILE}")
     try:
         df.to_csv(DATA_FILE, index=False)
@@ -284,7 +657,30 @@ def update_behavioral_ml_doc():
         print(f"Error occurred while updating documentation: {e}")
 
 if __name__ == "__main__":
-    generate_behavioral_data()
+    parser = argparse.ArgumentParser(description="Generate the synthetic behavioral dataset, schema and docs.")
+    parser.add_argument('--engine', choices=['loop', 'vectorized'], default='loop', help="Row-by-row loop or batched NumPy generation.")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for the vectorized engine's numpy.random.Generator.")
+    parser.add_argument('--benchmark', action='store_true', help="Compare rows/sec of both engines and exit.")
+    parser.add_argument('--stream', action='store_true', help="Generate in sharded chunks across a process pool with bounded memory.")
+    parser.add_argument('--output', default=DATA_FILE, help="Output CSV file, or Parquet directory, for --stream.")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Output format for --stream.")
+    parser.add_argument('--normal-users', type=int, default=NUM_NORMAL_USERS)
+    parser.add_argument('--anomalous-users', type=int, default=NUM_ANOMALOUS_USERS)
+    parser.add_argument('--chunk-users', type=int, default=STREAM_CHUNK_USERS, help="Users per shard for --stream.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes for --stream (default: CPU count).")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_generation(seed=args.seed if args.seed is not None else 42)
+        raise SystemExit(0)
+
+    if args.stream:
+        generate_behavioral_data_streaming(
+            output_path=args.output, output_format=args.format, num_normal_users=args.normal_users,
+            num_anomalous_users=args.anomalous_users, chunk_users=args.chunk_users, workers=args.workers, seed=args.seed,
+        )
+    else:
+        generate_behavioral_data(engine=args.engine, seed=args.seed)
     generate_feature_schema_file()
     update_behavioral_ml_doc()
     print("\nData generation script finished.")
\ No newline at end of file
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+
+#---Global Configuration---
+DRIFT_SKETCH_FILE = 'drift_sketches.json'
+SKETCH_FORMAT_VERSION = 2
+DEFAULT_FEATURE_BINS = 20
+DEFAULT_SCORE_BINS = 10
+# Bin proportions are floored at this before the PSI log ratio, so empty bins do not make it infinite
+PSI_EPSILON = 1e-4
+PSI_WARNING = 0.10
+PSI_ALERT = 0.25
+SCORE_SKETCH = '__score__'
+
+
+# Monitoring windows are saved next to the reference sketch file, never into it, so one run's counts
+# are not carried into the next run's reference
+def window_path(sketch_path=DRIFT_SKETCH_FILE):
+    root, ext = os.path.splitext(sketch_path)
+    return f"{root}.window{ext or '.json'}"
+
+
+#---Drift Statistics---
+# Both work on two count vectors over the same bins, so their cost depends only on the bin count
+def population_stability_index(expected_counts, actual_counts, epsilon=PSI_EPSILON):
+    expected = np.maximum(expected_counts / max(expected_counts.sum(), 1), epsilon)
+    actual = np.maximum(actual_counts / max(actual_counts.sum(), 1), epsilon)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_statistic(expected_counts, actual_counts):
+    # Largest CDF gap at the bin edges: the binned (lower-bound) two-sample Kolmogorov-Smirnov statistic
+    expected = np.cumsum(expected_counts) / max(expected_counts.sum(), 1)
+    actual = np.cumsum(actual_counts) / max(actual_counts.sum(), 1)
+    return float(np.max(np.abs(expected - actual)))
+
+
+def _drift_status(psi):
+    if psi >= PSI_ALERT:
+        return 'alert'
+    return 'warning' if psi >= PSI_WARNING else 'stable'
+
+
+#---Sketches---
+# Fixed-size histograms of the numeric model features and of the risk score. Feature bin edges are
+# training-set quantiles frozen at fit time (scores use equal-width buckets on [0, 1]), with open-ended
+# first and last bins and a separate count of missing values. Memory does not grow with the number of
+# rows seen, and monitors built from the same reference merge by adding counts, so every scoring worker
+# can keep its own and a collector combines them. Each window carries a unique id, and a merged window the
+# ids of everything merged into it, so the same counts can never be added twice.
+class DriftMonitor:
+    def __init__(self, features, matrix_columns, edges, reference_counts, model_version=None):
+        self.features = list(features)
+        # Column of each feature in the preprocessed matrix the scorer builds
+        self.matrix_columns = dict(matrix_columns)
+        self.edges = {name: np.asarray(e, dtype=np.float64) for name, e in edges.items()}
+        self.reference_counts = {name: np.asarray(c, dtype=np.int64) for name, c in reference_counts.items()}
+        self.model_version = model_version
+        self.reset()
+
+    def reset(self):
+        # Starts a new monitoring window; the training reference is kept
+        self.current_counts = {name: np.zeros_like(c) for name, c in self.reference_counts.items()}
+        self.rows_seen = 0
+        self.batches_seen = 0
+        self.window_started_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.window_ids = [uuid.uuid4().hex]
+
+    @staticmethod
+    def _bin_counts(values, edges):
+        # Bins 0..len(edges) hold finite values; the extra last bin counts missing ones (the scorer's
+        # matrix is already imputed, so there imputed values show up as mass at the training mean instead)
+        values = np.asarray(values, dtype=np.float64).ravel()
+        missing = np.isnan(values)
+        bins = np.searchsorted(edges, values[~missing], side='right')
+        counts = np.bincount(bins, minlength=len(edges) + 1)
+        return np.append(counts, missing.sum()).astype(np.int64)
+
+    @staticmethod
+    def _matrix_column(X, index):
+        column = X[:, index]
+        return column.toarray() if hasattr(column, 'toarray') else column
+
+    @classmethod
+    def fit(cls, X, feature_names, features, scores=None, feature_bins=DEFAULT_FEATURE_BINS,
+            score_bins=DEFAULT_SCORE_BINS, model_version=None):
+        # X: preprocessed training matrix (dense or CSR) with columns `feature_names`; scores: held-out
+        # model scores for the score reference (training-set scores of a forest are overconfident)
+        positions = {name: i for i, name in enumerate(feature_names)}
+        features = [name for name in features if name in positions]
+        matrix_columns = {name: positions[name] for name in features}
+        edges, reference_counts = {}, {}
+        quantiles = np.linspace(0, 1, feature_bins + 1)[1:-1]
+        for name in features:
+            values = np.asarray(cls._matrix_column(X, matrix_columns[name]), dtype=np.float64).ravel()
+            finite = values[~np.isnan(values)]
+            # Repeated quantiles (discrete or constant features) collapse into fewer bins
+            edges[name] = np.unique(np.quantile(finite, quantiles)) if finite.size else np.empty(0)
+            reference_counts[name] = cls._bin_counts(values, edges[name])
+        if scores is not None:
+            edges[SCORE_SKETCH] = np.linspace(0, 1, score_bins + 1)[1:-1]
+            reference_counts[SCORE_SKETCH] = cls._bin_counts(scores, edges[SCORE_SKETCH])
+        return cls(features, matrix_columns, edges, reference_counts, model_version)
+
+    def add_reference(self, X, scores=None):
+        # Adds training rows to the reference with the frozen edges, for references built batch by batch
+        # (out-of-core training) or extended with new partitions (incremental training)
+        for name in self.features:
+            self.reference_counts[name] += self._bin_counts(self._matrix_column(X, self.matrix_columns[name]), self.edges[name])
+        if scores is not None and SCORE_SKETCH in self.reference_counts:
+            self.reference_counts[SCORE_SKETCH] += self._bin_counts(scores, self.edges[SCORE_SKETCH])
+
+    def fit_score_reference(self, scores, score_bins=DEFAULT_SCORE_BINS):
+        # Replaces the score reference, e.g. with held-out scores of a retrained model (None drops it, as
+        # the old model's scores say nothing about the new one); starts a new window
+        if scores is None:
+            self.edges.pop(SCORE_SKETCH, None)
+            self.reference_counts.pop(SCORE_SKETCH, None)
+        else:
+            self.edges[SCORE_SKETCH] = np.linspace(0, 1, score_bins + 1)[1:-1]
+            self.reference_counts[SCORE_SKETCH] = self._bin_counts(scores, self.edges[SCORE_SKETCH])
+        self.reset()
+
+    def update(self, X, scores=None):
+        # X: a scored batch as the scorer's preprocessor produced it
+        for name in self.features:
+            self.current_counts[name] += self._bin_counts(self._matrix_column(X, self.matrix_columns[name]), self.edges[name])
+        if scores is not None and SCORE_SKETCH in self.current_counts:
+            self.current_counts[SCORE_SKETCH] += self._bin_counts(scores, self.edges[SCORE_SKETCH])
+        self.rows_seen += X.shape[0]
+        self.batches_seen += 1
+
+    def check_layout(self, feature_names):
+        for name, index in self.matrix_columns.items():
+            if index >= len(feature_names) or feature_names[index] != name:
+                raise ValueError(f"Drift sketch column '{name}' does not match the preprocessor's feature layout.")
+
+    def merge(self, other):
+        # Combines another worker's monitoring window; both must come from the same reference sketch
+        if self.model_version != other.model_version:
+            raise ValueError(f"Cannot merge drift sketches of model version {other.model_version} into version {self.model_version}.")
+        if self.features != other.features or any(not np.array_equal(self.edges[n], other.edges.get(n)) for n in self.edges):
+            raise ValueError("Drift sketches with different features or bin edges cannot be merged.")
+        if any(not np.array_equal(c, other.reference_counts.get(n)) for n, c in self.reference_counts.items()):
+            raise ValueError("Drift sketches with different reference counts cannot be merged.")
+        overlap = set(self.window_ids) & set(other.window_ids)
+        if overlap:
+            raise ValueError(f"Drift window {sorted(overlap)[0]} is already part of this sketch; merging it again would double-count.")
+        for name, counts in other.current_counts.items():
+            self.current_counts[name] += counts
+        self.rows_seen += other.rows_seen
+        self.batches_seen += other.batches_seen
+        self.window_started_at = min(self.window_started_at, other.window_started_at)
+        self.window_ids += other.window_ids
+        return self
+
+    #---Drift Report---
+    def drift(self):
+        rows = []
+        for name in self.features + ([SCORE_SKETCH] if SCORE_SKETCH in self.reference_counts else []):
+            expected, actual = self.reference_counts[name], self.current_counts[name]
+            psi = population_stability_index(expected, actual)
+            rows.append({
+                "feature": 'risk_score' if name == SCORE_SKETCH else name,
+                "bins": len(expected),
+                "psi": psi,
+                "ks": ks_statistic(expected, actual),
+                "status": _drift_status(psi) if actual.sum() else 'no data',
+            })
+        return rows
+
+    #---Persistence---
+    def to_dict(self):
+        return {
+            "format_version": SKETCH_FORMAT_VERSION,
+            "model_version": self.model_version,
+            "features": self.features,
+            "matrix_columns": self.matrix_columns,
+            "edges": {name: e.tolist() for name, e in self.edges.items()},
+            "reference_counts": {name: c.tolist() for name, c in self.reference_counts.items()},
+            "current_counts": {name: c.tolist() for name, c in self.current_counts.items()},
+            "rows_seen": self.rows_seen,
+            "batches_seen": self.batches_seen,
+            "window_started_at": self.window_started_at,
+            "window_ids": self.window_ids,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get("format_version") not in (1, SKETCH_FORMAT_VERSION):
+            raise ValueError(f"Unsupported drift sketch format {state.get('format_version')}.")
+        monitor = cls(state["features"], state["matrix_columns"], state["edges"], state["reference_counts"], state.get("model_version"))
+        monitor.current_counts = {name: np.asarray(c, dtype=np.int64) for name, c in state["current_counts"].items()}
+        monitor.rows_seen = state["rows_seen"]
+        monitor.batches_seen = state["batches_seen"]
+        monitor.window_started_at = state["window_started_at"]
+        # Version 1 files predate window ids; their start time stands in for one
+        monitor.window_ids = list(state.get("window_ids", [state["window_started_at"]]))
+        return monitor
+
+    def save(self, path=DRIFT_SKETCH_FILE):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=DRIFT_SKETCH_FILE):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Drift sketch file '{path}' not found. Please run 'main.py' first.")
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def print_drift(monitor):
+    print(f"\nDrift over {monitor.rows_seen} rows in {monitor.batches_seen} batches since {monitor.window_started_at}:")
+    print(f"{'Feature':<24}{'Bins':>6}{'PSI':>10}{'KS':>8}  Status")
+    for row in monitor.drift():
+        print(f"{row['feature']:<24}{row['bins']:>6}{row['psi']:>10.4f}{row['ks']:>8.4f}  {row['status']}")
+
+
+def append_drift_report(monitor, report_file):
+    print(f"Appending drift monitoring results to {report_file}")
+    with open(report_file, 'a') as f:
+        f.write(f"\n## Feature and Score Drift\n")
+        f.write(f"-**Reference:** model version {monitor.model_version}\n")
+        f.write(f"-**Monitoring window:** {monitor.rows_seen} rows in {monitor.batches_seen} batches since {monitor.window_started_at}\n")
+        f.write(f"-**PSI thresholds:** warning {PSI_WARNING}, alert {PSI_ALERT}\n\n")
+        f.write(f"| Feature | Bins | PSI | KS | Status |\n")
+        f.write(f"|---|---|---|---|---|\n")
+        for row in monitor.drift():
+            f.write(f"| {row['feature']} | {row['bins']} | {row['psi']:.4f} | {row['ks']:.4f} | {row['status']} |\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge per-worker drift sketches and report PSI / KS drift against the training data.")
+    parser.add_argument('sketches', nargs='*', default=[window_path(DRIFT_SKETCH_FILE)], help="Drift window files written by scoring workers.")
+    parser.add_argument('--output', default=None, help="Write the merged sketch to this file.")
+    parser.add_argument('--report', metavar='REPORT_FILE', default=None, help="Append the drift table to this Markdown report.")
+    args = parser.parse_args()
+
+    merged = DriftMonitor.load(args.sketches[0])
+    for path in args.sketches[1:]:
+        merged.merge(DriftMonitor.load(path))
+    print_drift(merged)
+    if args.output:
+        print(f"Merged sketch saved to {merged.save(args.output)}")
+    if args.report:
+        append_drift_report(merged, args.report)
@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from preprocessing import RiskFeatureTransformer
+
+#---Global Configuration---
+DEFAULT_CACHE_DIR = '.feature_cache'
+DEFAULT_MAX_CACHE_BYTES = 2 * 1024 ** 3
+# Bump when the preprocessing code changes in a way that alters the produced matrices
+CACHE_FORMAT_VERSION = 1
+HASH_BLOCK_BYTES = 1 << 20
+FINGERPRINT_INDEX_FILE = 'fingerprints.json'
+ENTRY_META_FILE = 'meta.json'
+
+
+#---Cache Keys---
+def _hash_file(path, digest):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+
+
+def file_fingerprint(path):
+    # Content hash of a data file, or of every file in a partitioned Parquet directory (sorted by path)
+    digest = hashlib.blake2b(digest_size=16)
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+                _hash_file(file_path, digest)
+    else:
+        _hash_file(path, digest)
+    return digest.hexdigest()
+
+
+def cache_key(data_fingerprint, config):
+    # config: JSON-serialisable description of everything that shapes X/y (feature lists, encoding, dtypes)
+    payload = json.dumps({"version": CACHE_FORMAT_VERSION, "data": data_fingerprint, "config": config}, sort_keys=True)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+#---Matrix Cache---
+# Content-addressed store of preprocessed training matrices. Each entry is a directory named by its
+# key holding X as .npy arrays (dense, or the CSR data/indices/indptr triple), y, the fitted
+# preprocessor and a meta.json with the feature names. Arrays are opened with mmap_mode='r', so a hit
+# costs a few page-table entries rather than a read of the whole matrix. When the total size exceeds
+# max_bytes, the least recently used entries are removed.
+class FeatureMatrixCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_bytes)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def fingerprint(self, path):
+        # Hashing a large file on every run would eat much of the saving, so digests are remembered per
+        # (path, size, mtime) and only recomputed when the file changes
+        index_path = os.path.join(self.cache_dir, FINGERPRINT_INDEX_FILE)
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        entry = index.get(os.path.abspath(path))
+        if entry is not None and entry["stat"] == stamp and not os.path.isdir(path):
+            return entry["digest"]
+        digest = file_fingerprint(path)
+        index[os.path.abspath(path)] = {"stat": stamp, "digest": digest}
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+        return digest
+
+    def load(self, key):
+        # Returns (X, y, feature_names, preprocessor) or None on a miss
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, ENTRY_META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        def array(name):
+            return np.load(os.path.join(entry_dir, name + '.npy'), mmap_mode='r')
+
+        if meta["sparse"]:
+            X = sparse.csr_matrix((array('X_data'), array('X_indices'), array('X_indptr')), shape=tuple(meta["shape"]), copy=False)
+        else:
+            X = array('X')
+        y = pd.Series(np.asarray(array('y')), name=meta["target_column"])
+        preprocessor = RiskFeatureTransformer.load(os.path.join(entry_dir, 'preprocessor.pkl'))
+        os.utime(meta_path) # Marks the entry as recently used for eviction
+        return X, y, meta["feature_names"], preprocessor
+
+    def store(self, key, X, y, feature_names, preprocessor, target_column=None):
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        if sparse.issparse(X):
+            X = X.tocsr()
+            arrays = {'X_data': X.data, 'X_indices': X.indices, 'X_indptr': X.indptr}
+        else:
+            arrays = {'X': np.ascontiguousarray(X)}
+        arrays['y'] = np.asarray(y)
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), values)
+        preprocessor.save(os.path.join(tmp_dir, 'preprocessor.pkl'))
+        meta = {
+            "key": key,
+            "sparse": sparse.issparse(X),
+            "shape": list(X.shape),
+            "dtype": str(X.dtype),
+            "feature_names": list(feature_names),
+            "target_column": target_column if target_column is not None else getattr(y, 'name', None),
+            "created_at": time.time(),
+        }
+        with open(os.path.join(tmp_dir, ENTRY_META_FILE), 'w') as f:
+            json.dump(meta, f)
+        # Publish atomically: a concurrent reader sees either no entry or a complete one
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self.evict(keep=key)
+        return entry_dir
+
+    def entries(self):
+        # (key, size in bytes, last used time) of every complete entry, least recently used first
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            meta_path = os.path.join(entry_dir, ENTRY_META_FILE)
+            if not os.path.isdir(entry_dir) or not os.path.exists(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+            entries.append((key, size, os.path.getmtime(meta_path)))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+            removed.append(key)
+        return removed
+
+    def clear(self):
+        for key, _, _ in self.entries():
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the preprocessed feature matrix cache.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--clear', action='store_true', help="Remove every cached entry.")
+    args = parser.parse_args()
+
+    cache = FeatureMatrixCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared feature cache {args.cache_dir}")
+    else:
+        entries = cache.entries()
+        print(f"{len(entries)} cached entries in {args.cache_dir} ({sum(size for _, size, _ in entries) / 1e6:.2f} MB)")
+        for key, size, used_at in entries:
+            print(f"{key}  {size / 1e6:>10.2f} MB  last used {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(used_at))}")
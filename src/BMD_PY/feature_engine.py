@@ -0,0 +1,302 @@
+import argparse
+import math
+import os
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import TIMESTAMP_FORMAT
+
+#---Global Configuration---
+DATA_FILE = 'synthetic_behavioral_data.csv'
+FEATURES_OUTPUT_FILE = 'behavioral_features.csv'
+WINDOW_24H_S = 24 * 3600
+WINDOW_7D_S = 7 * 24 * 3600
+EARTH_RADIUS_KM = 6371.0
+# Synthetic history used by --verify to check backfill amount statistics at full-backfill scale
+PRECISION_CHECK_ROWS = 2_000_000
+PRECISION_CHECK_USERS = 20_000
+PRECISION_CHECK_RTOL = 1e-6
+
+# Features derived from each user's transaction history. Every value describes the history *before*
+# the current event (the event itself is folded into the state afterwards), except geo_distance_delta,
+# which compares the event's location with the previous one.
+ROLLING_FEATURES = [
+    'txs_last_24h',
+    'txs_last_7d',
+    'geo_distance_delta',
+    'device_change_freq',
+    'location_change_freq',
+    'avg_tx_amount_user',
+    'std_tx_amount_user',
+]
+
+
+#---Location Coordinates---
+# The synthetic data only carries location ids (loc_N), so without a real coordinate table each id is
+# mapped to a fixed pseudo-random point on the globe derived from its crc32.
+def hashed_location_coordinates(location):
+    h = zlib.crc32(str(location).encode('utf-8'))
+    lat = (h & 0xFFFF) / 0xFFFF * 130.0 - 60.0
+    lon = (h >> 16) / 0xFFFF * 360.0 - 180.0
+    return lat, lon
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+#---Streaming Engine---
+# Compact per-user state: two timestamp ring buffers (24h and 7d windows), Welford running mean/M2 of
+# amounts, and the previous device/location with running change counters.
+class UserState:
+    __slots__ = ('last_ts', 'last_device', 'last_location', 'last_coords', 'n', 'mean', 'm2',
+                 'device_changes', 'location_changes', 'window_24h', 'window_7d')
+
+    def __init__(self):
+        self.last_ts = None
+        self.last_device = None
+        self.last_location = None
+        self.last_coords = None
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.device_changes = 0
+        self.location_changes = 0
+        self.window_24h = deque()
+        self.window_7d = deque()
+
+
+class UserFeatureEngine:
+    def __init__(self, coordinates=None):
+        # coordinates: optional mapping of location id -> (lat, lon); unknown ids fall back to hashing
+        self.coordinates = coordinates or {}
+        self.users = {}
+        self._coordinate_cache = {}
+
+    def _coords(self, location):
+        coords = self._coordinate_cache.get(location)
+        if coords is None:
+            coords = self.coordinates.get(location) or hashed_location_coordinates(location)
+            self._coordinate_cache[location] = coords
+        return coords
+
+    def update(self, user_id, timestamp, tx_amount, device_id, tx_location):
+        # timestamp in epoch seconds; events of one user must arrive in timestamp order
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = UserState()
+        elif timestamp < state.last_ts:
+            raise ValueError(f"Out-of-order event for user {user_id}: {timestamp} < {state.last_ts}")
+
+        # Expire timestamps that left each window; every timestamp is appended and popped once
+        window_24h, window_7d = state.window_24h, state.window_7d
+        while window_24h and window_24h[0] <= timestamp - WINDOW_24H_S:
+            window_24h.popleft()
+        while window_7d and window_7d[0] <= timestamp - WINDOW_7D_S:
+            window_7d.popleft()
+
+        coords = self._coords(tx_location)
+        n = state.n
+        features = {
+            'txs_last_24h': len(window_24h),
+            'txs_last_7d': len(window_7d),
+            'geo_distance_delta': float(haversine_km(*state.last_coords, *coords)) if n else 0.0,
+            'device_change_freq': state.device_changes / (n - 1) if n >= 2 else 0.0,
+            'location_change_freq': state.location_changes / (n - 1) if n >= 2 else 0.0,
+            'avg_tx_amount_user': state.mean if n else math.nan,
+            'std_tx_amount_user': math.sqrt(state.m2 / n) if n else math.nan,
+        }
+
+        # Fold the event into the state
+        if n:
+            state.device_changes += device_id != state.last_device
+            state.location_changes += tx_location != state.last_location
+        state.n = n + 1
+        delta = tx_amount - state.mean
+        state.mean += delta / state.n
+        state.m2 += delta * (tx_amount - state.mean)
+        window_24h.append(timestamp)
+        window_7d.append(timestamp)
+        state.last_ts = timestamp
+        state.last_device = device_id
+        state.last_location = tx_location
+        state.last_coords = coords
+        return features
+
+    def process_frame(self, df):
+        # Replays a transaction frame through the engine in timestamp order; returns features aligned to df
+        seconds = _epoch_seconds(df['timestamp'])
+        order = np.argsort(seconds, kind='stable')
+        out = {name: np.empty(len(df)) for name in ROLLING_FEATURES}
+        users = df['user_id'].to_numpy()
+        amounts = df['tx_amount'].to_numpy(dtype=np.float64)
+        devices = df['device_id'].to_numpy()
+        locations = df['tx_location'].to_numpy()
+        for i in order:
+            features = self.update(users[i], seconds[i], amounts[i], devices[i], locations[i])
+            for name in ROLLING_FEATURES:
+                out[name][i] = features[name]
+        return pd.DataFrame(out, index=df.index)
+
+
+def _epoch_seconds(timestamps):
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, format=TIMESTAMP_FORMAT)
+    return timestamps.to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+#---Bulk Backfill---
+# Computes the same features over a historical frame with group-wise array operations. Rows are sorted
+# by (user, time); window counts come from a searchsorted over a per-user offset time key, and amount
+# statistics from per-user prefix sums, so no Python code runs per row.
+def _prior_window_counts(key, window):
+    positions = np.arange(len(key))
+    return positions - np.searchsorted(key, key - window, side='right')
+
+
+def backfill_features(df, coordinates=None):
+    seconds = _epoch_seconds(df['timestamp'])
+    time_order = np.argsort(seconds, kind='stable')
+    user_codes = pd.factorize(df['user_id'])[0]
+    order = time_order[np.argsort(user_codes[time_order], kind='stable')]
+
+    users = user_codes[order]
+    t = seconds[order] - seconds.min()
+    amounts = df['tx_amount'].to_numpy(dtype=np.float64)[order]
+    devices = pd.factorize(df['device_id'])[0][order]
+    location_values = df['tx_location'].to_numpy()[order]
+    locations = pd.factorize(location_values)[0]
+
+    new_user = np.ones(len(order), dtype=bool)
+    new_user[1:] = users[1:] != users[:-1]
+    group_start = np.maximum.accumulate(np.where(new_user, np.arange(len(order)), 0))
+    n_prior = np.arange(len(order)) - group_start
+
+    # Window counts: offset each user's times so no window can reach the previous user's events
+    span = int(t.max()) + WINDOW_7D_S + 1 if len(t) else 1
+    key = users.astype(np.int64) * span + t
+    txs_last_24h = _prior_window_counts(key, WINDOW_24H_S)
+    txs_last_7d = _prior_window_counts(key, WINDOW_7D_S)
+
+    # Amount mean / population std over prior events from per-user prefix sums. Amounts are shifted by
+    # each user's first amount first, which leaves the variance unchanged but avoids cancellation. The
+    # prefix sums restart at every user (grouped cumsum), so their rounding error depends on that user's
+    # history only; one running total over all users would carry the error of the whole dataset.
+    def prior_sums(values):
+        return pd.Series(values).groupby(users, sort=False).cumsum().to_numpy() - values
+
+    shifted = amounts - amounts[group_start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shifted_mean = prior_sums(shifted) / n_prior
+        variance = np.maximum(prior_sums(shifted ** 2) / n_prior - shifted_mean ** 2, 0.0)
+        mean = shifted_mean + amounts[group_start]
+    mean[n_prior == 0] = np.nan
+    std = np.sqrt(variance)
+    std[n_prior == 0] = np.nan
+
+    # Change frequencies: changes among prior consecutive pairs / number of prior pairs
+    def prior_change_freq(codes):
+        changed = np.zeros(len(codes))
+        changed[1:] = codes[1:] != codes[:-1]
+        changed[new_user] = 0
+        changes_before = prior_sums(changed)
+        pairs = np.maximum(n_prior - 1, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(pairs > 0, changes_before / pairs, 0.0)
+
+    # Distance from the previous event's location
+    coordinates = coordinates or {}
+    uniques = pd.unique(location_values)
+    lookup = np.array([coordinates.get(loc) or hashed_location_coordinates(loc) for loc in uniques], dtype=np.float64).reshape(-1, 2)
+    coords = lookup[pd.Categorical(location_values, categories=uniques).codes]
+    geo = np.zeros(len(order))
+    geo[1:] = haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    geo[new_user] = 0.0
+
+    result = {
+        'txs_last_24h': txs_last_24h,
+        'txs_last_7d': txs_last_7d,
+        'geo_distance_delta': geo,
+        'device_change_freq': prior_change_freq(devices),
+        'location_change_freq': prior_change_freq(locations),
+        'avg_tx_amount_user': mean,
+        'std_tx_amount_user': std,
+    }
+    out = pd.DataFrame(index=df.index, columns=ROLLING_FEATURES, dtype=np.float64)
+    for name in ROLLING_FEATURES:
+        column = np.empty(len(order))
+        column[order] = result[name]
+        out[name] = column
+    return out
+
+
+def verify_backfill_precision(n_rows=PRECISION_CHECK_ROWS, n_users=PRECISION_CHECK_USERS, rtol=PRECISION_CHECK_RTOL, seed=0):
+    # Large amounts with small per-user spread: prefix sums that ran across users would lose the spread.
+    # A sample of users is checked against np.mean / np.std of their prior amounts computed directly.
+    print(f"Checking backfill amount statistics on {n_rows} synthetic rows of {n_users} users")
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, n_users, n_rows)
+    levels = rng.uniform(1e5, 1e7, n_users)
+    df = pd.DataFrame({
+        'user_id': users,
+        'timestamp': np.datetime64('2024-01-01', 's') + np.sort(rng.integers(0, 365 * 86400, n_rows)),
+        'tx_amount': levels[users] + rng.normal(0.0, 0.05, n_rows),
+        'device_id': 0,
+        'tx_location': 'loc_1',
+    })
+    features = backfill_features(df)
+    worst = 0.0
+    for user in rng.choice(n_users, 50, replace=False):
+        rows = np.flatnonzero(users == user)
+        amounts = df['tx_amount'].to_numpy()[rows]
+        for i in range(2, len(rows)):
+            for name, expected in (('avg_tx_amount_user', np.mean(amounts[:i])), ('std_tx_amount_user', np.std(amounts[:i]))):
+                actual = features[name].iat[rows[i]]
+                error = abs(actual - expected) / abs(expected)
+                worst = max(worst, error)
+                if error > rtol:
+                    raise AssertionError(f"Backfill {name} of user {user} at event {i} is {actual!r}, expected {expected!r} "
+                                         f"(relative error {error:.2e} > {rtol:.0e})")
+    print(f"Backfill amount statistics match within {rtol:.0e} (worst relative error {worst:.2e}).")
+
+
+def compute_rolling_features(input_path=DATA_FILE, output_path=FEATURES_OUTPUT_FILE, mode='backfill', verify=False):
+    print(f"Computing rolling user features for {input_path} (mode: {mode})")
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Data file '{input_path}' not found.")
+    df = pd.read_csv(input_path)
+
+    start = time.perf_counter()
+    features = UserFeatureEngine().process_frame(df) if mode == 'stream' else backfill_features(df)
+    elapsed = time.perf_counter() - start
+    print(f"Computed {len(ROLLING_FEATURES)} features for {len(df)} rows in {elapsed:.2f}s ({len(df) / elapsed:,.0f} rows/sec)")
+
+    if verify:
+        other = backfill_features(df) if mode == 'stream' else UserFeatureEngine().process_frame(df)
+        for name in ROLLING_FEATURES:
+            if not np.allclose(features[name], other[name], equal_nan=True, rtol=1e-9, atol=1e-6):
+                raise AssertionError(f"Streaming and backfill values differ for feature '{name}'")
+        print("Streaming and backfill features match.")
+        verify_backfill_precision()
+
+    for name in ROLLING_FEATURES:
+        df[name] = features[name].to_numpy()
+    df.to_csv(output_path, index=False)
+    print(f"Transactions with derived features saved to {output_path}")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Derive per-user rolling-window features from transaction history.")
+    parser.add_argument('input', nargs='?', default=DATA_FILE)
+    parser.add_argument('--output', default=FEATURES_OUTPUT_FILE)
+    parser.add_argument('--mode', choices=['backfill', 'stream'], default='backfill', help="Vectorized bulk backfill or event-by-event streaming engine.")
+    parser.add_argument('--verify', action='store_true', help="Also run the other mode and check both produce the same features, then check backfill precision on a large synthetic history.")
+    args = parser.parse_args()
+    compute_rolling_features(args.input, args.output, args.mode, args.verify)
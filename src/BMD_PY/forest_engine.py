@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import pickle
+import struct
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+from scipy import sparse
+
+#---Global Configuration---
+MODEL_FILE = 'risk_model.pkl'
+FLAT_MODEL_OUTPUT_FILE = 'risk_model_flat.npz'
+MAPPED_MODEL_OUTPUT_FILE = 'risk_model.rmf'
+MAPPED_MODEL_MAGIC = b'RISKRMF1'
+MAPPED_MODEL_ALIGNMENT = 64
+PREDICT_CHUNK_ROWS = 1024 # Rows traversed together; bounds the (rows x trees) working arrays
+BENCHMARK_BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000]
+
+
+# Array-backed copy of a fitted RandomForestClassifier.
+# Every tree's nodes are concatenated into contiguous arrays (feature index, threshold, child pointers,
+# missing-value direction, normalized leaf class probabilities), and predict_proba walks all trees of a
+# batch at once, one tree level per step. Leaves point back to themselves with an infinite threshold, so
+# a leaf is recognisable from its child pointer alone.
+class FlatForest:
+    ARRAY_FIELDS = ('feature', 'threshold', 'children', 'is_leaf', 'missing_left', 'leaf_values', 'roots', 'classes')
+
+    def __init__(self, feature, threshold, children, is_leaf, missing_left, leaf_values, roots, classes, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        # Left/right pointers interleaved, so the next node is one gather at 2 * node + go_right
+        self.children = children
+        self.is_leaf = is_leaf
+        self.missing_left = missing_left
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.classes = classes
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.ARRAY_FIELDS)
+
+    #---Export---
+    @classmethod
+    def from_sklearn(cls, model):
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left < 0
+            own_index = np.arange(n, dtype=np.int64) + offset
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, own_index, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, own_index, tree.children_right + offset).astype(np.int32))
+            if hasattr(tree, 'missing_go_to_left'):
+                missing.append(np.where(is_leaf, 1, tree.missing_go_to_left).astype(np.bool_))
+            else:
+                missing.append(is_leaf.copy())
+            # Older scikit-learn stores class counts in tree_.value and normalizes them in predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            sums = value.sum(axis=1)
+            if not np.allclose(sums, 1.0):
+                sums[sums == 0.0] = 1.0
+                value = value / sums[:, None]
+            values.append(value)
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+        left = np.concatenate(lefts)
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.column_stack([left, np.concatenate(rights)]).ravel(),
+            is_leaf=left == np.arange(len(left)),
+            missing_left=np.concatenate(missing),
+            leaf_values=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            max_depth=max_depth,
+            n_features=model.n_features_in_,
+        )
+
+    #---Inference---
+    def _apply(self, X):
+        # Leaf node index of every (row, tree) pair for a float32 batch. Only pairs still on an internal
+        # node are stepped, so shallow trees stop costing anything once they reach their leaves.
+        n, n_features = X.shape
+        flat_x = np.ascontiguousarray(X).ravel()
+        has_nan = bool(np.isnan(flat_x).any())
+        nodes = np.tile(self.roots, n)
+        row_offsets = np.repeat(np.arange(n, dtype=np.int32) * n_features, self.n_trees)
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            x = flat_x[row_offsets[active] + self.feature[current]]
+            go_right = ~(x <= self.threshold[current])
+            if has_nan:
+                go_right = np.where(np.isnan(x), ~self.missing_left[current], go_right)
+            current = self.children[2 * current + go_right]
+            nodes[active] = current
+            active = active[~self.is_leaf[current]]
+        return nodes.reshape(n, self.n_trees)
+
+    def predict_proba(self, X, chunk_rows=PREDICT_CHUNK_ROWS):
+        n = X.shape[0]
+        proba = np.zeros((n, self.leaf_values.shape[1]), dtype=np.float64)
+        for start in range(0, n, chunk_rows):
+            chunk = X[start:start + chunk_rows]
+            chunk = chunk.toarray() if sparse.issparse(chunk) else chunk
+            leaves = self._apply(np.asarray(chunk, dtype=np.float32))
+            out = proba[start:start + chunk_rows]
+            # Accumulate tree by tree, in estimator order, exactly as RandomForestClassifier does
+            for t in range(self.n_trees):
+                out += self.leaf_values[leaves[:, t]]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+    #---Persistence---
+    def save(self, path=FLAT_MODEL_OUTPUT_FILE):
+        np.savez(path, max_depth=self.max_depth, n_features=self.n_features, **{name: getattr(self, name) for name in self.ARRAY_FIELDS})
+
+    @classmethod
+    def load(cls, path=FLAT_MODEL_OUTPUT_FILE):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in cls.ARRAY_FIELDS}, max_depth=data['max_depth'], n_features=data['n_features'])
+
+
+
+#---Memory-Mapped Model Format---
+# Layout of a .rmf file: 8-byte magic, little-endian uint64 header length, UTF-8 JSON header, then the
+# raw forest arrays, each starting on a MAPPED_MODEL_ALIGNMENT boundary. The header holds every array's
+# dtype/shape/offset plus the model's feature layout and metadata. Loading maps the file read-only and
+# wraps the arrays as views, so it costs milliseconds regardless of model size and worker processes on
+# one host share the same page-cache pages instead of holding private copies.
+def _align(offset):
+    return (offset + MAPPED_MODEL_ALIGNMENT - 1) // MAPPED_MODEL_ALIGNMENT * MAPPED_MODEL_ALIGNMENT
+
+
+def save_mapped_model(forest, path=MAPPED_MODEL_OUTPUT_FILE, feature_names=None, metadata=None):
+    arrays = {name: np.ascontiguousarray(getattr(forest, name)) for name in FlatForest.ARRAY_FIELDS if name != 'classes'}
+    header = {
+        "format_version": 1,
+        "max_depth": forest.max_depth,
+        "n_features": forest.n_features,
+        "classes": np.asarray(forest.classes).tolist(),
+        "feature_names": list(feature_names) if feature_names is not None else None,
+        "metadata": metadata or {},
+        "arrays": {},
+    }
+    # Offsets depend on the header size, so lay the arrays out until the header length settles
+    header_len = 0
+    while True:
+        offset = _align(len(MAPPED_MODEL_MAGIC) + 8 + header_len)
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset = _align(offset + array.nbytes)
+        encoded = json.dumps(header).encode('utf-8')
+        if len(encoded) == header_len:
+            break
+        header_len = len(encoded)
+
+    with open(path, 'wb') as f:
+        f.write(MAPPED_MODEL_MAGIC)
+        f.write(struct.pack('<Q', header_len))
+        f.write(encoded)
+        for name, array in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(_align(f.tell()))
+
+
+def load_mapped_model(path=MAPPED_MODEL_OUTPUT_FILE):
+    with open(path, 'rb') as f:
+        if f.read(len(MAPPED_MODEL_MAGIC)) != MAPPED_MODEL_MAGIC:
+            raise ValueError(f"'{path}' is not a memory-mapped risk model file.")
+        header_len = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {
+        name: np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=buffer, offset=spec["offset"])
+        for name, spec in header["arrays"].items()
+    }
+    forest = FlatForest(**arrays, classes=np.asarray(header["classes"]), max_depth=header["max_depth"], n_features=header["n_features"])
+    return forest, header
+
+
+def export_flat_forest(model_path=MODEL_FILE, output_path=FLAT_MODEL_OUTPUT_FILE, feature_names=None):
+    print(f"Exporting {model_path} to flat forest arrays: {output_path}")
+    model = joblib.load(model_path)
+    flat = FlatForest.from_sklearn(model)
+    if output_path.endswith('.rmf'):
+        save_mapped_model(flat, output_path, feature_names=feature_names)
+    else:
+        flat.save(output_path)
+    print(f"Exported {flat.n_trees} trees, {len(flat.feature)} nodes, max depth {flat.max_depth} ({flat.nbytes / 1e6:.2f} MB)")
+    return flat
+
+
+def compare_load_times(model_path=MODEL_FILE, mapped_path=MAPPED_MODEL_OUTPUT_FILE):
+    start = time.perf_counter()
+    joblib.load(model_path)
+    joblib_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    load_mapped_model(mapped_path)
+    mapped_seconds = time.perf_counter() - start
+    print(f"Load time: joblib {model_path} {joblib_seconds * 1000:.2f} ms, memory-mapped {mapped_path} {mapped_seconds * 1000:.2f} ms")
+    return joblib_seconds, mapped_seconds
+
+
+#---Benchmark---
+def _time_call(fn, X, repeats):
+    # Latency is timed without tracemalloc, whose allocation hooks would skew it; peak memory comes
+    # from one extra traced call.
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn(X)
+    elapsed = (time.perf_counter() - start) / repeats
+    tracemalloc.start()
+    fn(X)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def benchmark_flat_forest(X, model, batch_sizes=BENCHMARK_BATCH_SIZES, min_repeats=3):
+    flat = FlatForest.from_sklearn(model)
+    print(f"\nModel memory: sklearn pickle {len(pickle.dumps(model)) / 1e6:.2f} MB, flat arrays {flat.nbytes / 1e6:.2f} MB")
+    print(f"\n{'Batch':>8}{'sklearn ms':>14}{'flat ms':>12}{'speedup':>10}{'sklearn peak MB':>18}{'flat peak MB':>15}{'identical':>11}")
+    results = []
+    for batch_size in batch_sizes:
+        idx = np.arange(batch_size) % X.shape[0]
+        batch = X[idx]
+        repeats = max(min_repeats, min(200, 2_000 // batch_size))
+        expected, sk_seconds, sk_peak = _time_call(model.predict_proba, batch, repeats)
+        actual, flat_seconds, flat_peak = _time_call(flat.predict_proba, batch, repeats)
+        identical = bool(np.array_equal(expected, actual))
+        results.append({
+            "batch_size": batch_size,
+            "sklearn_ms": sk_seconds * 1000,
+            "flat_ms": flat_seconds * 1000,
+            "sklearn_peak_bytes": sk_peak,
+            "flat_peak_bytes": flat_peak,
+            "identical": identical,
+            "max_abs_diff": float(np.max(np.abs(expected - actual))),
+        })
+        print(f"{batch_size:>8}{sk_seconds * 1000:>14.3f}{flat_seconds * 1000:>12.3f}{sk_seconds / flat_seconds:>9.1f}x"
+              f"{sk_peak / 1e6:>18.2f}{flat_peak / 1e6:>15.2f}{str(identical):>11}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the risk forest to flat arrays and benchmark the vectorized predictor.")
+    parser.add_argument('--model', default=MODEL_FILE)
+    parser.add_argument('--output', default=FLAT_MODEL_OUTPUT_FILE, help=".npz arrays, or a memory-mapped .rmf model file.")
+    parser.add_argument('--benchmark', metavar='DATA_CSV', help="Benchmark against sklearn on rows of this transaction CSV.")
+    parser.add_argument('--preprocessor', default='risk_preprocessor.pkl')
+    parser.add_argument('--features', default='model_features.json', help="Feature layout stored in .rmf output.")
+    args = parser.parse_args()
+
+    feature_names = None
+    if args.output.endswith('.rmf') and os.path.exists(args.features):
+        with open(args.features) as f:
+            feature_names = json.load(f)
+    export_flat_forest(args.model, args.output, feature_names=feature_names)
+    if args.output.endswith('.rmf'):
+        compare_load_times(args.model, args.output)
+    if args.benchmark:
+        import pandas as pd
+        from preprocessing import RiskFeatureTransformer
+        if not os.path.exists(args.benchmark):
+            raise FileNotFoundError(f"Benchmark data file '{args.benchmark}' not found.")
+        X = RiskFeatureTransformer.load(args.preprocessor).transform(pd.read_csv(args.benchmark))
+        # Single-threaded sklearn so the comparison (and the accumulation order) is deterministic
+        benchmark_flat_forest(X, joblib.load(args.model).set_params(n_jobs=1))
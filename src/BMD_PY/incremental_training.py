@@ -0,0 +1,261 @@
+import argparse
+import copy
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score, precision_score, recall_score
+from sklearn.model_selection import train_test_split
+
+from main import (
+    DATA_FILE,
+    MODEL_OUTPUT_FILE,
+    MODEL_FEATURES_FILE,
+    TARGET_COLUMN,
+    EVAL_REPORT_FILE,
+    NUMERIC_FEATURES_FOR_MODEL,
+    model_input_columns,
+    build_preprocessor,
+)
+from preprocessing import RiskFeatureTransformer, PREPROCESSOR_OUTPUT_FILE
+from ingest import load_transactions
+from forest_engine import FlatForest, save_mapped_model, MAPPED_MODEL_OUTPUT_FILE
+from model_registry import register_version, get_version, model_version, next_version, MODEL_VERSIONS_DIR
+from drift_monitor import DriftMonitor, DRIFT_SKETCH_FILE
+from out_of_core_training import ClassReservoir
+
+#---Global Configuration---
+DEFAULT_TREES_PER_PARTITION = 20
+DEFAULT_HOLDOUT_FRACTION = 0.25
+RANDOM_STATE = 42
+
+
+#---Loading---
+def load_current_model(model_path=MODEL_OUTPUT_FILE, preprocessor_path=PREPROCESSOR_OUTPUT_FILE, features_path=MODEL_FEATURES_FILE):
+    for path in (model_path, preprocessor_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"'{path}' not found. Please run 'main.py' first.")
+    model = joblib.load(model_path)
+    preprocessor = RiskFeatureTransformer.load(preprocessor_path)
+    # New trees must see exactly the columns the existing trees were grown on
+    if os.path.exists(features_path):
+        with open(features_path) as f:
+            if json.load(f) != preprocessor.feature_names_:
+                raise ValueError(f"Feature layout in '{features_path}' does not match preprocessor '{preprocessor_path}'.")
+    if model.n_features_in_ != len(preprocessor.feature_names_):
+        raise ValueError(f"Model expects {model.n_features_in_} features, preprocessor produces {len(preprocessor.feature_names_)}.")
+    return model, preprocessor
+
+
+def split_partition(df, holdout_fraction=DEFAULT_HOLDOUT_FRACTION):
+    # Stratified split of one partition into rows used for new trees and held-out evaluation rows
+    df = df.dropna(subset=[TARGET_COLUMN])
+    if holdout_fraction <= 0:
+        return df, df.iloc[:0]
+    # Stratify when every class has enough rows for both sides (day-style partitions may hold one or none)
+    stratify = df[TARGET_COLUMN] if df[TARGET_COLUMN].value_counts().min() >= 2 else None
+    return train_test_split(df, test_size=holdout_fraction, random_state=RANDOM_STATE, stratify=stratify)
+
+
+def evaluate(model, X, y):
+    proba_full = model.predict_proba(X)
+    proba = proba_full[:, 1]
+    # Labels as model.predict assigns them (argmax: 0.5 ties go to the first class)
+    y_pred = model.classes_[np.argmax(proba_full, axis=1)]
+    try:
+        auc_score = roc_auc_score(y, proba)
+    except ValueError:
+        auc_score = float('nan')
+    return {
+        "roc_auc": float(auc_score),
+        "precision": float(precision_score(y, y_pred, zero_division=0)),
+        "recall": float(recall_score(y, y_pred, zero_division=0)),
+    }
+
+
+#---Warm-Start Growth---
+def grow_forest(model, X, y, n_trees, random_state):
+    # Adds n_trees fitted only on (X, y) to a fitted forest; existing trees are left untouched
+    if len(np.unique(y)) < len(model.classes_):
+        raise ValueError("A partition must contain every target class to grow trees on it.")
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_trees, random_state=random_state)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return model
+
+
+def retire_oldest_trees(model, tree_versions, max_trees):
+    # Trees are appended in training order, so the oldest are at the front of estimators_
+    excess = len(model.estimators_) - max_trees
+    if excess <= 0:
+        return model, tree_versions, 0
+    model.estimators_ = model.estimators_[excess:]
+    model.n_estimators = len(model.estimators_)
+    return model, tree_versions[excess:], excess
+
+
+def retrain_incremental(partitions, trees_per_partition=DEFAULT_TREES_PER_PARTITION, max_trees=None,
+                        holdout_fraction=DEFAULT_HOLDOUT_FRACTION, compare_full=False, versions_dir=MODEL_VERSIONS_DIR):
+    print(f"--- Incremental retraining on {len(partitions)} new partition(s) ---")
+    model, preprocessor = load_current_model()
+    parent = get_version(model_version(model), versions_dir) if model_version(model) is not None else None
+    if parent is None:
+        # Model predates versioning (or comes from another registry): record it as the base version
+        parent = register_version(model, 'full', [DATA_FILE], versions_dir=versions_dir)
+    version = next_version(versions_dir)
+    tree_versions = list(parent["tree_versions"])
+    # Warm-start growth only appends trees, so the parent can share the existing ones
+    parent_model = copy.copy(model)
+    parent_model.estimators_ = list(model.estimators_)
+    print(f"Loaded model version {parent['version']} with {len(model.estimators_)} trees")
+
+    train_parts, holdout_parts = [], []
+    for path in partitions:
+        train_df, holdout_df = split_partition(load_transactions(path, columns=model_input_columns()), holdout_fraction)
+        train_parts.append(train_df)
+        holdout_parts.append(holdout_df)
+
+    # Partitions cut by day or user can miss a class. Like out-of-core training, sampled training rows of
+    # the missing classes from the other new partitions are mixed in; a partition missing a class that no
+    # new partition has is skipped. All of this is decided before the first tree is grown.
+    reservoir = ClassReservoir()
+    for train_df in train_parts:
+        reservoir.update(train_df)
+    fit_parts = []
+    for path, train_df in zip(partitions, train_parts):
+        present = set(train_df[TARGET_COLUMN].unique())
+        missing = [label for label in model.classes_.tolist() if label not in present]
+        if any(label not in reservoir.samples for label in missing):
+            print(f"WARNING: skipping {path}: no new partition has training rows of class(es) {missing}")
+            continue
+        if missing:
+            sampled = reservoir.rows_for(missing)
+            train_df = pd.concat([train_df, sampled])
+            print(f"{path} has no rows of class(es) {missing}; mixed in {len(sampled)} sampled rows from the other partitions")
+        fit_parts.append((path, train_df))
+    if not fit_parts:
+        raise ValueError(f"None of the new partitions can be trained on: no new training rows of class(es) {[label for label in model.classes_.tolist() if label not in reservoir.samples]}.")
+
+    # Drift reference: the parent's feature histograms extended with the new training rows (the
+    # preprocessor is unchanged, so the frozen bin edges still apply)
+    drift_monitor = DriftMonitor.load(DRIFT_SKETCH_FILE) if os.path.exists(DRIFT_SKETCH_FILE) else None
+    if drift_monitor is not None:
+        try:
+            drift_monitor.check_layout(preprocessor.feature_names_)
+        except ValueError:
+            drift_monitor = None
+
+    training_seconds = 0.0
+    for i, (path, train_df) in enumerate(fit_parts):
+        X = preprocessor.transform(train_df)
+        if drift_monitor is None:
+            drift_monitor = DriftMonitor.fit(X, preprocessor.feature_names_, NUMERIC_FEATURES_FOR_MODEL)
+        else:
+            drift_monitor.add_reference(X)
+        start = time.perf_counter()
+        grow_forest(model, X, train_df[TARGET_COLUMN].to_numpy(), trees_per_partition, RANDOM_STATE + version * 1000 + i)
+        seconds = time.perf_counter() - start
+        training_seconds += seconds
+        tree_versions += [version] * trees_per_partition
+        print(f"Added {trees_per_partition} trees fitted on {len(train_df)} rows of {path} in {seconds:.2f}s")
+
+    retired = 0
+    if max_trees:
+        model, tree_versions, retired = retire_oldest_trees(model, tree_versions, max_trees)
+        if retired:
+            print(f"Retired the {retired} oldest trees (forest capped at {max_trees})")
+
+    results = {
+        "version": version,
+        "parent": parent["version"],
+        "partitions": [path for path, _ in fit_parts],
+        "trees_added": trees_per_partition * len(fit_parts),
+        "trees_retired": retired,
+        "n_estimators": len(model.estimators_),
+        "incremental_seconds": training_seconds,
+    }
+    holdout = pd.concat(holdout_parts)
+    if len(holdout):
+        X_holdout, y_holdout = preprocessor.transform(holdout), holdout[TARGET_COLUMN].to_numpy()
+        results["holdout_rows"] = len(holdout)
+        results["parent_metrics"] = evaluate(parent_model, X_holdout, y_holdout)
+        results["incremental_metrics"] = evaluate(model, X_holdout, y_holdout)
+        print(f"Holdout ROC-AUC: parent {results['parent_metrics']['roc_auc']:.4f}, "
+              f"incremental {results['incremental_metrics']['roc_auc']:.4f}")
+        if compare_full:
+            results.update(full_retrain_baseline(train_parts, holdout, len(model.estimators_)))
+
+    print(f"\nSaving model version {version} to {MODEL_OUTPUT_FILE}")
+    register_version(
+        model, 'incremental', [path for path, _ in fit_parts], tree_versions=tree_versions, metrics=results.get("incremental_metrics"),
+        training_seconds=training_seconds, parent=parent["version"], versions_dir=versions_dir,
+    )
+    joblib.dump(model, MODEL_OUTPUT_FILE)
+    save_mapped_model(
+        FlatForest.from_sklearn(model), MAPPED_MODEL_OUTPUT_FILE, feature_names=preprocessor.feature_names_,
+        metadata={"model_type": "RandomForestClassifier", "n_estimators": len(model.estimators_), "target_column": TARGET_COLUMN,
+                  "model_version": version},
+    )
+    # Score reference from the new forest's held-out scores
+    drift_monitor.fit_score_reference(model.predict_proba(X_holdout)[:, 1] if len(holdout) else None)
+    drift_monitor.model_version = version
+    print(f"Drift sketches for version {version} saved to {drift_monitor.save(DRIFT_SKETCH_FILE)}")
+    append_incremental_report(results)
+    return results
+
+
+def full_retrain_baseline(train_parts, holdout, n_estimators):
+    # What the incremental update replaces: refit preprocessing and the whole forest on history + new rows
+    print(f"\nFull retrain baseline on {DATA_FILE} plus the new partitions...")
+    start = time.perf_counter()
+    history = load_transactions(DATA_FILE, columns=model_input_columns()).dropna(subset=[TARGET_COLUMN])
+    df = pd.concat([history] + train_parts, ignore_index=True)
+    preprocessor = build_preprocessor()
+    X = preprocessor.fit_transform(df)
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=RANDOM_STATE, n_jobs=-1)
+    model.fit(X, df[TARGET_COLUMN].to_numpy())
+    seconds = time.perf_counter() - start
+    metrics = evaluate(model, preprocessor.transform(holdout), holdout[TARGET_COLUMN].to_numpy())
+    print(f"Full retrain: {len(df)} rows in {seconds:.2f}s, holdout ROC-AUC {metrics['roc_auc']:.4f}")
+    return {"full_rows": len(df), "full_seconds": seconds, "full_metrics": metrics}
+
+
+def append_incremental_report(results, report_file=EVAL_REPORT_FILE):
+    print(f"Appending incremental retraining results to {report_file}")
+    with open(report_file, 'a') as f:
+        f.write(f"\n## Incremental Retraining (version {results['version']})\n")
+        f.write(f"-**Parent version:** {results['parent']}\n")
+        f.write(f"-**New partitions:** {', '.join(f'`{p}`' for p in results['partitions'])}\n")
+        f.write(f"-**Trees added / retired:** {results['trees_added']} / {results['trees_retired']} "
+                f"(forest now {results['n_estimators']} trees)\n")
+        f.write(f"-**Incremental training time:** {results['incremental_seconds']:.2f}s\n")
+        if "holdout_rows" not in results:
+            f.write(f"\nNo holdout rows were kept, so quality was not compared.\n")
+            return
+        f.write(f"\nEvaluated on {results['holdout_rows']} held-out rows of the new partitions.\n\n")
+        f.write(f"| Model | Training time (s) | ROC-AUC | Precision | Recall |\n")
+        f.write(f"|---|---|---|---|---|\n")
+        rows = [
+            (f"Parent (v{results['parent']})", None, results["parent_metrics"]),
+            (f"Incremental (v{results['version']})", results["incremental_seconds"], results["incremental_metrics"]),
+        ]
+        if "full_metrics" in results:
+            rows.append((f"Full retrain ({results['full_rows']} rows)", results["full_seconds"], results["full_metrics"]))
+        for name, seconds, m in rows:
+            f.write(f"| {name} | {'-' if seconds is None else f'{seconds:.2f}'} | {m['roc_auc']:.4f} | {m['precision']:.4f} | {m['recall']:.4f} |\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grow the trained risk forest with trees fitted on new data partitions.")
+    parser.add_argument('partitions', nargs='+', help="New transaction partitions (CSV or Parquet), oldest first.")
+    parser.add_argument('--trees-per-partition', type=int, default=DEFAULT_TREES_PER_PARTITION)
+    parser.add_argument('--max-trees', type=int, default=None, help="Retire the oldest trees beyond this forest size.")
+    parser.add_argument('--holdout-fraction', type=float, default=DEFAULT_HOLDOUT_FRACTION, help="Share of each partition held out for evaluation.")
+    parser.add_argument('--compare-full', action='store_true', help="Also time a full retrain on all data and compare it in the report.")
+    args = parser.parse_args()
+
+    retrain_incremental(args.partitions, args.trees_per_partition, args.max_trees, args.holdout_fraction, args.compare_full)
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from preprocessing import TIMESTAMP_FORMAT
+
+#---Global Configuration---
+DATA_FILE = 'synthetic_behavioral_data.csv'
+SCHEMA_FILE = 'feature_schema.json'
+
+# Schema type -> load dtype. Integer and boolean columns fall back to float32 when they contain missing values.
+SCHEMA_DTYPES = {
+    'numeric': 'float32',
+    'integer': 'int32',
+    'boolean': 'int8',
+    'categorical': 'category',
+}
+# String subtypes: identifiers and IPs are low-cardinality repeats (category); time patterns are
+# loaded as category too, so their fixed-format parse runs once per distinct value
+STRING_SUBTYPE_DTYPES = {
+    'time': 'category',
+    'IP_address': 'category',
+}
+
+
+def load_schema_features(schema_file=SCHEMA_FILE):
+    if os.path.exists(schema_file):
+        with open(schema_file) as f:
+            return json.load(f)["features"]
+    from data_generator import FEATURE_SCHEMA_DEFINITIONS
+    return FEATURE_SCHEMA_DEFINITIONS
+
+
+def schema_dtypes(schema_features):
+    # Explicit load dtypes per column; datetime columns are parsed separately with a fixed format
+    dtypes = {}
+    datetime_columns = []
+    for feature in schema_features:
+        name, ftype, subtype = feature["name"], feature.get("type"), feature.get("subtype")
+        if ftype == 'string':
+            if subtype == 'datetime':
+                datetime_columns.append(name)
+            else:
+                dtypes[name] = STRING_SUBTYPE_DTYPES.get(subtype, 'category')
+        elif ftype in SCHEMA_DTYPES:
+            dtypes[name] = SCHEMA_DTYPES[ftype]
+    return dtypes, datetime_columns
+
+
+def _read_header(path):
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def _with_nullable_fallback(dtypes):
+    return {col: ('float32' if dtype in ('int8', 'int32') else dtype) for col, dtype in dtypes.items()}
+
+
+def load_transactions(path=DATA_FILE, columns=None, schema_file=SCHEMA_FILE, engine='auto'):
+    # Reads only `columns` (all schema columns when None) with schema dtypes.
+    # engine: 'pyarrow' (multi-threaded CSV reader), 'c' (pandas C parser) or 'auto' (pyarrow when installed).
+    schema_features = load_schema_features(schema_file)
+    dtypes, datetime_columns = schema_dtypes(schema_features)
+
+    if path.endswith('.parquet') or os.path.isdir(path):
+        df = pd.read_parquet(path, columns=columns)
+        return _apply_dtypes(df, dtypes, datetime_columns)
+
+    header = _read_header(path)
+    usecols = [col for col in header if columns is None or col in columns]
+    load_dtypes = {col: dtype for col, dtype in dtypes.items() if col in usecols}
+    if engine == 'auto':
+        try:
+            import pyarrow  # noqa: F401
+            engine = 'pyarrow'
+        except ImportError:
+            engine = 'c'
+
+    if engine == 'pyarrow':
+        return _apply_dtypes(_read_csv_pyarrow(path, usecols, load_dtypes, datetime_columns), dtypes, datetime_columns)
+    try:
+        df = pd.read_csv(path, usecols=usecols, dtype=load_dtypes, engine=engine)
+    except (ValueError, TypeError):
+        # Integer/boolean columns with missing values cannot load as int8/int32
+        df = pd.read_csv(path, usecols=usecols, dtype=_with_nullable_fallback(load_dtypes), engine=engine)
+    return _apply_dtypes(df, dtypes, datetime_columns)
+
+
+def iter_transactions(path=DATA_FILE, chunk_rows=200_000, columns=None, schema_file=SCHEMA_FILE):
+    # Chunked variant of load_transactions for files larger than memory; yields typed DataFrames
+    dtypes, datetime_columns = schema_dtypes(load_schema_features(schema_file))
+    if path.endswith('.parquet') or os.path.isdir(path):
+        import pyarrow.dataset as ds
+        for batch in ds.dataset(path, format='parquet').to_batches(columns=columns, batch_size=chunk_rows):
+            if batch.num_rows:
+                yield _apply_dtypes(batch.to_pandas(), dtypes, datetime_columns)
+        return
+    usecols = [col for col in _read_header(path) if columns is None or col in columns]
+    load_dtypes = _with_nullable_fallback({col: dtype for col, dtype in dtypes.items() if col in usecols})
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=load_dtypes, chunksize=chunk_rows):
+        yield _apply_dtypes(chunk, dtypes, datetime_columns)
+
+
+def arrow_column_types(load_dtypes, datetime_columns, usecols):
+    # Arrow types matching the schema load dtypes: categories are dictionary arrays (they convert to
+    # pandas categoricals), datetimes are second-resolution timestamps
+    import pyarrow as pa
+    arrow_types = {
+        'float32': pa.float32(),
+        'int32': pa.int32(),
+        'int8': pa.int8(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+    }
+    column_types = {col: arrow_types[dtype] for col, dtype in load_dtypes.items()}
+    column_types.update({col: pa.timestamp('s') for col in datetime_columns if col in usecols})
+    return column_types
+
+
+def read_csv_arrow(path, usecols, load_dtypes, datetime_columns):
+    # Arrow's reader is driven directly so column types are fixed up front: categories decode straight
+    # into dictionary arrays, and time patterns stay strings instead of being inferred as time-of-day
+    from pyarrow import csv as pa_csv
+    convert_options = pa_csv.ConvertOptions(
+        column_types=arrow_column_types(load_dtypes, datetime_columns, usecols),
+        include_columns=usecols,
+        timestamp_parsers=[TIMESTAMP_FORMAT],
+        strings_can_be_null=True,
+    )
+    return pa_csv.read_csv(path, convert_options=convert_options)
+
+
+def _read_csv_pyarrow(path, usecols, load_dtypes, datetime_columns):
+    return read_csv_arrow(path, usecols, load_dtypes, datetime_columns).to_pandas()
+
+
+def _apply_dtypes(df, dtypes, datetime_columns):
+    for col in datetime_columns:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], format=TIMESTAMP_FORMAT, errors='coerce')
+    for col, dtype in dtypes.items():
+        if col in df.columns and str(df[col].dtype) != dtype:
+            try:
+                df[col] = df[col].astype(dtype)
+            except (ValueError, TypeError):
+                df[col] = df[col].astype(_with_nullable_fallback({col: dtype})[col])
+    return df
+
+
+#---Load Comparison---
+def _baseline_load(path):
+    # The original train_evaluate_model path: default read_csv plus format-less datetime parsing
+    df = pd.read_csv(path)
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+
+def compare_ingest(path=DATA_FILE, columns=None, schema_file=SCHEMA_FILE):
+    print(f"Comparing load paths for {path}")
+    paths = {
+        'baseline (read_csv + to_datetime)': lambda: _baseline_load(path),
+        'schema dtypes, C parser': lambda: load_transactions(path, columns, schema_file, engine='c'),
+    }
+    try:
+        import pyarrow  # noqa: F401
+        paths['schema dtypes, pyarrow'] = lambda: load_transactions(path, columns, schema_file, engine='pyarrow')
+    except ImportError:
+        print("pyarrow not installed; skipping the pyarrow fast path.")
+
+    results = {}
+    for name, load in paths.items():
+        start = time.perf_counter()
+        df = load()
+        seconds = time.perf_counter() - start
+        results[name] = {"seconds": seconds, "memory_bytes": int(df.memory_usage(deep=True).sum()), "rows": len(df), "columns": df.shape[1]}
+
+    baseline = results['baseline (read_csv + to_datetime)']
+    print(f"\n{'Load path':<38}{'Cols':>6}{'Seconds':>10}{'Memory MB':>12}{'Speedup':>10}{'RAM ratio':>11}")
+    for name, r in results.items():
+        print(f"{name:<38}{r['columns']:>6}{r['seconds']:>10.3f}{r['memory_bytes'] / 1e6:>12.2f}"
+              f"{baseline['seconds'] / r['seconds']:>9.1f}x{r['memory_bytes'] / baseline['memory_bytes']:>10.1%}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Schema-driven transaction loader; compares load time and memory with plain read_csv.")
+    parser.add_argument('input', nargs='?', default=DATA_FILE)
+    parser.add_argument('--schema', default=SCHEMA_FILE)
+    parser.add_argument('--model-columns', action='store_true', help="Only read the model's feature and target columns.")
+    args = parser.parse_args()
+
+    columns = None
+    if args.model_columns:
+        from main import model_input_columns
+        columns = model_input_columns()
+    compare_ingest(args.input, columns, args.schema)
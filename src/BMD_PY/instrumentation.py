@@ -0,0 +1,232 @@
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import time
+import tracemalloc
+
+#---Global Configuration---
+TRACE_OUTPUT_FILE = 'pipeline_trace.json'
+PROFILE_DIR = 'stage_profiles'
+PROFILE_TOP_FUNCTIONS = 15
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def _rss_mb():
+    # Current resident set size; falls back to the peak where /proc is unavailable
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError):
+        return _max_rss_mb()
+
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    scale = 1 if os.uname().sysname == 'Darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+class _StageRecord:
+    __slots__ = ('name', 'path', 'depth', 'start', 'wall_s', 'cpu_s', 'traced_peak', 'traced_start', 'traced_end',
+                 'rss_start_mb', 'rss_end_mb', 'max_rss_mb', 'profile_file', 'profile_top')
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Records wall time, CPU time and memory for named pipeline stages. Stages nest: a stage opened inside
+# another is recorded under the parent's path ("preprocess/transform"). When disabled, stage() returns a
+# shared null context and traced() wrappers call straight through, so instrumented code pays one
+# attribute check per stage.
+class StageTracer:
+    def __init__(self, enabled=False, trace_memory=True, profile_stages=(), profile_dir=PROFILE_DIR):
+        self.enabled = enabled
+        self._stack = []
+        self._started_tracemalloc = False
+        self.configure(enabled, trace_memory, profile_stages, profile_dir)
+
+    def configure(self, enabled=False, trace_memory=True, profile_stages=(), profile_dir=PROFILE_DIR):
+        # Applies new settings in place (instrumented modules hold on to the shared TRACER). Memory tracing
+        # started under the old settings is stopped first and earlier records are dropped; an open stage
+        # may be running a profiler, so reconfiguring inside one is refused.
+        if self._stack:
+            raise RuntimeError(f"Cannot reconfigure stage tracing inside open stage '{self._stack[-1].path}'.")
+        self.stop()
+        self.trace_memory = trace_memory
+        # Stage names (or full paths) to run under cProfile; '*' profiles every top-level stage
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.records = []
+        self._child_peaks = []
+        self._profiling = False
+        self._origin = time.perf_counter()
+        if enabled:
+            self.start()
+        return self
+
+    def start(self):
+        self.enabled = True
+        self._origin = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        return self
+
+    def stop(self):
+        self.enabled = False
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage(name)
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        record = _StageRecord()
+        record.name = name
+        record.path = '/'.join([r.path for r in self._stack[-1:]] + [name]) if self._stack else name
+        record.depth = len(self._stack)
+        record.profile_file = None
+        record.profile_top = None
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # The parent's peak so far is kept before the counter is reset for this stage
+            if self._child_peaks:
+                self._child_peaks[-1] = max(self._child_peaks[-1], peak)
+            tracemalloc.reset_peak()
+            record.traced_start = current
+        else:
+            record.traced_start = None
+        profiler = None
+        if not self._profiling and (name in self.profile_stages or record.path in self.profile_stages
+                                    or ('*' in self.profile_stages and record.depth == 0)):
+            profiler = cProfile.Profile()
+            self._profiling = True
+        self._stack.append(record)
+        self._child_peaks.append(0)
+        record.rss_start_mb = _rss_mb()
+        record.start = time.perf_counter() - self._origin
+        cpu_start = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            record.wall_s = time.perf_counter() - self._origin - record.start
+            record.cpu_s = time.process_time() - cpu_start
+            record.rss_end_mb = _rss_mb()
+            record.max_rss_mb = _max_rss_mb()
+            self._stack.pop()
+            child_peak = self._child_peaks.pop()
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                record.traced_end = current
+                # Highest traced memory while the stage ran, including peaks reached inside child stages
+                record.traced_peak = max(peak, child_peak)
+                if self._child_peaks:
+                    self._child_peaks[-1] = max(self._child_peaks[-1], record.traced_peak)
+            else:
+                record.traced_end = record.traced_peak = None
+            if profiler is not None:
+                self._save_profile(record, profiler)
+            self.records.append(record)
+
+    def _save_profile(self, record, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        record.profile_file = os.path.join(self.profile_dir, record.path.replace('/', '.') + '.prof')
+        profiler.dump_stats(record.profile_file)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        record.profile_top = [line for line in out.getvalue().splitlines() if line.strip()]
+
+    def traced(self, name=None):
+        # Decorator form of stage(); the stage name defaults to the function name
+        def decorator(fn):
+            stage_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self._stage(stage_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    #---Output---
+    def summary(self):
+        # Per stage path, in order of first appearance: call count and summed times; memory is the max over calls
+        rows = {}
+        for record in sorted(self.records, key=lambda r: r.start):
+            row = rows.setdefault(record.path, {"path": record.path, "depth": record.depth, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                "traced_peak_mb": None, "rss_end_mb": 0.0, "max_rss_mb": 0.0})
+            row["calls"] += 1
+            row["wall_s"] += record.wall_s
+            row["cpu_s"] += record.cpu_s
+            if record.traced_peak is not None:
+                row["traced_peak_mb"] = max(row["traced_peak_mb"] or 0.0, record.traced_peak / 1e6)
+            row["rss_end_mb"] = record.rss_end_mb
+            row["max_rss_mb"] = max(row["max_rss_mb"], record.max_rss_mb)
+        return list(rows.values())
+
+    def write_json(self, path=TRACE_OUTPUT_FILE):
+        # Stage records plus the same spans as Chrome trace events (chrome://tracing, Perfetto)
+        trace = {
+            "meta": {"created_at": time.strftime('%Y-%m-%d %H:%M:%S'), "pid": os.getpid(), "trace_memory": self.trace_memory},
+            "stages": [record.as_dict() for record in sorted(self.records, key=lambda r: r.start)],
+            "summary": self.summary(),
+            "traceEvents": [
+                {"name": record.path, "ph": "X", "ts": record.start * 1e6, "dur": record.wall_s * 1e6, "pid": os.getpid(), "tid": 0,
+                 "args": {"cpu_s": record.cpu_s, "traced_peak_bytes": record.traced_peak, "rss_end_mb": record.rss_end_mb}}
+                for record in self.records
+            ],
+        }
+        with open(path, 'w') as f:
+            json.dump(trace, f, indent=2)
+        return path
+
+    def append_report(self, report_file):
+        with open(report_file, 'a') as f:
+            f.write(f"\n## Pipeline Stage Timings\n")
+            f.write(f"| Stage | Calls | Wall time (s) | CPU time (s) | Peak traced MB | RSS at end MB | Max RSS MB |\n")
+            f.write(f"|---|---|---|---|---|---|---|\n")
+            for row in self.summary():
+                name = '&nbsp;&nbsp;' * row["depth"] + row["path"].rsplit('/', 1)[-1]
+                peak = '-' if row["traced_peak_mb"] is None else f"{row['traced_peak_mb']:.2f}"
+                f.write(f"| {name} | {row['calls']} | {row['wall_s']:.3f} | {row['cpu_s']:.3f} | {peak} | "
+                        f"{row['rss_end_mb']:.0f} | {row['max_rss_mb']:.0f} |\n")
+            profiled = [record for record in self.records if record.profile_file]
+            for record in profiled:
+                f.write(f"\n### cProfile: {record.path}\n")
+                f.write(f"Full profile: `{record.profile_file}`\n```\n")
+                f.write('\n'.join(record.profile_top) + '\n')
+                f.write(f"```\n")
+
+
+#---Process-Wide Tracer---
+# Pipeline modules instrument themselves through these helpers; tracing stays off until configure_tracing().
+TRACER = StageTracer()
+
+
+def stage(name):
+    return TRACER.stage(name)
+
+
+def traced(name=None):
+    return TRACER.traced(name)
+
+
+def configure_tracing(enabled=True, trace_memory=True, profile_stages=(), profile_dir=PROFILE_DIR):
+    return TRACER.configure(enabled, trace_memory, profile_stages, profile_dir)
@@ -0,0 +1,394 @@
+import argparse
+import http.client
+import itertools
+import json
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from main import DATA_FILE, TARGET_COLUMN, EVAL_REPORT_FILE
+from scoring import RiskScorer, MODEL_FILE, SCORE_COLUMN
+from scoring_service import DEFAULT_HOST, DEFAULT_PORT
+from preprocessing import PREPROCESSOR_OUTPUT_FILE
+
+#---Global Configuration---
+# TPS targets and durations mirror src/stress_tests/scenarios.rs so both pipelines are driven the same way
+DEFAULT_TARGET_TPS_LOW = 10
+DEFAULT_TARGET_TPS_MID = 30
+DEFAULT_TARGET_TPS_HIGH = 50
+DEFAULT_TEST_DURATION_SECS = 60
+EXTENDED_TEST_DURATION_SECS = 180
+SHORT_BURST_DURATION_SECS = 20
+DEFAULT_REPLAY_ROWS = 50_000
+DEFAULT_CONCURRENCY = 8
+# Requests waiting for a worker beyond this are dropped and counted as errors, so an overloaded target
+# cannot grow the backlog without bound
+MAX_BACKLOG = 10_000
+HISTOGRAM_MAX_LATENCY_US = 60_000_000
+HISTOGRAM_SUB_BUCKET_BITS = 7 # 64 linear sub-buckets per power of two: <1.6% relative error
+LOAD_TEST_RESULTS_FILE = 'load_test_results.json'
+
+
+#---Latency Histogram---
+# HDR-style log-linear histogram over integer microseconds. Values below 2^bits get one bucket each;
+# above that every power of two is split into 2^(bits-1) equal sub-buckets. Memory is fixed by the
+# tracked range (~1.3k counters for 1us-60s), whatever the number of recorded values, and histograms
+# with the same layout merge by adding counts.
+class LatencyHistogram:
+    def __init__(self, max_value_us=HISTOGRAM_MAX_LATENCY_US, sub_bucket_bits=HISTOGRAM_SUB_BUCKET_BITS):
+        self.max_value_us = max_value_us
+        self.sub_bucket_bits = sub_bucket_bits
+        self._full = 1 << sub_bucket_bits
+        self._half = self._full >> 1
+        self.counts = np.zeros(self._index(max_value_us) + 1, dtype=np.int64)
+        self.total = 0
+        self.sum_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def _index(self, value_us):
+        if value_us < self._full:
+            return value_us
+        shift = value_us.bit_length() - self.sub_bucket_bits
+        return self._full + (shift - 1) * self._half + ((value_us >> shift) - self._half)
+
+    def _bucket_upper_us(self, index):
+        # Highest value that lands in bucket `index`
+        if index < self._full:
+            return index
+        shift, sub = divmod(index - self._full, self._half)
+        return ((sub + self._half + 1) << (shift + 1)) - 1
+
+    def record(self, seconds):
+        value_us = min(max(int(seconds * 1e6), 0), self.max_value_us)
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        self.sum_us += value_us
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other):
+        if (other.max_value_us, other.sub_bucket_bits) != (self.max_value_us, self.sub_bucket_bits):
+            raise ValueError("Histograms must share the same range and precision to be merged.")
+        self.counts += other.counts
+        self.total += other.total
+        self.sum_us += other.sum_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_us = max(self.max_us, other.max_us)
+        return self
+
+    def percentile_ms(self, percentile):
+        if not self.total:
+            return 0.0
+        rank = max(1, math.ceil(percentile / 100.0 * self.total))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._bucket_upper_us(index), self.max_us) / 1000.0
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "mean_ms": self.sum_us / self.total / 1000.0 if self.total else 0.0,
+            "min_ms": (self.min_us or 0) / 1000.0,
+            "max_ms": self.max_us / 1000.0,
+            "p50_ms": self.percentile_ms(50),
+            "p95_ms": self.percentile_ms(95),
+            "p99_ms": self.percentile_ms(99),
+            "p999_ms": self.percentile_ms(99.9),
+        }
+
+
+#---Load Profiles---
+# A profile maps seconds since the scenario started to the target TPS at that moment
+def constant_profile(tps):
+    return lambda elapsed: tps
+
+
+def ramp_profile(start_tps, end_tps, duration_secs):
+    return lambda elapsed: start_tps + (end_tps - start_tps) * min(elapsed / duration_secs, 1.0)
+
+
+def burst_profile(base_tps, burst_tps, burst_every_secs, burst_secs):
+    # base_tps, except for the first burst_secs of every burst_every_secs window
+    return lambda elapsed: burst_tps if elapsed % burst_every_secs < burst_secs else base_tps
+
+
+SCENARIOS = {
+    'base': ("1. Base Load (10 TPS)", constant_profile(DEFAULT_TARGET_TPS_LOW), DEFAULT_TEST_DURATION_SECS),
+    'peak': ("2. Peak Load (50 TPS)", constant_profile(DEFAULT_TARGET_TPS_HIGH), DEFAULT_TEST_DURATION_SECS),
+    'extended': ("3. Extended Medium Load (30 TPS, 3 min)", constant_profile(DEFAULT_TARGET_TPS_MID), EXTENDED_TEST_DURATION_SECS),
+    'max_burst': ("4. Maximum Throughput Test (Burst 100 TPS, 20s)", constant_profile(100), SHORT_BURST_DURATION_SECS),
+    'ramp': ("5. Ramp Load (10 -> 50 TPS)", ramp_profile(DEFAULT_TARGET_TPS_LOW, DEFAULT_TARGET_TPS_HIGH, DEFAULT_TEST_DURATION_SECS),
+             DEFAULT_TEST_DURATION_SECS),
+    'burst': ("6. Burst Load (10 TPS, 100 TPS for 2s every 10s)", burst_profile(DEFAULT_TARGET_TPS_LOW, 100, 10, 2), DEFAULT_TEST_DURATION_SECS),
+}
+DEFAULT_SCENARIOS = ['base', 'peak', 'ramp', 'burst']
+
+
+#---Replay Data---
+def load_replay_rows(data_path=DATA_FILE, max_rows=DEFAULT_REPLAY_ROWS):
+    # Raw rows as JSON-ready dicts (the label is dropped), i.e. exactly what a client would POST to /score
+    df = pd.read_csv(data_path, nrows=max_rows, usecols=lambda column: column != TARGET_COLUMN)
+    if df.empty:
+        raise ValueError(f"No rows to replay in '{data_path}'.")
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+#---Targets---
+class InProcessTarget:
+    name = 'in-process'
+
+    def __init__(self, scorer):
+        self.scorer = scorer
+
+    def score(self, rows):
+        # Same DataFrame construction as the service's micro-batcher
+        return self.scorer.score_frame(pd.DataFrame.from_records(rows))
+
+
+class HttpTarget:
+    # POSTs to a running scoring_service; one keep-alive connection per load-generator thread
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.name = f"http://{host}:{port}/score"
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, 'conn', None) is None:
+            self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._local.conn
+
+    def score(self, rows):
+        body = json.dumps(rows[0] if len(rows) == 1 else rows)
+        conn = self._connection()
+        try:
+            conn.request('POST', '/score', body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {payload[:200].decode(errors='replace')}")
+        result = json.loads(payload)
+        return [result[SCORE_COLUMN]] if SCORE_COLUMN in result else result[SCORE_COLUMN + 's']
+
+    def check(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request('GET', '/health')
+            if conn.getresponse().status != 200:
+                raise ConnectionError(f"{self.host}:{self.port} is not a healthy scoring service.")
+        finally:
+            conn.close()
+
+
+#---Scenario Runner---
+class _ScenarioState:
+    def __init__(self, duration_secs):
+        self.lock = threading.Lock()
+        # Response time runs from the scheduled send time, so queueing behind a slow target is included
+        # (no coordinated omission); service time runs from when the request actually started.
+        self.response = LatencyHistogram()
+        self.service = LatencyHistogram()
+        self.successful = 0
+        self.failed = 0
+        self.errors = Counter()
+        self.outstanding = 0
+        self.max_backlog = 0
+        # Successful completions per elapsed second, padded for completions that land during the drain
+        self.per_second = np.zeros(int(duration_secs) + 2, dtype=np.int64)
+
+
+def _send(target, rows, scheduled, origin, state):
+    started = time.perf_counter()
+    try:
+        target.score(rows)
+        error = None
+    except Exception as e:
+        error = type(e).__name__ if not str(e) else f"{type(e).__name__}: {str(e)[:80]}"
+    finished = time.perf_counter()
+    with state.lock:
+        state.outstanding -= 1
+        if error is None:
+            state.successful += 1
+            state.response.record(finished - scheduled)
+            state.service.record(finished - started)
+            state.per_second[min(int(finished - origin), len(state.per_second) - 1)] += 1
+        else:
+            state.failed += 1
+            state.errors[error] += 1
+
+
+def run_scenario(name, target, rows, profile, duration_secs, batch_size=1, concurrency=DEFAULT_CONCURRENCY):
+    print(f"\n=== Starting Scenario: {name} ===")
+    print(f"→ Target: {target.name}")
+    print(f"→ Target TPS: {profile(0):g}" + ("" if profile(0) == profile(duration_secs / 2) else f" (varies, {profile(duration_secs / 2):g} at midpoint)"))
+    print(f"→ Duration: {duration_secs}s")
+    print(f"→ Rows per request: {batch_size}")
+
+    state = _ScenarioState(duration_secs)
+    source = itertools.cycle(range(0, len(rows), batch_size))
+    sent = 0
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load-test')
+    origin = time.perf_counter()
+    scheduled = origin
+    end = origin + duration_secs
+    # Open-loop schedule: each request is due 1/TPS after the previous one, whether or not earlier
+    # requests have completed
+    while scheduled < end:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        offset = next(source)
+        with state.lock:
+            if state.outstanding >= MAX_BACKLOG:
+                state.failed += 1
+                state.errors["BacklogOverflow"] += 1
+                dropped = True
+            else:
+                state.outstanding += 1
+                state.max_backlog = max(state.max_backlog, state.outstanding)
+                dropped = False
+        if not dropped:
+            executor.submit(_send, target, rows[offset:offset + batch_size], scheduled, origin, state)
+        sent += 1
+        scheduled += 1.0 / max(profile(scheduled - origin), 1e-3)
+    window_end = time.perf_counter()
+    executor.shutdown(wait=True)
+    elapsed = max(time.perf_counter() - origin, duration_secs)
+
+    response = state.response.summary()
+    report = {
+        "scenario": name,
+        "target": target.name,
+        "duration_s": duration_secs,
+        "rows_per_request": batch_size,
+        "concurrency": concurrency,
+        "total_transactions": state.successful + state.failed,
+        "successful_transactions": state.successful,
+        "failed_transactions": state.failed,
+        "errors": dict(state.errors.most_common()),
+        "offered_tps": sent / duration_secs,
+        # reporter.rs definition: successful requests over the whole run, including draining the backlog
+        "achieved_tps": state.successful / elapsed,
+        # Completions inside the scheduled window only; falls below offered_tps when the target cannot keep up
+        "sustained_tps": int(state.per_second[:int(duration_secs)].sum()) / duration_secs,
+        "min_second_tps": int(state.per_second[:int(duration_secs)].min()) if int(duration_secs) else 0,
+        "drain_s": elapsed - (window_end - origin),
+        "max_backlog": state.max_backlog,
+        "response_ms": response,
+        "service_ms": state.service.summary(),
+    }
+
+    print(f"\n=== Scenario Complete: {name} ===")
+    print(f"→ Successful transactions: {state.successful}")
+    print(f"→ Failed transactions: {state.failed}")
+    print(f"→ Average time: {response['mean_ms']:.2f}ms")
+    print(f"→ p50 / p95 / p99: {response['p50_ms']:.2f}ms / {response['p95_ms']:.2f}ms / {response['p99_ms']:.2f}ms")
+    print(f"→ Offered TPS: {report['offered_tps']:.2f}")
+    print(f"→ Achieved TPS: {report['achieved_tps']:.2f}")
+    print(f"→ Sustained TPS: {report['sustained_tps']:.2f} (slowest second {report['min_second_tps']})")
+    if state.errors:
+        for error, count in state.errors.most_common(5):
+            print(f"→ Error: {error} x{count}")
+    return report
+
+
+def overall_report(reports):
+    totals = {
+        "total_transactions": sum(r["total_transactions"] for r in reports),
+        "total_successful": sum(r["successful_transactions"] for r in reports),
+        "total_failed": sum(r["failed_transactions"] for r in reports),
+        "average_tps_across_scenarios": sum(r["achieved_tps"] for r in reports) / len(reports) if reports else 0.0,
+        "total_scenarios": len(reports),
+    }
+    print(f"\n=== Overall Load Test Report ===")
+    print(f"→ Total Transactions: {totals['total_transactions']}")
+    print(f"→ Successful: {totals['total_successful']}")
+    print(f"→ Failed: {totals['total_failed']}")
+    print(f"→ Average TPS: {totals['average_tps_across_scenarios']:.2f}")
+    print(f"→ Total Scenarios: {totals['total_scenarios']}")
+    return totals
+
+
+def append_load_test_report(reports, report_file=EVAL_REPORT_FILE):
+    print(f"Appending load test results to {report_file}")
+    with open(report_file, 'a') as f:
+        f.write(f"\n## Scoring Load Test\n")
+        f.write(f"-**Target:** {reports[0]['target']}\n")
+        f.write(f"-**Rows per request / concurrency:** {reports[0]['rows_per_request']} / {reports[0]['concurrency']}\n\n")
+        f.write(f"Latencies are measured from each request's scheduled send time, so they include queueing when the scorer falls behind.\n\n")
+        f.write(f"| Scenario | Duration (s) | Offered TPS | Achieved TPS | Sustained TPS | p50 (ms) | p95 (ms) | p99 (ms) | Max (ms) | Errors |\n")
+        f.write(f"|---|---|---|---|---|---|---|---|---|---|\n")
+        for r in reports:
+            m = r["response_ms"]
+            f.write(f"| {r['scenario']} | {r['duration_s']:g} | {r['offered_tps']:.2f} | {r['achieved_tps']:.2f} | {r['sustained_tps']:.2f} | "
+                    f"{m['p50_ms']:.2f} | {m['p95_ms']:.2f} | {m['p99_ms']:.2f} | {m['max_ms']:.2f} | {r['failed_transactions']} |\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay synthetic transactions against the risk scorer at fixed, ramping or bursty TPS.")
+    parser.add_argument('--data', default=DATA_FILE, help="Dataset whose rows are replayed (cycled when exhausted).")
+    parser.add_argument('--max-rows', type=int, default=DEFAULT_REPLAY_ROWS, help="Rows loaded from the dataset for replay.")
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS), help=f"Comma-separated scenarios from {list(SCENARIOS)}.")
+    parser.add_argument('--profile', choices=['constant', 'ramp', 'burst'], help="Run one custom profile instead of the named scenarios.")
+    parser.add_argument('--tps', type=float, default=DEFAULT_TARGET_TPS_MID, help="Constant TPS, ramp start TPS or burst base TPS.")
+    parser.add_argument('--end-tps', type=float, default=DEFAULT_TARGET_TPS_HIGH, help="Ramp end TPS.")
+    parser.add_argument('--burst-tps', type=float, default=100, help="TPS during bursts.")
+    parser.add_argument('--burst-every', type=float, default=10, help="Seconds between burst starts.")
+    parser.add_argument('--burst-seconds', type=float, default=2, help="Length of each burst.")
+    parser.add_argument('--duration', type=float, default=None, help="Override every scenario's duration (seconds).")
+    parser.add_argument('--batch-size', type=int, default=1, help="Rows per scoring request.")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Requests in flight at once.")
+    parser.add_argument('--url', action='store_true', help="Score through a running scoring_service instead of in-process.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--model', default=MODEL_FILE)
+    parser.add_argument('--preprocessor', default=PREPROCESSOR_OUTPUT_FILE)
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='flat', help="In-process scoring engine.")
+    parser.add_argument('--output', default=LOAD_TEST_RESULTS_FILE, help="JSON file the scenario reports are written to.")
+    parser.add_argument('--no-report', action='store_true', help=f"Do not append results to {EVAL_REPORT_FILE}.")
+    args = parser.parse_args()
+
+    if args.profile:
+        duration = args.duration or DEFAULT_TEST_DURATION_SECS
+        profile = {
+            'constant': lambda: constant_profile(args.tps),
+            'ramp': lambda: ramp_profile(args.tps, args.end_tps, duration),
+            'burst': lambda: burst_profile(args.tps, args.burst_tps, args.burst_every, args.burst_seconds),
+        }[args.profile]()
+        plan = [(f"Custom {args.profile} profile", profile, duration)]
+    else:
+        unknown = [s for s in args.scenarios.split(',') if s and s not in SCENARIOS]
+        if unknown:
+            parser.error(f"Unknown scenario(s) {unknown}; choose from {list(SCENARIOS)}.")
+        plan = [SCENARIOS[s] for s in args.scenarios.split(',') if s]
+        if args.duration:
+            # Ramps are rebuilt so they still reach their end TPS within the shortened run
+            plan = [(name, ramp_profile(DEFAULT_TARGET_TPS_LOW, DEFAULT_TARGET_TPS_HIGH, args.duration) if key == 'ramp' else profile, args.duration)
+                    for key, (name, profile, _) in zip([s for s in args.scenarios.split(',') if s], plan)]
+
+    if args.url:
+        target = HttpTarget(args.host, args.port)
+        target.check()
+    else:
+        target = InProcessTarget(RiskScorer.load(args.model, args.preprocessor, n_jobs=1, engine=args.engine))
+    rows = load_replay_rows(args.data, args.max_rows)
+    print(f"Replaying {len(rows)} rows from {args.data} against {target.name}")
+
+    reports = [run_scenario(name, target, rows, profile, duration, args.batch_size, args.concurrency) for name, profile, duration in plan]
+    totals = overall_report(reports)
+    with open(args.output, 'w') as f:
+        json.dump({"created_at": time.strftime('%Y-%m-%d %H:%M:%S'), "overall": totals, "scenarios": reports}, f, indent=2)
+    print(f"\nLoad test results saved to {args.output}")
+    if not args.no_report:
+        append_load_test_report(reports)
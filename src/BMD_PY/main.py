@@ -10,7 +10,24 @@ from sklearn.metrics import (
 )
 import joblib
 import os
+import time
+import argparse
 import json # Import json module
+from preprocessing import (
+    RiskFeatureTransformer,
+    PREPROCESSOR_OUTPUT_FILE,
+    CATEGORICAL_ENCODINGS,
+    DEFAULT_CATEGORICAL_ENCODING,
+    DEFAULT_HASH_BUCKETS,
+    matrix_nbytes,
+)
+from ingest import load_transactions, load_schema_features, schema_dtypes
+from model_tuning import cross_validate_search, append_tuning_report, DEFAULT_CV_FOLDS, DEFAULT_RANDOM_SEARCH_ITERATIONS
+from model_registry import register_version, MODEL_VERSIONS_DIR
+from instrumentation import stage, configure_tracing, TRACE_OUTPUT_FILE
+from feature_cache import FeatureMatrixCache, cache_key, DEFAULT_CACHE_DIR, DEFAULT_MAX_CACHE_BYTES
+from forest_engine import FlatForest, save_mapped_model, MAPPED_MODEL_OUTPUT_FILE
+from drift_monitor import DriftMonitor, DRIFT_SKETCH_FILE
 
 #---Global Configuration---
 DATA_FILE = 'synthetic_behavioral_data.csv' # Using the harder data
@@ -18,6 +35,8 @@ MODEL_OUTPUT_FILE = 'risk_model.pkl'
 TARGET_COLUMN = 'risk_flag_manual'
 EVAL_REPORT_FILE = 'risk_model_eval.md'
 MODEL_FEATURES_FILE = 'model_features.json' # New file to store feature names
+CATEGORICAL_ENCODING = DEFAULT_CATEGORICAL_ENCODING # See preprocessing.CATEGORICAL_ENCODINGS
+HASH_BUCKETS = DEFAULT_HASH_BUCKETS
 
 #---Feature Definitions for Model Preprocessing---
 NUMERIC_FEATURES_FOR_MODEL = [
@@ -57,24 +76,68 @@ TIME_FEATURES_FOR_MODEL = [
     'tx_hour',
 ]
 
-def train_evaluate_model():
-    print(f"--- Starting Model Training and Evaluation ---")
-    if not os.path.exists(DATA_FILE):
-        print(f"Error: Data file '{DATA_FILE}' not found. Please run 'generate_data.py' first.")
-        return
+def model_input_columns():
+    return (
+        NUMERIC_FEATURES_FOR_MODEL +
+        BOOLEAN_FEATURES_FOR_MODEL +
+        CATEGORICAL_FEATURES_FOR_MODEL +
+        TIME_FEATURES_FOR_MODEL +
+        [TARGET_COLUMN]
+    )
 
-    df = pd.read_csv(DATA_FILE)
-    print("Data loaded for model training.")
-    print(f"Number of rows: {df.shape[0]}, Number of columns: {df.shape[1]}")
-    print("\nFirst 5 rows of data:")
-    print(df.head())
-    print("\nInformation about columns and data types:")
-    df.info()
+def build_preprocessor(categorical_encoding=CATEGORICAL_ENCODING, hash_buckets=HASH_BUCKETS):
+    return RiskFeatureTransformer(
+        NUMERIC_FEATURES_FOR_MODEL,
+        BOOLEAN_FEATURES_FOR_MODEL,
+        CATEGORICAL_FEATURES_FOR_MODEL,
+        TIME_FEATURES_FOR_MODEL,
+        categorical_encoding=categorical_encoding,
+        hash_buckets=hash_buckets,
+    )
+
+def preprocessing_config(categorical_encoding=CATEGORICAL_ENCODING, hash_buckets=HASH_BUCKETS):
+    # Everything besides the data file that determines the preprocessed X/y; keys the feature cache
+    dtypes, datetime_columns = schema_dtypes(load_schema_features())
+    return {
+        "numeric": NUMERIC_FEATURES_FOR_MODEL,
+        "boolean": BOOLEAN_FEATURES_FOR_MODEL,
+        "categorical": CATEGORICAL_FEATURES_FOR_MODEL,
+        "time": TIME_FEATURES_FOR_MODEL,
+        "target": TARGET_COLUMN,
+        "categorical_encoding": categorical_encoding,
+        "hash_buckets": hash_buckets,
+        "load_dtypes": dtypes,
+        "datetime_columns": datetime_columns,
+    }
+
+def load_and_preprocess(categorical_encoding=CATEGORICAL_ENCODING, hash_buckets=HASH_BUCKETS, cache=None):
+    # Returns (X, y, feature_columns, preprocessor), from the feature cache when the data file and
+    # preprocessing config are unchanged since a previous run
+    key = None
+    if cache is not None:
+        cache_start = time.perf_counter()
+        with stage('feature_cache_lookup'):
+            key = cache_key(cache.fingerprint(DATA_FILE), preprocessing_config(categorical_encoding, hash_buckets))
+            cached = cache.load(key)
+        if cached is not None:
+            X = cached[0]
+            print(f"Loaded preprocessed features from cache entry {key} in {time.perf_counter() - cache_start:.2f}s.")
+            print(f"Shape: {X.shape} ({matrix_nbytes(X) / 1e6:.2f} MB, memory-mapped)")
+            return cached
+        print(f"No cached features for key {key}; preprocessing {DATA_FILE}.")
+
+    load_start = time.perf_counter()
+    with stage('load'):
+        df = load_transactions(DATA_FILE, columns=model_input_columns())
+    print(f"Data loaded for model training in {time.perf_counter() - load_start:.2f}s.")
+    print(f"Number of rows: {df.shape[0]}, Number of columns: {df.shape[1]}, "
+          f"Memory: {df.memory_usage(deep=True).sum() / 1e6:.2f} MB")
 
     if TARGET_COLUMN not in df.columns:
         print(f"Error: Target column '{TARGET_COLUMN}' not found in the DataFrame.")
-        return
-    df.dropna(subset=[TARGET_COLUMN], inplace=True)
+        return None
+    with stage('dropna_target'):
+        df.dropna(subset=[TARGET_COLUMN], inplace=True)
 
     model_features_list = (
             NUMERIC_FEATURES_FOR_MODEL +
@@ -88,72 +151,76 @@ def train_evaluate_model():
         missing = set(model_features_list) - set(existing_model_features)
         print(f"Warning: Missing model feature columns: {missing}")
 
-    X = df[existing_model_features].copy()
     y = df[TARGET_COLUMN].copy()
 
     print("\nStarting data preprocessing for model training...")
-    for col in list(TIME_FEATURES_FOR_MODEL):
-        if col in X.columns:
-            if col == 'timestamp':
-                X[col] = pd.to_datetime(X[col])
-                X[f'{col}_hour'] = X[col].dt.hour
-                X[f'{col}_day_of_week'] = X[col].dt.dayofweek
-                X[f'{col}_month'] = X[col].dt.month
-                X = X.drop(columns=[col])
-                print(f"Processed time feature: {col}")
-            elif col == 'login_time_pattern':
-                time_series = pd.to_datetime(X[col].astype(str), format='%H:%M', errors='coerce')
-                X[f'{col}_hour'] = time_series.dt.hour
-                X[f'{col}_minute'] = time_series.dt.minute
-                X = X.drop(columns=[col])
-                print(f"Processed time feature: {col}")
-            elif col == 'tx_hour':
-                if X[col].dtype == 'object':
-                    X[col] = pd.to_numeric(X[col], errors='coerce')
-
-    current_categorical_features_in_X = [col for col in CATEGORICAL_FEATURES_FOR_MODEL if col in X.columns]
-    if current_categorical_features_in_X:
-        print(f"Applying One-Hot Encoding to categorical features: {current_categorical_features_in_X}")
-        X = pd.get_dummies(X, columns=current_categorical_features_in_X, drop_first=True)
-        print(f"Shape after One-Hot Encoding: {X.shape}")
-
-    for col in X.columns:
-        if X[col].dtype in ['int64', 'float64'] and X[col].isnull().any():
-            mean_val = X[col].mean()
-            X[col].fillna(mean_val, inplace=True)
-            print(f"Imputed missing values in numerical column '{col}'")
-
-    if X.isnull().values.any():
-        print("Warning: Missing values still exist in the preprocessed data.")
-
-    non_numeric_cols_after_prep = X.select_dtypes(include=['object', 'category']).columns
-    if len(non_numeric_cols_after_prep) > 0:
-        print(f"Error: Non-numeric columns found after preprocessing: {non_numeric_cols_after_prep}")
-        return
+    preprocessor = build_preprocessor(categorical_encoding, hash_buckets)
+    with stage('fit_preprocessor'):
+        preprocessor.fit(df)
+    with stage('transform'):
+        X = preprocessor.transform(df)
+    feature_columns = preprocessor.feature_names_
+    print(f"Processed time features: {preprocessor.time_inputs_}")
+    print(f"Applied '{categorical_encoding}' encoding to categorical features: {preprocessor.categorical_inputs_}")
+    print(f"Shape after preprocessing: {X.shape} ({matrix_nbytes(X) / 1e6:.2f} MB)")
     print("Data preprocessing completed.")
 
+    if cache is not None:
+        try:
+            with stage('feature_cache_store'):
+                cache.store(key, X, y, feature_columns, preprocessor, TARGET_COLUMN)
+            print(f"Preprocessed features cached under key {key}")
+        except Exception as e:
+            print(f"Error occurred while caching preprocessed features: {e}")
+    return X, y, feature_columns, preprocessor
+
+def train_evaluate_model(categorical_encoding=CATEGORICAL_ENCODING, hash_buckets=HASH_BUCKETS, cache=None):
+    print(f"--- Starting Model Training and Evaluation ---")
+    if not os.path.exists(DATA_FILE):
+        print(f"Error: Data file '{DATA_FILE}' not found. Please run 'generate_data.py' first.")
+        return
+
+    with stage('load_and_preprocess'):
+        prepared = load_and_preprocess(categorical_encoding, hash_buckets, cache)
+    if prepared is None:
+        return
+    X, y, feature_columns, preprocessor = prepared
+
+    print(f"Saving fitted preprocessor to {PREPROCESSOR_OUTPUT_FILE}")
+    try:
+        with stage('save_preprocessor'):
+            preprocessor.save(PREPROCESSOR_OUTPUT_FILE)
+        print(f"Preprocessor saved to {PREPROCESSOR_OUTPUT_FILE}")
+    except Exception as e:
+        print(f"Error occurred while saving the preprocessor: {e}")
+
     # --- NEW: Save the columns after preprocessing ---
     print(f"Saving preprocessed feature column names to {MODEL_FEATURES_FILE}")
     try:
         with open(MODEL_FEATURES_FILE, 'w') as f:
-            json.dump(X.columns.tolist(), f)
+            json.dump(feature_columns, f)
         print(f"Feature column names saved to {MODEL_FEATURES_FILE}")
     except Exception as e:
         print(f"Error occurred while saving feature column names: {e}")
     # --- END NEW ---
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
+    with stage('train_test_split'):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
     print(f"\nTraining set size: {X_train.shape[0]} rows")
     print(f"Test set size: {X_test.shape[0]} rows")
 
     print("\nStarting Random Forest model training...")
     model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-    model.fit(X_train, y_train)
-    print("Model training completed.")
+    fit_start = time.perf_counter()
+    with stage('fit_model'):
+        model.fit(X_train, y_train)
+    training_seconds = time.perf_counter() - fit_start
+    print(f"Model training completed in {training_seconds:.2f}s.")
 
     print("\nEvaluating model on the test set...")
-    y_pred_proba = model.predict_proba(X_test)[:, 1]
-    y_pred = model.predict(X_test)
+    with stage('evaluate'):
+        y_pred_proba = model.predict_proba(X_test)[:, 1]
+        y_pred = model.predict(X_test)
 
     try:
         auc_score = roc_auc_score(y_test, y_pred_proba)
@@ -175,22 +242,60 @@ def train_evaluate_model():
     print("\nClassification Report:")
     print(class_report)
 
+    # Registered first: register_version stamps the version on the model that is saved below
+    with stage('register_version'):
+        model_version = register_version(
+            model, 'full', [DATA_FILE], training_seconds=training_seconds,
+            metrics={"roc_auc": auc_score, "precision": precision, "recall": recall},
+        )["version"]
+    print(f"Registered model version {model_version} in {MODEL_VERSIONS_DIR}")
+
     print(f"\nSaving trained model to file: {MODEL_OUTPUT_FILE}")
     try:
-        joblib.dump(model, MODEL_OUTPUT_FILE)
+        with stage('save_model'):
+            joblib.dump(model, MODEL_OUTPUT_FILE)
         print(f"Model successfully saved as {MODEL_OUTPUT_FILE}")
     except Exception as e:
         print(f"Error occurred while saving the model: {e}")
 
+    # Reference distributions for drift monitoring: numeric features from the training rows, scores from
+    # the held-out test rows
+    print(f"Saving drift reference sketches to {DRIFT_SKETCH_FILE}")
+    try:
+        with stage('drift_sketches'):
+            drift_monitor = DriftMonitor.fit(X_train, feature_columns, NUMERIC_FEATURES_FOR_MODEL, scores=y_pred_proba, model_version=model_version)
+            drift_monitor.save(DRIFT_SKETCH_FILE)
+        print(f"Drift sketches saved to {DRIFT_SKETCH_FILE} ({len(drift_monitor.features)} features + risk score)")
+    except Exception as e:
+        print(f"Error occurred while saving drift sketches: {e}")
+
+    print(f"Saving memory-mapped model to file: {MAPPED_MODEL_OUTPUT_FILE}")
+    try:
+        with stage('save_mapped_model'):
+            save_mapped_model(
+                FlatForest.from_sklearn(model), MAPPED_MODEL_OUTPUT_FILE, feature_names=feature_columns,
+                metadata={"model_type": "RandomForestClassifier", "n_estimators": model.n_estimators, "target_column": TARGET_COLUMN,
+                          "model_version": model_version},
+            )
+        print(f"Memory-mapped model saved as {MAPPED_MODEL_OUTPUT_FILE}")
+    except Exception as e:
+        print(f"Error occurred while saving the memory-mapped model: {e}")
+
     print(f"\nGenerating evaluation report: {EVAL_REPORT_FILE}")
     with open(EVAL_REPORT_FILE, 'w') as f:
         f.write(f"# Risk Model Evaluation Report\n\n")
         f.write(f"## Model Details\n")
         f.write(f"-**Model Type:** RandomForestClassifier\n")
+        f.write(f"-**Model version:** {model_version}\n")
         f.write(f"-**Number of estimators:** {model.n_estimators}\n")
-        f.write(f"-**Random state:** {model.random_state}\n\n")
+        f.write(f"-**Random state:** {model.random_state}\n")
+        f.write(f"-**Training time:** {training_seconds:.2f}s\n\n")
+        f.write(f"## Feature Matrix\n")
+        f.write(f"-**Categorical encoding:** `{categorical_encoding}`\n")
+        f.write(f"-**Matrix width:** {X.shape[1]} columns\n")
+        f.write(f"-**Matrix size:** {matrix_nbytes(X) / 1e6:.2f} MB ({'sparse CSR' if hasattr(X, 'tocsc') else 'dense'})\n\n")
         f.write(f"## Data Overview\n")
-        f.write(f"-**Total rows in dataset:** {df.shape[0]}\n")
+        f.write(f"-**Total rows in dataset:** {X.shape[0]}\n")
         f.write(f"-**Training set rows:** {X_train.shape[0]}\n")
         f.write(f"-**Test set rows:** {X_test.shape[0]}\n")
         f.write(f"-**Target column:** `{TARGET_COLUMN}`\n")
@@ -212,7 +317,7 @@ def train_evaluate_model():
         f.write(f"```\n\n")
         f.write(f"## Feature Importance\n")
         try:
-            feature_importances = pd.Series(model.feature_importances_, index=X.columns).sort_values(ascending=False)
+            feature_importances = pd.Series(model.feature_importances_, index=feature_columns).sort_values(ascending=False)
             f.write(f"The top 10 most important features are:\n")
             f.write(f"```\n")
             f.write(f"{feature_importances.head(10).to_string()}\n")
@@ -232,5 +337,88 @@ def train_evaluate_model():
     print(f"Evaluation report saved to {EVAL_REPORT_FILE}")
     print("\n--- Script finished execution ---")
 
+def compare_categorical_encodings(encodings=CATEGORICAL_ENCODINGS, hash_buckets=HASH_BUCKETS):
+    print(f"--- Comparing categorical encodings: {encodings} ---")
+    if not os.path.exists(DATA_FILE):
+        print(f"Error: Data file '{DATA_FILE}' not found. Please run 'generate_data.py' first.")
+        return
+    df = load_transactions(DATA_FILE, columns=model_input_columns())
+    df.dropna(subset=[TARGET_COLUMN], inplace=True)
+    y = df[TARGET_COLUMN]
+
+    results = []
+    for encoding in encodings:
+        preprocessor = build_preprocessor(encoding, hash_buckets)
+        encode_start = time.perf_counter()
+        X = preprocessor.fit_transform(df)
+        encode_seconds = time.perf_counter() - encode_start
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
+        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+        fit_start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - fit_start
+        try:
+            auc_score = f"{roc_auc_score(y_test, model.predict_proba(X_test)[:, 1]):.4f}"
+        except ValueError:
+            auc_score = 'N/A'
+        results.append((encoding, X.shape[1], matrix_nbytes(X), encode_seconds, fit_seconds, auc_score))
+        print(f"{encoding}: width {X.shape[1]}, {matrix_nbytes(X) / 1e6:.2f} MB, encode {encode_seconds:.2f}s, fit {fit_seconds:.2f}s, ROC-AUC {auc_score}")
+
+    print(f"Appending encoding comparison to {EVAL_REPORT_FILE}")
+    with open(EVAL_REPORT_FILE, 'a') as f:
+        f.write(f"\n## Categorical Encoding Comparison\n")
+        f.write(f"Hash buckets: {hash_buckets}\n\n")
+        f.write(f"| Encoding | Matrix width | Matrix MB | Encode time (s) | Training time (s) | ROC-AUC |\n")
+        f.write(f"|---|---|---|---|---|---|\n")
+        for encoding, width, nbytes, encode_seconds, fit_seconds, auc_score in results:
+            f.write(f"| {encoding} | {width} | {nbytes / 1e6:.2f} | {encode_seconds:.2f} | {fit_seconds:.2f} | {auc_score} |\n")
+    return results
+
+def tune_model(categorical_encoding=CATEGORICAL_ENCODING, hash_buckets=HASH_BUCKETS, cache=None, search='grid',
+               n_iter=DEFAULT_RANDOM_SEARCH_ITERATIONS, folds=DEFAULT_CV_FOLDS, workers=None):
+    print(f"--- Cross-validated hyperparameter search ({search}) ---")
+    if not os.path.exists(DATA_FILE):
+        print(f"Error: Data file '{DATA_FILE}' not found. Please run 'generate_data.py' first.")
+        return
+    # With the feature cache enabled the workers map the cached .npy matrix directly
+    prepared = load_and_preprocess(categorical_encoding, hash_buckets, cache)
+    if prepared is None:
+        return
+    X, y = prepared[0], prepared[1]
+    results = cross_validate_search(X, y, search=search, n_iter=n_iter, n_splits=folds, workers=workers)
+    best = results["best"]
+    print(f"Best configuration: {best['params']} (mean ROC-AUC {best['mean_roc_auc']:.4f}) "
+          f"in {results['wall_seconds']:.2f}s on {results['workers']} workers")
+    append_tuning_report(results, EVAL_REPORT_FILE)
+    return results
+
 if __name__ == "__main__":
-    train_evaluate_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train and evaluate the behavioral risk model.")
+    parser.add_argument('--encoding', choices=CATEGORICAL_ENCODINGS, default=CATEGORICAL_ENCODING, help="Categorical encoding used for training.")
+    parser.add_argument('--hash-buckets', type=int, default=HASH_BUCKETS, help="Bucket count for the 'hashing' encoding.")
+    parser.add_argument('--compare-encodings', action='store_true', help="Also train with every encoding and append a comparison to the eval report.")
+    parser.add_argument('--tune', action='store_true', help="Also run cross-validated hyperparameter search and append the results to the eval report.")
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid', help="Search strategy over model_tuning.DEFAULT_PARAM_GRID.")
+    parser.add_argument('--n-iter', type=int, default=DEFAULT_RANDOM_SEARCH_ITERATIONS, help="Configurations sampled by random search.")
+    parser.add_argument('--folds', type=int, default=DEFAULT_CV_FOLDS, help="Stratified k-fold splits.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes for the search (default: all cores).")
+    parser.add_argument('--trace', action='store_true', help="Record per-stage wall/CPU time and memory; writes a JSON trace and a report table.")
+    parser.add_argument('--trace-output', default=TRACE_OUTPUT_FILE, help="JSON trace file written with --trace.")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="With --trace, skip Python allocation tracking (lower overhead, RSS only).")
+    parser.add_argument('--profile-stage', action='append', default=[], metavar='STAGE', help="Run this stage under cProfile (repeatable; '*' for every top-level stage).")
+    parser.add_argument('--no-cache', action='store_true', help="Always re-run preprocessing instead of using the feature cache.")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Directory of the preprocessed feature cache.")
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_CACHE_BYTES / 1024 ** 2, help="Cache size above which least recently used entries are evicted.")
+    args = parser.parse_args()
+
+    tracer = configure_tracing(args.trace or bool(args.profile_stage), not args.no_tracemalloc, args.profile_stage)
+    cache = None if args.no_cache else FeatureMatrixCache(args.cache_dir, int(args.cache_max_mb * 1024 ** 2))
+    train_evaluate_model(categorical_encoding=args.encoding, hash_buckets=args.hash_buckets, cache=cache)
+    if args.compare_encodings:
+        compare_categorical_encodings(hash_buckets=args.hash_buckets)
+    if args.tune:
+        tune_model(args.encoding, args.hash_buckets, cache, args.search, args.n_iter, args.folds, args.workers)
+    if tracer.enabled:
+        tracer.stop()
+        print(f"Stage trace saved to {tracer.write_json(args.trace_output)}")
+        tracer.append_report(EVAL_REPORT_FILE)
\ No newline at end of file
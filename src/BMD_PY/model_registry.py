@@ -0,0 +1,92 @@
+import json
+import os
+import time
+
+import joblib
+
+#---Global Configuration---
+MODEL_VERSIONS_DIR = 'model_versions'
+MANIFEST_FILE = 'manifest.json'
+DEFAULT_KEEP_VERSIONS = 5 # Model copies kept on disk; older manifest entries stay but lose their file
+
+
+# Append-only record of trained model versions. Every version gets a manifest entry with its parent,
+# data sources, metrics and the version that added each tree, so the trees of an incrementally grown
+# forest can be traced (and retired) by age. Joblib copies are kept for the most recent versions only.
+def _manifest_path(versions_dir):
+    return os.path.join(versions_dir, MANIFEST_FILE)
+
+
+def load_manifest(versions_dir=MODEL_VERSIONS_DIR):
+    path = _manifest_path(versions_dir)
+    if not os.path.exists(path):
+        return {"versions": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def latest_version(versions_dir=MODEL_VERSIONS_DIR):
+    versions = load_manifest(versions_dir)["versions"]
+    return versions[-1] if versions else None
+
+
+def get_version(version, versions_dir=MODEL_VERSIONS_DIR):
+    return next((entry for entry in load_manifest(versions_dir)["versions"] if entry["version"] == version), None)
+
+
+def model_version(model):
+    # Version stamped on the estimator by register_version; None for models saved before versioning
+    return getattr(model, 'model_version_', None)
+
+
+def next_version(versions_dir=MODEL_VERSIONS_DIR):
+    latest = latest_version(versions_dir)
+    return latest["version"] + 1 if latest else 1
+
+
+def _prune_model_files(manifest, keep_versions):
+    # Clears model_file on all but the newest `keep_versions` entries; returns the files to delete
+    pruned = []
+    for entry in manifest["versions"][:-keep_versions]:
+        if entry.get("model_file"):
+            pruned.append(entry["model_file"])
+            entry["model_file"] = None
+            entry["pruned_at"] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return pruned
+
+
+def register_version(model, kind, data_sources, tree_versions=None, metrics=None, training_seconds=None,
+                     parent=None, versions_dir=MODEL_VERSIONS_DIR, keep_versions=DEFAULT_KEEP_VERSIONS):
+    # kind: 'full' (trained from scratch) or 'incremental' (warm-started from `parent`). The version is
+    # stamped on `model` (model_version_), so save the model after registering it to keep the stamp.
+    os.makedirs(versions_dir, exist_ok=True)
+    manifest = load_manifest(versions_dir)
+    version = manifest["versions"][-1]["version"] + 1 if manifest["versions"] else 1
+    model_file = os.path.join(versions_dir, f"risk_model_v{version}.pkl")
+    model.model_version_ = version
+    joblib.dump(model, model_file)
+    n_trees = len(model.estimators_)
+    entry = {
+        "version": version,
+        "kind": kind,
+        "parent": parent,
+        "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "model_file": model_file,
+        "n_estimators": n_trees,
+        "tree_versions": list(tree_versions) if tree_versions is not None else [version] * n_trees,
+        "data_sources": list(data_sources),
+        "training_seconds": training_seconds,
+        "metrics": metrics or {},
+    }
+    manifest["versions"].append(entry)
+    pruned = _prune_model_files(manifest, keep_versions) if keep_versions else []
+    tmp_path = _manifest_path(versions_dir) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, _manifest_path(versions_dir))
+    # Files go only after the manifest stops referencing them, so an interruption leaves a stray file
+    # rather than an entry pointing at a missing one
+    for path in pruned:
+        if os.path.exists(path):
+            os.remove(path)
+    return entry
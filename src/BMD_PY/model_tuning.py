@@ -0,0 +1,212 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy import sparse
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score, precision_score, recall_score
+from sklearn.model_selection import StratifiedKFold, ParameterGrid, ParameterSampler
+
+#---Global Configuration---
+DEFAULT_CV_FOLDS = 5
+DEFAULT_RANDOM_SEARCH_ITERATIONS = 10
+RANDOM_STATE = 42
+
+# Forest parameters searched by the tuning mode. Random search samples from the same lists.
+DEFAULT_PARAM_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 12, 24],
+    'min_samples_leaf': [1, 4],
+    'max_features': ['sqrt', 0.2],
+}
+
+
+#---Shared Feature Matrix---
+# Workers never receive X through pickling: the parent describes where the matrix lives on disk and
+# every worker maps the same .npy files read-only, so all processes share one copy in the page cache.
+def _memmap_filename(array):
+    # Backing .npy file when `array` covers a whole np.load(mmap_mode=...) array (possibly through a
+    # plain view, as scipy wraps CSR components), else None
+    root = array
+    while isinstance(root.base, np.ndarray):
+        root = root.base
+    if not isinstance(root, np.memmap) or not root.filename:
+        return None
+    if root.size != array.size or root.__array_interface__['data'][0] != array.__array_interface__['data'][0]:
+        return None
+    return root.filename
+
+
+def _share_array(array, name, tmp_dir):
+    path = _memmap_filename(array)
+    if path is not None and path.endswith('.npy'):
+        return str(path)
+    path = os.path.join(tmp_dir, name + '.npy')
+    np.save(path, np.asarray(array))
+    return path
+
+
+def share_matrix(X, tmp_dir):
+    # Returns a picklable spec of X backed by .npy files, reusing existing files for memory-mapped input
+    if sparse.issparse(X):
+        X = X.tocsr()
+        return {
+            "sparse": True,
+            "shape": X.shape,
+            "paths": {part: _share_array(getattr(X, part), 'X_' + part, tmp_dir) for part in ('data', 'indices', 'indptr')},
+        }
+    return {"sparse": False, "shape": X.shape, "paths": {"X": _share_array(X, 'X', tmp_dir)}}
+
+
+def open_shared_matrix(spec):
+    arrays = {part: np.load(path, mmap_mode='r') for part, path in spec["paths"].items()}
+    if spec["sparse"]:
+        return sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=spec["shape"], copy=False)
+    return arrays['X']
+
+
+#---Worker Side---
+_worker_state = {}
+
+
+def _init_worker(matrix_spec, y, n_splits, random_state):
+    _worker_state['X'] = open_shared_matrix(matrix_spec)
+    _worker_state['y'] = y
+    # Every process derives the same folds from y, so tasks only carry a fold number
+    folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    _worker_state['folds'] = list(folds.split(np.zeros(len(y)), y))
+
+
+def _fit_fold(task):
+    config_index, fold_index, params = task
+    X, y = _worker_state['X'], _worker_state['y']
+    train_idx, test_idx = _worker_state['folds'][fold_index]
+    model = RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=1, **params)
+    cpu_start = time.process_time()
+    fit_start = time.perf_counter()
+    model.fit(X[train_idx], y[train_idx])
+    fit_seconds = time.perf_counter() - fit_start
+    score_start = time.perf_counter()
+    proba_full = model.predict_proba(X[test_idx])
+    score_seconds = time.perf_counter() - score_start
+    proba = proba_full[:, 1]
+    # Same labels as model.predict (argmax, so 0.5 ties go to the first class) to match main.py's metrics
+    y_pred = model.classes_[np.argmax(proba_full, axis=1)]
+    try:
+        auc_score = roc_auc_score(y[test_idx], proba)
+    except ValueError:
+        auc_score = float('nan')
+    return {
+        "config": config_index,
+        "fold": fold_index,
+        "roc_auc": auc_score,
+        "precision": precision_score(y[test_idx], y_pred, zero_division=0),
+        "recall": recall_score(y[test_idx], y_pred, zero_division=0),
+        "fit_seconds": fit_seconds,
+        "score_seconds": score_seconds,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "worker_pid": os.getpid(),
+    }
+
+
+#---Search Driver---
+def candidate_params(param_grid=DEFAULT_PARAM_GRID, search='grid', n_iter=DEFAULT_RANDOM_SEARCH_ITERATIONS, random_state=RANDOM_STATE):
+    if search == 'grid':
+        return list(ParameterGrid(param_grid))
+    if search == 'random':
+        return list(ParameterSampler(param_grid, n_iter=n_iter, random_state=random_state))
+    raise ValueError(f"Unknown search '{search}'. Use 'grid' or 'random'.")
+
+
+def cross_validate_search(X, y, param_grid=DEFAULT_PARAM_GRID, search='grid', n_iter=DEFAULT_RANDOM_SEARCH_ITERATIONS,
+                          n_splits=DEFAULT_CV_FOLDS, workers=None, random_state=RANDOM_STATE):
+    # Stratified k-fold CV of every candidate configuration; one pool task per (configuration, fold)
+    workers = workers or os.cpu_count() or 1
+    candidates = candidate_params(param_grid, search, n_iter, random_state)
+    y = np.asarray(y)
+    tasks = [(i, fold, params) for i, params in enumerate(candidates) for fold in range(n_splits)]
+    print(f"Cross-validating {len(candidates)} configurations x {n_splits} folds ({len(tasks)} fits) on {workers} workers")
+
+    tmp_dir = tempfile.mkdtemp(prefix='risk_cv_')
+    start = time.perf_counter()
+    fold_results = []
+    try:
+        matrix_spec = share_matrix(X, tmp_dir)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(matrix_spec, y, n_splits, random_state)) as executor:
+            # Largest forests first, so the pool does not end on one long straggler
+            ordered = sorted(tasks, key=lambda task: -task[2].get('n_estimators', 100))
+            futures = [executor.submit(_fit_fold, task) for task in ordered]
+            for future in as_completed(futures):
+                result = future.result()
+                fold_results.append(result)
+                print(f"Config {result['config'] + 1}/{len(candidates)} fold {result['fold'] + 1}: "
+                      f"ROC-AUC {result['roc_auc']:.4f}, fit {result['fit_seconds']:.2f}s")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    wall_seconds = time.perf_counter() - start
+
+    summaries = []
+    for i, params in enumerate(candidates):
+        runs = [r for r in fold_results if r["config"] == i]
+        aucs = np.array([r["roc_auc"] for r in runs])
+        summaries.append({
+            "config": i,
+            "params": params,
+            "mean_roc_auc": float(np.nanmean(aucs)),
+            "std_roc_auc": float(np.nanstd(aucs)),
+            "mean_precision": float(np.mean([r["precision"] for r in runs])),
+            "mean_recall": float(np.mean([r["recall"] for r in runs])),
+            "mean_fit_seconds": float(np.mean([r["fit_seconds"] for r in runs])),
+        })
+    # Best mean ROC-AUC; ties go to the cheaper configuration
+    summaries.sort(key=lambda s: (-s["mean_roc_auc"], s["mean_fit_seconds"]))
+    # CPU time rather than per-task wall time, which is inflated when workers outnumber cores
+    cpu_seconds = sum(r["cpu_seconds"] for r in fold_results)
+    return {
+        "search": search,
+        "n_splits": n_splits,
+        "workers": workers,
+        "rows": X.shape[0],
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "speedup": cpu_seconds / wall_seconds if wall_seconds > 0 else 0.0,
+        "cores": os.cpu_count(),
+        "summaries": summaries,
+        "folds": sorted(fold_results, key=lambda r: (r["config"], r["fold"])),
+        "best": summaries[0],
+    }
+
+
+def _format_params(params):
+    return ', '.join(f"{name}={value}" for name, value in sorted(params.items()))
+
+
+def append_tuning_report(results, report_file):
+    print(f"Appending cross-validation results to {report_file}")
+    best = results["best"]
+    with open(report_file, 'a') as f:
+        f.write(f"\n## Cross-Validation and Hyperparameter Search\n")
+        f.write(f"-**Search:** {results['search']} ({len(results['summaries'])} configurations)\n")
+        f.write(f"-**Folds:** {results['n_splits']}-fold stratified\n")
+        f.write(f"-**Rows:** {results['rows']}\n")
+        f.write(f"-**Workers:** {results['workers']} ({results['cores']} cores available)\n")
+        f.write(f"-**Wall time:** {results['wall_seconds']:.2f}s (worker CPU time {results['cpu_seconds']:.2f}s, "
+                f"{results['speedup']:.2f}x over a single process)\n\n")
+        f.write(f"### Best Configuration\n")
+        f.write(f"`{_format_params(best['params'])}`: mean ROC-AUC {best['mean_roc_auc']:.4f} "
+                f"(std {best['std_roc_auc']:.4f}), precision {best['mean_precision']:.4f}, recall {best['mean_recall']:.4f}\n\n")
+        f.write(f"### Configurations\n")
+        f.write(f"| # | Parameters | Mean ROC-AUC | Std ROC-AUC | Mean precision | Mean recall | Mean fit time (s) |\n")
+        f.write(f"|---|---|---|---|---|---|---|\n")
+        for s in results["summaries"]:
+            f.write(f"| {s['config'] + 1} | {_format_params(s['params'])} | {s['mean_roc_auc']:.4f} | {s['std_roc_auc']:.4f} | "
+                    f"{s['mean_precision']:.4f} | {s['mean_recall']:.4f} | {s['mean_fit_seconds']:.2f} |\n")
+        f.write(f"\n### Per-Fold Timings\n")
+        f.write(f"| # | Fold | ROC-AUC | Fit time (s) | Score time (s) |\n")
+        f.write(f"|---|---|---|---|---|\n")
+        for r in results["folds"]:
+            f.write(f"| {r['config'] + 1} | {r['fold'] + 1} | {r['roc_auc']:.4f} | {r['fit_seconds']:.2f} | {r['score_seconds']:.3f} |\n")
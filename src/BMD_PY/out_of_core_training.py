@@ -0,0 +1,306 @@
+import argparse
+import json
+import math
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from main import (
+    DATA_FILE,
+    MODEL_OUTPUT_FILE,
+    MODEL_FEATURES_FILE,
+    TARGET_COLUMN,
+    EVAL_REPORT_FILE,
+    NUMERIC_FEATURES_FOR_MODEL,
+    model_input_columns,
+    build_preprocessor,
+)
+from preprocessing import PREPROCESSOR_OUTPUT_FILE, matrix_nbytes
+from ingest import iter_transactions
+from model_tuning import share_matrix, open_shared_matrix
+from forest_engine import FlatForest, save_mapped_model, MAPPED_MODEL_OUTPUT_FILE
+from model_registry import register_version
+from drift_monitor import DriftMonitor, DRIFT_SKETCH_FILE
+
+#---Global Configuration---
+DEFAULT_PARTITION_ROWS = 100_000
+DEFAULT_TOTAL_TREES = 100
+DEFAULT_HOLDOUT_FRACTION = 0.25
+DEFAULT_RESERVOIR_ROWS = 5_000
+METRIC_BINS = 10_000
+RANDOM_STATE = 42
+
+
+#---Partition Assignment---
+def holdout_mask(partition_index, n_rows, holdout_fraction=DEFAULT_HOLDOUT_FRACTION):
+    # Deterministic per partition, so every pass over the data agrees on which rows are held out
+    rng = np.random.default_rng([RANDOM_STATE, partition_index])
+    return rng.random(n_rows) < holdout_fraction
+
+
+# Uniform sample of up to `capacity` training rows per class (bottom-k of random keys). Partitions of
+# a file sorted by user or time can miss a class entirely; sampled rows of the missing classes are
+# mixed into those partitions so that every sub-forest is fitted on the full class set.
+class ClassReservoir:
+    def __init__(self, capacity=DEFAULT_RESERVOIR_ROWS):
+        self.capacity = capacity
+        self.samples = {}
+        self.rng = np.random.default_rng([RANDOM_STATE, 1])
+
+    def update(self, df):
+        keys = self.rng.random(len(df))
+        for label, rows in df.groupby(TARGET_COLUMN, observed=True).indices.items():
+            candidates = df.iloc[rows].assign(_reservoir_key=keys[rows])
+            if label in self.samples:
+                candidates = pd.concat([self.samples[label], candidates])
+            self.samples[label] = candidates.nsmallest(self.capacity, '_reservoir_key')
+
+    @property
+    def classes(self):
+        return sorted(self.samples)
+
+    def rows_for(self, labels):
+        parts = [self.samples[label].drop(columns='_reservoir_key') for label in labels if label in self.samples]
+        return pd.concat(parts) if parts else None
+
+
+#---Streaming Evaluation---
+# Binary classification metrics accumulated batch by batch in O(METRIC_BINS) memory. ROC-AUC comes from
+# per-class score histograms (ties within a bin count one half), which is exact for forests with fewer
+# trees than bins since their probabilities fall on a coarse grid.
+class StreamingBinaryMetrics:
+    def __init__(self, bins=METRIC_BINS, threshold=0.5):
+        self.bins = bins
+        self.threshold = threshold
+        self.positive_hist = np.zeros(bins, dtype=np.int64)
+        self.negative_hist = np.zeros(bins, dtype=np.int64)
+        self.confusion = np.zeros((2, 2), dtype=np.int64)
+
+    def update(self, y_true, proba):
+        y_true = np.asarray(y_true).astype(bool)
+        bucket = np.minimum((np.asarray(proba) * self.bins).astype(np.int64), self.bins - 1)
+        self.positive_hist += np.bincount(bucket[y_true], minlength=self.bins)
+        self.negative_hist += np.bincount(bucket[~y_true], minlength=self.bins)
+        y_pred = np.asarray(proba) >= self.threshold
+        np.add.at(self.confusion, (y_true.astype(int), y_pred.astype(int)), 1)
+
+    def result(self):
+        positives, negatives = self.positive_hist.sum(), self.negative_hist.sum()
+        if positives and negatives:
+            negatives_below = np.cumsum(self.negative_hist) - self.negative_hist
+            auc_score = float((self.positive_hist * (negatives_below + 0.5 * self.negative_hist)).sum() / (positives * negatives))
+        else:
+            auc_score = float('nan')
+        tn, fp, fn, tp = self.confusion.ravel()
+        return {
+            "rows": int(positives + negatives),
+            "roc_auc": auc_score,
+            "precision": float(tp / (tp + fp)) if tp + fp else 0.0,
+            "recall": float(tp / (tp + fn)) if tp + fn else 0.0,
+            "confusion_matrix": self.confusion.tolist(),
+        }
+
+
+#---Sub-Forest Workers---
+def _fit_sub_forest(task):
+    matrix_spec, y, n_trees, random_state = task
+    X = open_shared_matrix(matrix_spec)
+    start = time.perf_counter()
+    model = RandomForestClassifier(n_estimators=n_trees, random_state=random_state, n_jobs=1)
+    model.fit(X, y)
+    return model, time.perf_counter() - start
+
+
+def merge_forests(forests):
+    # Concatenates fitted forests over the same feature layout and classes into one RandomForestClassifier
+    merged = forests[0]
+    for forest in forests[1:]:
+        if forest.n_features_in_ != merged.n_features_in_ or not np.array_equal(forest.classes_, merged.classes_):
+            raise ValueError("Sub-forests were fitted on different feature layouts or class sets.")
+    merged.estimators_ = [tree for forest in forests for tree in forest.estimators_]
+    merged.n_estimators = len(merged.estimators_)
+    return merged
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+#---Out-of-Core Training---
+def train_out_of_core(data_path=DATA_FILE, partition_rows=DEFAULT_PARTITION_ROWS, total_trees=DEFAULT_TOTAL_TREES,
+                      workers=None, holdout_fraction=DEFAULT_HOLDOUT_FRACTION, reservoir_rows=DEFAULT_RESERVOIR_ROWS):
+    print(f"--- Out-of-core training on {data_path} ({partition_rows} rows per partition) ---")
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"Data file '{data_path}' not found.")
+    workers = workers or os.cpu_count() or 1
+    columns = model_input_columns()
+    start = time.perf_counter()
+
+    # Pass 1: fit the preprocessor, count partitions and sample training rows per class
+    reservoir = ClassReservoir(reservoir_rows)
+    counts = {"partitions": 0, "rows": 0}
+
+    def fitting_chunks():
+        for index, chunk in enumerate(iter_transactions(data_path, partition_rows, columns)):
+            chunk = chunk.dropna(subset=[TARGET_COLUMN])
+            counts["partitions"] += 1
+            counts["rows"] += len(chunk)
+            reservoir.update(chunk[~holdout_mask(index, len(chunk), holdout_fraction)])
+            yield chunk
+
+    preprocessor = build_preprocessor().fit_chunks(fitting_chunks())
+    n_partitions = counts["partitions"]
+    trees_per_partition = max(1, math.ceil(total_trees / n_partitions))
+    classes = reservoir.classes
+    fit_pass_seconds = time.perf_counter() - start
+    print(f"Pass 1: fitted preprocessor on {counts['rows']} rows in {n_partitions} partitions ({fit_pass_seconds:.2f}s), "
+          f"{len(preprocessor.feature_names_)} features, {len(classes)} classes")
+    if len(classes) < 2:
+        raise ValueError(f"Training data contains a single class {classes}; nothing to learn.")
+
+    # Pass 2: transform each partition and fit its sub-forest on the process pool. At most `workers`
+    # partitions are in flight, so memory stays bounded by partition size regardless of dataset size.
+    tmp_dir = tempfile.mkdtemp(prefix='risk_ooc_')
+    sub_forests = [None] * n_partitions
+    fit_seconds = [0.0] * n_partitions
+    max_partition_bytes = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+
+            def collect(done):
+                for future in done:
+                    index, part_dir = pending.pop(future)
+                    sub_forests[index], fit_seconds[index] = future.result()
+                    shutil.rmtree(part_dir, ignore_errors=True)
+                    print(f"Partition {index + 1}/{n_partitions}: {trees_per_partition} trees in {fit_seconds[index]:.2f}s")
+
+            for index, chunk in enumerate(iter_transactions(data_path, partition_rows, columns)):
+                chunk = chunk.dropna(subset=[TARGET_COLUMN])
+                train = chunk[~holdout_mask(index, len(chunk), holdout_fraction)]
+                present = set(train[TARGET_COLUMN].unique())
+                missing = [label for label in classes if label not in present]
+                if missing:
+                    train = pd.concat([train, reservoir.rows_for(missing)])
+                X = preprocessor.transform(train)
+                max_partition_bytes = max(max_partition_bytes, matrix_nbytes(X))
+                part_dir = os.path.join(tmp_dir, f"part_{index}")
+                os.makedirs(part_dir)
+                task = (share_matrix(X, part_dir), train[TARGET_COLUMN].to_numpy(), trees_per_partition, RANDOM_STATE + index)
+                del X
+                pending[executor.submit(_fit_sub_forest, task)] = (index, part_dir)
+                if len(pending) >= workers:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            while pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    model = merge_forests(sub_forests)
+    training_seconds = time.perf_counter() - start - fit_pass_seconds
+    print(f"Pass 2: merged {n_partitions} sub-forests into {model.n_estimators} trees ({training_seconds:.2f}s)")
+
+    # Pass 3: stream the held-out rows through the merged forest. They also build the drift reference:
+    # bin edges from the first held-out partition, then counts of every held-out row and its score (a
+    # random sample of the same distribution as the training rows)
+    eval_start = time.perf_counter()
+    metrics = StreamingBinaryMetrics()
+    drift_monitor = None
+    for index, chunk in enumerate(iter_transactions(data_path, partition_rows, columns)):
+        chunk = chunk.dropna(subset=[TARGET_COLUMN])
+        holdout = chunk[holdout_mask(index, len(chunk), holdout_fraction)]
+        if len(holdout):
+            X = preprocessor.transform(holdout)
+            proba = model.predict_proba(X)[:, 1]
+            metrics.update(holdout[TARGET_COLUMN].to_numpy() == classes[-1], proba)
+            if drift_monitor is None:
+                drift_monitor = DriftMonitor.fit(X, preprocessor.feature_names_, NUMERIC_FEATURES_FOR_MODEL, scores=proba)
+            else:
+                drift_monitor.add_reference(X, proba)
+    evaluation = metrics.result()
+    eval_seconds = time.perf_counter() - eval_start
+    print(f"Pass 3: evaluated {evaluation['rows']} held-out rows in {eval_seconds:.2f}s: ROC-AUC {evaluation['roc_auc']:.4f}, "
+          f"precision {evaluation['precision']:.4f}, recall {evaluation['recall']:.4f}")
+
+    print(f"\nSaving model to {MODEL_OUTPUT_FILE}, preprocessor to {PREPROCESSOR_OUTPUT_FILE}")
+    version = register_version(
+        model, 'full', [data_path], training_seconds=training_seconds,
+        metrics={name: evaluation[name] for name in ('roc_auc', 'precision', 'recall')},
+    )["version"]
+    joblib.dump(model, MODEL_OUTPUT_FILE)
+    preprocessor.save(PREPROCESSOR_OUTPUT_FILE)
+    with open(MODEL_FEATURES_FILE, 'w') as f:
+        json.dump(preprocessor.feature_names_, f)
+    save_mapped_model(
+        FlatForest.from_sklearn(model), MAPPED_MODEL_OUTPUT_FILE, feature_names=preprocessor.feature_names_,
+        metadata={"model_type": "RandomForestClassifier", "n_estimators": model.n_estimators, "target_column": TARGET_COLUMN,
+                  "model_version": version},
+    )
+    if drift_monitor is not None:
+        drift_monitor.model_version = version
+        print(f"Drift sketches for version {version} saved to {drift_monitor.save(DRIFT_SKETCH_FILE)}")
+    else:
+        print(f"No held-out rows: drift sketches in {DRIFT_SKETCH_FILE} were not refitted")
+
+    results = {
+        "data_path": data_path,
+        "version": version,
+        "rows": counts["rows"],
+        "partitions": n_partitions,
+        "partition_rows": partition_rows,
+        "trees_per_partition": trees_per_partition,
+        "n_estimators": model.n_estimators,
+        "workers": workers,
+        "fit_pass_seconds": fit_pass_seconds,
+        "training_seconds": training_seconds,
+        "eval_seconds": eval_seconds,
+        "partition_fit_seconds": fit_seconds,
+        "max_partition_mb": max_partition_bytes / 1e6,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_worker_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "evaluation": evaluation,
+    }
+    append_out_of_core_report(results)
+    return results
+
+
+def append_out_of_core_report(results, report_file=EVAL_REPORT_FILE):
+    print(f"Appending out-of-core training results to {report_file}")
+    evaluation = results["evaluation"]
+    with open(report_file, 'a') as f:
+        f.write(f"\n## Out-of-Core Training (version {results['version']})\n")
+        f.write(f"-**Data:** `{results['data_path']}`, {results['rows']} rows in {results['partitions']} partitions "
+                f"of up to {results['partition_rows']} rows\n")
+        f.write(f"-**Forest:** {results['n_estimators']} trees ({results['trees_per_partition']} per partition, "
+                f"fitted on {results['workers']} workers)\n")
+        f.write(f"-**Timings:** preprocessor pass {results['fit_pass_seconds']:.2f}s, training pass {results['training_seconds']:.2f}s, "
+                f"evaluation pass {results['eval_seconds']:.2f}s\n")
+        f.write(f"-**Memory:** largest partition matrix {results['max_partition_mb']:.2f} MB, peak RSS {results['peak_rss_mb']:.0f} MB "
+                f"(workers {results['peak_worker_rss_mb']:.0f} MB)\n\n")
+        f.write(f"### Streaming Evaluation on Held-Out Rows\n")
+        f.write(f"-**Held-out rows:** {evaluation['rows']}\n")
+        f.write(f"-**ROC-AUC Score:** {evaluation['roc_auc']:.4f}\n")
+        f.write(f"-**Precision Score:** {evaluation['precision']:.4f}\n")
+        f.write(f"-**Recall Score:** {evaluation['recall']:.4f}\n")
+        f.write(f"```\n{np.array(evaluation['confusion_matrix'])}\n```\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the risk forest on data larger than memory by streaming partitions.")
+    parser.add_argument('input', nargs='?', default=DATA_FILE, help="Transaction CSV file, Parquet file or partitioned Parquet directory.")
+    parser.add_argument('--partition-rows', type=int, default=DEFAULT_PARTITION_ROWS, help="Rows per streamed partition (bounds peak memory).")
+    parser.add_argument('--trees', type=int, default=DEFAULT_TOTAL_TREES, help="Approximate total trees, split evenly across partitions.")
+    parser.add_argument('--workers', type=int, default=None, help="Processes fitting sub-forests (default: all cores).")
+    parser.add_argument('--holdout-fraction', type=float, default=DEFAULT_HOLDOUT_FRACTION)
+    parser.add_argument('--reservoir-rows', type=int, default=DEFAULT_RESERVOIR_ROWS, help="Sampled rows per class mixed into partitions missing that class.")
+    args = parser.parse_args()
+
+    train_out_of_core(args.input, args.partition_rows, args.trees, args.workers, args.holdout_fraction, args.reservoir_rows)
@@ -0,0 +1,283 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+import joblib
+from scipy import sparse
+
+from instrumentation import stage
+
+#---Global Configuration---
+PREPROCESSOR_OUTPUT_FILE = 'risk_preprocessor.pkl'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOGIN_TIME_FORMAT = '%H:%M'
+
+#---Categorical Encodings---
+# onehot:        dense one-hot, identical to pd.get_dummies(drop_first=True) (the original layout)
+# sparse_onehot: the same columns as a CSR matrix
+# hashing:       every (column, value) pair hashed into a fixed number of shared CSR buckets
+# frequency:     one column per categorical holding the value's training frequency (unseen -> 0)
+# ordinal:       one column per categorical holding the value's sorted training level index + 1 (unseen -> 0)
+CATEGORICAL_ENCODINGS = ['onehot', 'sparse_onehot', 'hashing', 'frequency', 'ordinal']
+SPARSE_ENCODINGS = ['sparse_onehot', 'hashing']
+DEFAULT_CATEGORICAL_ENCODING = 'onehot'
+DEFAULT_HASH_BUCKETS = 2 ** 12
+
+# Columns derived from each raw time feature, in the order they are appended to the layout
+TIME_FEATURE_EXPANSIONS = {
+    'timestamp': ['timestamp_hour', 'timestamp_day_of_week', 'timestamp_month'],
+    'login_time_pattern': ['login_time_pattern_hour', 'login_time_pattern_minute'],
+    'tx_hour': ['tx_hour'],
+}
+
+
+def matrix_nbytes(X):
+    if sparse.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+
+# Fitted preprocessing shared by training and scoring.
+# Reproduces the column layout of the original inline steps in train_evaluate_model (time-feature
+# expansion, pd.get_dummies(drop_first=True), column-mean imputation) but keeps the fitted state
+# (category levels, imputation means), so any batch of raw transactions maps to exactly the training
+# columns without re-running get_dummies and reindexing. High-cardinality categoricals can instead use
+# one of the compact CATEGORICAL_ENCODINGS.
+class RiskFeatureTransformer:
+    def __init__(self, numeric_features, boolean_features, categorical_features, time_features,
+                 categorical_encoding=DEFAULT_CATEGORICAL_ENCODING, hash_buckets=DEFAULT_HASH_BUCKETS):
+        if categorical_encoding not in CATEGORICAL_ENCODINGS:
+            raise ValueError(f"Unknown categorical encoding '{categorical_encoding}'. Use one of {CATEGORICAL_ENCODINGS}.")
+        self.numeric_features = list(numeric_features)
+        self.boolean_features = list(boolean_features)
+        self.categorical_features = list(categorical_features)
+        self.time_features = list(time_features)
+        self.categorical_encoding = categorical_encoding
+        self.hash_buckets = int(hash_buckets)
+        self.fitted_ = False
+
+    #---Fitting---
+    def fit(self, df):
+        return self.fit_chunks([df])
+
+    def fit_chunks(self, chunks):
+        # Single pass over an iterable of DataFrames (e.g. CSV chunks); the fitted state equals
+        # fit(pd.concat(chunks)) while only one chunk is held in memory. The column layout follows the first chunk.
+        value_counts = {}
+        dense_sums = dense_counts = None
+        for df in chunks:
+            if dense_sums is None:
+                self._fit_dense_layout(df)
+                dense_sums = np.zeros(len(self.dense_features_))
+                dense_counts = np.zeros(len(self.dense_features_), dtype=np.int64)
+            for col in self.categorical_inputs_:
+                counts = df[col].value_counts() if col in df.columns else pd.Series(dtype=np.int64)
+                counts = counts[counts > 0]
+                counts.index = counts.index.astype(object)
+                value_counts[col] = counts if col not in value_counts else value_counts[col].add(counts, fill_value=0)
+            dense = self._dense_block(df, impute=False)
+            dense_sums += np.nansum(dense, axis=0)
+            dense_counts += (~np.isnan(dense)).sum(axis=0)
+        if dense_sums is None:
+            raise ValueError("RiskFeatureTransformer.fit_chunks() received no data.")
+
+        self.category_levels_ = {}
+        self.category_values_ = {}
+        self.category_offsets_ = {}
+        self.feature_names_ = list(self.dense_features_)
+        encoding = self.categorical_encoding
+        for col in self.categorical_inputs_:
+            counts = value_counts[col].sort_index()
+            if encoding in ('onehot', 'sparse_onehot'):
+                # Category levels exactly as pd.get_dummies orders them; drop_first=True drops the smallest level
+                levels = counts.index.tolist()
+                self.category_levels_[col] = levels[1:]
+                self.category_offsets_[col] = len(self.feature_names_)
+                self.feature_names_.extend(f'{col}_{level}' for level in self.category_levels_[col])
+            elif encoding == 'frequency':
+                self.category_levels_[col] = counts.index.tolist()
+                self.category_values_[col] = counts.to_numpy(dtype=np.float64) / counts.sum()
+                self.feature_names_.append(f'{col}_frequency')
+            elif encoding == 'ordinal':
+                levels = counts.index.tolist()
+                self.category_levels_[col] = levels
+                self.category_values_[col] = np.arange(1, len(levels) + 1, dtype=np.float64)
+                self.feature_names_.append(f'{col}_ordinal')
+        if encoding == 'hashing':
+            self.hash_offset_ = len(self.feature_names_)
+            self.feature_names_.extend(f'hash_{i}' for i in range(self.hash_buckets))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = dense_sums / dense_counts
+        self.imputation_means_ = np.where(dense_counts > 0, means, 0.0)
+        self.fitted_ = True
+        return self
+
+    def _fit_dense_layout(self, df):
+        self.dense_inputs_ = [col for col in self.numeric_features + self.boolean_features if col in df.columns]
+        self.time_inputs_ = [col for col in self.time_features if col in df.columns]
+        # get_dummies keeps non-categorical columns first (time features move to the end as they are expanded)
+        self.dense_features_ = list(self.dense_inputs_)
+        if 'tx_hour' in self.time_inputs_:
+            self.dense_features_.append('tx_hour')
+        for col in self.time_inputs_:
+            if col != 'tx_hour':
+                self.dense_features_.extend(TIME_FEATURE_EXPANSIONS[col])
+        self.categorical_inputs_ = [col for col in self.categorical_features if col in df.columns]
+
+    def fit_transform(self, df, dtype=np.float32, sparse_output=None):
+        return self.fit(df).transform(df, dtype=dtype, sparse_output=sparse_output)
+
+    #---Transformation---
+    def _dense_block(self, df, impute=True):
+        n = df.shape[0]
+        block = np.empty((n, len(self.dense_features_)), dtype=np.float64)
+        j = 0
+        for col in self.dense_inputs_:
+            block[:, j] = self._numeric_column(df, col)
+            j += 1
+        if 'tx_hour' in self.time_inputs_:
+            block[:, j] = self._numeric_column(df, 'tx_hour')
+            j += 1
+        with stage('time_features'):
+            for col in self.time_inputs_:
+                if col == 'timestamp':
+                    ts = df[col] if col in df.columns else pd.Series(pd.NaT, index=df.index)
+                    if not pd.api.types.is_datetime64_any_dtype(ts):
+                        ts = pd.to_datetime(ts, format=TIMESTAMP_FORMAT, errors='coerce')
+                    block[:, j] = ts.dt.hour.to_numpy(dtype=np.float64, na_value=np.nan)
+                    block[:, j + 1] = ts.dt.dayofweek.to_numpy(dtype=np.float64, na_value=np.nan)
+                    block[:, j + 2] = ts.dt.month.to_numpy(dtype=np.float64, na_value=np.nan)
+                    j += 3
+                elif col == 'login_time_pattern':
+                    raw = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+                    if isinstance(raw.dtype, pd.CategoricalDtype):
+                        # Parse each distinct pattern once and broadcast through the category codes
+                        times = pd.to_datetime(raw.cat.categories.astype(str), format=LOGIN_TIME_FORMAT, errors='coerce')
+                        codes = raw.cat.codes.to_numpy()
+                        hours = np.append(times.hour.to_numpy(dtype=np.float64, na_value=np.nan), np.nan)
+                        minutes = np.append(times.minute.to_numpy(dtype=np.float64, na_value=np.nan), np.nan)
+                        block[:, j] = hours[codes]
+                        block[:, j + 1] = minutes[codes]
+                    else:
+                        times = pd.to_datetime(raw.astype(str), format=LOGIN_TIME_FORMAT, errors='coerce')
+                        block[:, j] = times.dt.hour.to_numpy(dtype=np.float64, na_value=np.nan)
+                        block[:, j + 1] = times.dt.minute.to_numpy(dtype=np.float64, na_value=np.nan)
+                    j += 2
+        if impute:
+            with stage('imputation'):
+                self.impute(block)
+        return block
+
+    @staticmethod
+    def _numeric_column(df, col):
+        if col not in df.columns:
+            return np.full(df.shape[0], np.nan)
+        return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def _category_codes(self, df, col):
+        # Position of each row's value in the fitted levels; -1 for missing, unseen or dropped levels
+        if col not in df.columns:
+            return np.full(df.shape[0], -1, dtype=np.int64)
+        return pd.Categorical(df[col], categories=self.category_levels_[col]).codes.astype(np.int64)
+
+    def _hashed_buckets(self, df, col):
+        # Hash only the distinct values of the batch, then broadcast the buckets back to the rows
+        if col not in df.columns:
+            return np.full(df.shape[0], -1, dtype=np.int64)
+        codes, uniques = pd.factorize(df[col])
+        buckets = np.fromiter(
+            (zlib.crc32(f'{col}={value}'.encode('utf-8')) % self.hash_buckets for value in uniques),
+            dtype=np.int64, count=len(uniques),
+        )
+        return np.where(codes >= 0, buckets[codes] + self.hash_offset_, -1)
+
+    def _category_entries(self, df):
+        # (rows, output columns) of the one-hot / hashed entries for all categorical columns
+        row_parts, col_parts = [], []
+        for col in self.categorical_inputs_:
+            if self.categorical_encoding == 'hashing':
+                cols = self._hashed_buckets(df, col)
+            else:
+                codes = self._category_codes(df, col)
+                cols = np.where(codes >= 0, codes + self.category_offsets_[col], -1)
+            rows = np.flatnonzero(cols >= 0)
+            row_parts.append(rows)
+            col_parts.append(cols[rows])
+        if not row_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(row_parts), np.concatenate(col_parts)
+
+    def _category_value_block(self, df):
+        # Frequency / ordinal encodings: one numeric column per categorical, 0 for unseen values
+        block = np.zeros((df.shape[0], len(self.categorical_inputs_)), dtype=np.float64)
+        for j, col in enumerate(self.categorical_inputs_):
+            codes = self._category_codes(df, col)
+            known = codes >= 0
+            block[known, j] = self.category_values_[col][codes[known]]
+        return block
+
+    #---Transformation Stages---
+    # The steps transform() runs, exposed separately so they can be timed (benchmarks.py) without
+    # depending on the private helpers behind them
+    def dense_block(self, df, impute=True):
+        # Numeric, boolean and time features as a float64 matrix with columns dense_features_
+        return self._dense_block(df, impute=impute)
+
+    def impute(self, block):
+        # Fills NaNs in a dense block in place with the training means
+        missing = np.isnan(block)
+        if missing.any():
+            block[missing] = np.take(self.imputation_means_, np.nonzero(missing)[1])
+        return block
+
+    def categorical_block(self, df):
+        # Frequency / ordinal encodings: one value column per categorical. One-hot / hashing: the
+        # (rows, output columns) of the entries set to one
+        if self.categorical_encoding in ('frequency', 'ordinal'):
+            return self._category_value_block(df)
+        return self._category_entries(df)
+
+    def transform(self, df, dtype=np.float32, sparse_output=None):
+        if not self.fitted_:
+            raise RuntimeError("RiskFeatureTransformer must be fitted before calling transform().")
+        if sparse_output is None:
+            sparse_output = self.categorical_encoding in SPARSE_ENCODINGS
+        n = df.shape[0]
+        with stage('numeric_and_time_features'):
+            dense = self._dense_block(df)
+        with stage('categorical_encoding'):
+            if self.categorical_encoding in ('frequency', 'ordinal'):
+                dense = np.hstack([dense, self._category_value_block(df)])
+                rows, cols = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            else:
+                rows, cols = self._category_entries(df)
+        n_dense = dense.shape[1]
+
+        if sparse_output:
+            matrix = sparse.csr_matrix(
+                (
+                    np.concatenate([dense.ravel(), np.ones(len(rows))]).astype(dtype),
+                    (np.concatenate([np.repeat(np.arange(n), n_dense), rows]), np.concatenate([np.tile(np.arange(n_dense), n), cols])),
+                ),
+                shape=(n, len(self.feature_names_)),
+            )
+            matrix.eliminate_zeros()
+            return matrix
+
+        out = np.zeros((n, len(self.feature_names_)), dtype=dtype)
+        out[:, :n_dense] = dense
+        if self.categorical_encoding == 'hashing':
+            # Colliding buckets count every value, like the summed CSR entries
+            np.add.at(out, (rows, cols), 1)
+        else:
+            out[rows, cols] = 1
+        return out
+
+    #---Persistence---
+    def save(self, path=PREPROCESSOR_OUTPUT_FILE):
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path=PREPROCESSOR_OUTPUT_FILE):
+        return joblib.load(path)
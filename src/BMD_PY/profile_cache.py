@@ -0,0 +1,207 @@
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+#---Global Configuration---
+DEFAULT_CAPACITY = 100_000
+DEFAULT_TTL_SECONDS = 15 * 60
+# A warning is printed when the share of lookups answered (from the cache or its loader) over a window of
+# this many lookups drops below HIT_RATE_WARNING
+HIT_RATE_WINDOW = 10_000
+HIT_RATE_WARNING = 0.5
+
+# Per-user profile values from feature_schema.json that scoring needs but a raw transaction does not carry
+PROFILE_FEATURES = [
+    'avg_tx_amount_user',
+    'std_tx_amount_user',
+    'avg_tx_hour_user',
+    'device_change_freq',
+    'location_change_freq',
+]
+
+
+# Bounded in-process cache of user profiles keyed by user_id, with LRU eviction and TTL expiry.
+# Profile values live in one preallocated float64 matrix (one row per slot) with a parallel expiry array;
+# the only per-user Python object is the OrderedDict entry mapping user_id -> slot, which also keeps
+# the LRU order.
+class UserProfileCache:
+    def __init__(self, capacity=DEFAULT_CAPACITY, ttl_seconds=DEFAULT_TTL_SECONDS, features=PROFILE_FEATURES, loader=None, clock=time.monotonic):
+        if capacity <= 0:
+            raise ValueError("Profile cache capacity must be positive.")
+        self.capacity = int(capacity)
+        self.ttl_seconds = float(ttl_seconds)
+        self.features = list(features)
+        # loader(user_id) -> sequence of feature values, or None; called on misses
+        self.loader = loader
+        self.clock = clock
+        self.values = np.full((self.capacity, len(self.features)), np.nan)
+        self.expires_at = np.zeros(self.capacity)
+        self.slots = OrderedDict()
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.window_answered = 0
+        self.window_lookups = 0
+        self.window_answer_rate = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _release(self, user_id):
+        self.free_slots.append(self.slots.pop(user_id))
+
+    def put(self, user_id, values, now=None):
+        now = self.clock() if now is None else now
+        slot = self.slots.get(user_id)
+        if slot is None:
+            if not self.free_slots:
+                self._release(next(iter(self.slots)))
+                self.evictions += 1
+            slot = self.free_slots.pop()
+            self.slots[user_id] = slot
+        else:
+            self.slots.move_to_end(user_id)
+        self.values[slot] = values
+        self.expires_at[slot] = now + self.ttl_seconds
+
+    def _record_lookup(self, answered):
+        self.window_answered += answered
+        self.window_lookups += 1
+        if self.window_lookups < HIT_RATE_WINDOW:
+            return
+        rate = self.window_answered / self.window_lookups
+        if rate < HIT_RATE_WARNING and (self.window_answer_rate is None or self.window_answer_rate >= HIT_RATE_WARNING):
+            print(f"WARNING: user profile cache answered only {rate:.1%} of the last {self.window_lookups} lookups "
+                  f"({len(self.slots)}/{self.capacity} cached, {self.expirations} expirations, {self.evictions} evictions)")
+        self.window_answer_rate = rate
+        self.window_answered = self.window_lookups = 0
+
+    def get(self, user_id, now=None):
+        # Returns a copy of the cached profile row (slots are reused after eviction) or None
+        now = self.clock() if now is None else now
+        slot = self.slots.get(user_id)
+        if slot is not None:
+            if self.expires_at[slot] > now:
+                self.slots.move_to_end(user_id)
+                self.hits += 1
+                self._record_lookup(True)
+                return self.values[slot].copy()
+            self._release(user_id)
+            self.expirations += 1
+        self.misses += 1
+        if self.loader is not None:
+            loaded = self.loader(user_id)
+            if loaded is not None:
+                self.put(user_id, loaded, now)
+                self._record_lookup(True)
+                return self.values[self.slots[user_id]].copy()
+        self._record_lookup(False)
+        return None
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self.slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "window_answer_rate": None if self.window_answer_rate is None else round(self.window_answer_rate, 4),
+            "bytes": self.values.nbytes + self.expires_at.nbytes,
+        }
+        # A loader holding its own data (ProfileSnapshotLoader) reports it alongside the cache
+        if hasattr(self.loader, 'stats'):
+            stats["loader"] = self.loader.stats()
+            stats["bytes"] += stats["loader"]["bytes"]
+        return stats
+
+    #---Warm-up---
+    def warm_up(self, latest):
+        # latest: profiles indexed by user_id, oldest first (see latest_profiles). Only the most recent
+        # `capacity` users fit; they are inserted oldest first so the LRU order matches recency.
+        latest = latest.iloc[-self.capacity:]
+        now = self.clock()
+        for user_id, row in zip(latest.index, latest.to_numpy(dtype=np.float64)):
+            self.put(user_id, row, now)
+        return len(latest)
+
+    def warm_up_from_file(self, path, chunk_rows=500_000):
+        print(f"Warming up user profile cache from {path}")
+        start = time.perf_counter()
+        loaded = self.warm_up(latest_profiles(path, self.features, chunk_rows))
+        print(f"Loaded {loaded} user profiles in {time.perf_counter() - start:.2f}s")
+        return loaded
+
+    #---Scoring Integration---
+    def enrich(self, df):
+        # Fills missing profile columns / NaN profile values in a transaction batch from the cache.
+        # Each distinct user in the batch is looked up once.
+        if 'user_id' not in df.columns:
+            return df
+        missing = [col for col in self.features if col not in df.columns or df[col].isna().any()]
+        if not missing:
+            return df
+        df = df.copy()
+        codes, users = pd.factorize(df['user_id'])
+        profiles = np.full((len(users), len(self.features)), np.nan)
+        now = self.clock()
+        for i, user_id in enumerate(users):
+            row = self.get(user_id, now)
+            if row is not None:
+                profiles[i] = row
+        known = codes >= 0
+        for col in missing:
+            j = self.features.index(col)
+            cached = np.full(len(df), np.nan)
+            cached[known] = profiles[codes[known], j]
+            df[col] = df[col].fillna(pd.Series(cached, index=df.index)) if col in df.columns else cached
+        return df
+
+
+#---Warm-up Data---
+def latest_profiles(path, features=PROFILE_FEATURES, chunk_rows=500_000):
+    # Latest profile of every user in a transaction CSV/Parquet file (later rows win), indexed by user_id
+    # and ordered by the position of that row in the file
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Profile warm-up file '{path}' not found.")
+    columns = ['user_id'] + list(features)
+    if path.endswith('.parquet') or os.path.isdir(path):
+        chunks = [pd.read_parquet(path, columns=columns)]
+    else:
+        chunks = pd.read_csv(path, usecols=lambda col: col in columns, chunksize=chunk_rows)
+    latest = None
+    offset = 0
+    for chunk in chunks:
+        # Last row (not the last non-null value per column) of each user, with its position in the file
+        chunk = chunk.assign(_row=np.arange(offset, offset + len(chunk)))
+        offset += len(chunk)
+        last = chunk.groupby('user_id', sort=False).tail(1)
+        latest = last if latest is None else pd.concat([latest, last]).groupby('user_id', sort=False).tail(1)
+    if latest is None:
+        return pd.DataFrame(columns=list(features), dtype=np.float64)
+    return latest.sort_values('_row').set_index('user_id').reindex(columns=list(features))
+
+
+# Opt-in loader answering cache misses from a frozen table of profiles (e.g. latest_profiles of the
+# warm-up file). It holds every user in the table, so memory grows with the user population rather than
+# the cache capacity, and reloaded values never change: TTL expiry only refreshes the LRU position.
+class ProfileSnapshotLoader:
+    def __init__(self, profiles):
+        self.index = profiles.index
+        self.values = profiles.to_numpy(dtype=np.float64)
+
+    def __call__(self, user_id):
+        try:
+            return self.values[self.index.get_loc(user_id)]
+        except KeyError:
+            return None
+
+    def stats(self):
+        return {"profiles": len(self.index), "bytes": int(self.values.nbytes + self.index.memory_usage(deep=True))}
@@ -0,0 +1,222 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from preprocessing import RiskFeatureTransformer, PREPROCESSOR_OUTPUT_FILE
+from forest_engine import FlatForest, load_mapped_model
+from drift_monitor import DriftMonitor, DRIFT_SKETCH_FILE, print_drift, window_path
+from model_registry import model_version as registered_version
+
+#---Global Configuration---
+MODEL_FILE = 'risk_model.pkl'
+SCORES_OUTPUT_FILE = 'risk_scores.csv'
+SCORE_COLUMN = 'risk_score'
+DEFAULT_CHUNK_ROWS = 200_000
+DEFAULT_ID_COLUMNS = ['tx_id', 'user_id']
+# Input sources missing more model features than this are rejected: the preprocessor imputes absent
+# features with training defaults, so such scores are close to constant and say little about risk
+DEFAULT_MAX_MISSING_FEATURES = 5
+
+
+# Loads the trained model and its fitted preprocessor once and scores raw transaction batches.
+class RiskScorer:
+    def __init__(self, model, preprocessor, profile_cache=None, drift_monitor=None, model_version=None):
+        self.model = model
+        self.preprocessor = preprocessor
+        # Registry version of the model when it can be determined; drift sketches must match it
+        self.model_version = model_version
+        # Optional UserProfileCache filling per-user profile features missing from incoming transactions
+        self.profile_cache = profile_cache
+        # Optional DriftMonitor updated with every scored batch
+        self.drift_monitor = drift_monitor
+
+    @classmethod
+    def load(cls, model_path=MODEL_FILE, preprocessor_path=PREPROCESSOR_OUTPUT_FILE, n_jobs=None, engine='sklearn'):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file '{model_path}' not found. Please run 'main.py' first.")
+        if not os.path.exists(preprocessor_path):
+            raise FileNotFoundError(f"Preprocessor file '{preprocessor_path}' not found. Please run 'main.py' first.")
+        preprocessor = RiskFeatureTransformer.load(preprocessor_path)
+        if model_path.endswith('.rmf'):
+            # Memory-mapped flat forest: near-instant load, pages shared across worker processes
+            model, header = load_mapped_model(model_path)
+            if header.get("feature_names") is not None and header["feature_names"] != preprocessor.feature_names_:
+                raise ValueError(f"Feature layout in '{model_path}' does not match preprocessor '{preprocessor_path}'.")
+            return cls(model, preprocessor, model_version=header.get("metadata", {}).get("model_version"))
+        model = joblib.load(model_path)
+        model_version = registered_version(model)
+        if engine == 'flat':
+            model = FlatForest.from_sklearn(model)
+        elif engine != 'sklearn':
+            raise ValueError(f"Unknown scoring engine '{engine}'. Use 'sklearn' or 'flat'.")
+        elif n_jobs is not None:
+            model.set_params(n_jobs=n_jobs)
+        return cls(model, preprocessor, model_version=model_version)
+
+    def transform(self, df):
+        if self.profile_cache is not None:
+            df = self.profile_cache.enrich(df)
+        return self.preprocessor.transform(df)
+
+    def missing_inputs(self, columns):
+        # Model input columns a batch with `columns` lacks; profile features count as present when the
+        # profile cache can fill them by user_id
+        filled = set(self.profile_cache.features) if self.profile_cache is not None and 'user_id' in columns else set()
+        inputs = self.preprocessor.dense_inputs_ + self.preprocessor.time_inputs_ + self.preprocessor.categorical_inputs_
+        return [col for col in inputs if col not in columns and col not in filled]
+
+    def check_feature_coverage(self, columns, max_missing=DEFAULT_MAX_MISSING_FEATURES):
+        missing = self.missing_inputs(columns)
+        n_inputs = len(self.preprocessor.dense_inputs_) + len(self.preprocessor.time_inputs_) + len(self.preprocessor.categorical_inputs_)
+        if len(missing) > max_missing:
+            raise ValueError(f"Input is missing {len(missing)} of {n_inputs} model features ({', '.join(missing)}); "
+                             f"scores would be near-constant. Enrich the source (e.g. --profile-warmup) or raise --max-missing-features (currently {max_missing}).")
+        if missing:
+            print(f"WARNING: input is missing {len(missing)} of {n_inputs} model features, imputed with training defaults: {', '.join(missing)}")
+        return missing
+
+    def predict_matrix(self, X):
+        return self.model.predict_proba(X)[:, 1]
+
+    def attach_drift_monitor(self, sketch_path=DRIFT_SKETCH_FILE):
+        monitor = DriftMonitor.load(sketch_path)
+        if self.model_version is None or monitor.model_version is None:
+            print(f"WARNING: cannot verify that the drift sketches in {sketch_path} belong to the loaded model (model version unknown).")
+        elif monitor.model_version != self.model_version:
+            raise ValueError(f"Drift sketches in '{sketch_path}' are for model version {monitor.model_version}, "
+                             f"but the loaded model is version {self.model_version}. Retrain or refit the sketches.")
+        monitor.check_layout(self.preprocessor.feature_names_)
+        self.drift_monitor = monitor
+        # Counts already in the file belong to an earlier window; this run starts its own
+        self.drift_monitor.reset()
+        return self.drift_monitor
+
+    def score_frame(self, df):
+        X = self.transform(df)
+        scores = self.predict_matrix(X)
+        if self.drift_monitor is not None:
+            self.drift_monitor.update(X, scores)
+        return scores
+
+
+#---Chunked Input / Output---
+def _is_parquet(path):
+    return path.endswith('.parquet') or os.path.isdir(path)
+
+
+def _is_arrow_ipc(path):
+    return path.startswith('unix:') or path.endswith(('.arrows', '.arrow'))
+
+
+def iter_transaction_chunks(input_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    if _is_arrow_ipc(input_path):
+        # Record batches arrive already sized by the producer (e.g. the Rust ETL exporter)
+        from arrow_ipc import iter_ipc_frames
+        yield from iter_ipc_frames(input_path)
+    elif _is_parquet(input_path):
+        try:
+            import pyarrow.dataset as ds
+        except ImportError:
+            raise ImportError("Parquet input requires the 'pyarrow' package (pip install pyarrow).")
+        for batch in ds.dataset(input_path, format='parquet').to_batches(batch_size=chunk_rows):
+            if batch.num_rows:
+                yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(input_path, chunksize=chunk_rows)
+
+
+class _ScoreWriter:
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.parquet = output_path.endswith('.parquet')
+        self._writer = None
+        self._header_written = False
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.output_path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.output_path, mode='a' if self._header_written else 'w', header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def score_file(input_path, output_path=SCORES_OUTPUT_FILE, model_path=MODEL_FILE, preprocessor_path=PREPROCESSOR_OUTPUT_FILE,
+               chunk_rows=DEFAULT_CHUNK_ROWS, n_jobs=-1, id_columns=None, engine='sklearn', drift_path=None, drift_output=None,
+               profile_warmup=None, max_missing_features=DEFAULT_MAX_MISSING_FEATURES):
+    print(f"--- Starting batch scoring of {input_path} ---")
+    if not os.path.exists(input_path) and not input_path.startswith('unix:'):
+        raise FileNotFoundError(f"Input file '{input_path}' not found.")
+    scorer = RiskScorer.load(model_path, preprocessor_path, n_jobs=n_jobs, engine=engine)
+    print(f"Loaded model from {model_path} and preprocessor from {preprocessor_path} ({len(scorer.preprocessor.feature_names_)} features)")
+    id_columns = DEFAULT_ID_COLUMNS if id_columns is None else id_columns
+    if drift_path:
+        scorer.attach_drift_monitor(drift_path)
+        print(f"Monitoring drift against the sketches in {drift_path}")
+    if profile_warmup:
+        from profile_cache import UserProfileCache
+        scorer.profile_cache = UserProfileCache()
+        scorer.profile_cache.warm_up_from_file(profile_warmup)
+
+    writer = _ScoreWriter(output_path)
+    total_rows = 0
+    start = time.perf_counter()
+    try:
+        for chunk_index, chunk in enumerate(iter_transaction_chunks(input_path, chunk_rows)):
+            chunk_start = time.perf_counter()
+            if chunk_index == 0:
+                scorer.check_feature_coverage(chunk.columns, max_missing_features)
+            scores = scorer.score_frame(chunk)
+            out = chunk[[col for col in id_columns if col in chunk.columns]].copy()
+            out[SCORE_COLUMN] = scores
+            writer.write(out)
+            chunk_seconds = time.perf_counter() - chunk_start
+            total_rows += len(chunk)
+            print(f"Chunk {chunk_index + 1}: {len(chunk)} rows in {chunk_seconds:.3f}s "
+                  f"({len(chunk) / chunk_seconds:,.0f} rows/sec, total {total_rows})")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    rate = total_rows / elapsed if elapsed > 0 else float('inf')
+    print(f"Scored {total_rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec). Scores saved to {output_path}")
+    if scorer.drift_monitor is not None:
+        print_drift(scorer.drift_monitor)
+        print(f"Drift window saved to {scorer.drift_monitor.save(drift_output or window_path(drift_path))}")
+    return total_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a CSV, Parquet or Arrow IPC transaction file with the trained risk model.")
+    parser.add_argument('input', help="Transaction CSV file, Parquet file, partitioned Parquet directory, Arrow IPC stream (.arrows) or unix:/socket/path.")
+    parser.add_argument('--output', default=SCORES_OUTPUT_FILE, help="Output scores file (.csv or .parquet).")
+    parser.add_argument('--model', default=MODEL_FILE, help="Joblib model, or a memory-mapped .rmf model (always uses the flat engine).")
+    parser.add_argument('--preprocessor', default=PREPROCESSOR_OUTPUT_FILE)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Rows read and scored per chunk.")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="n_jobs used by predict_proba.")
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='sklearn', help="sklearn predict_proba or the flat array forest.")
+    parser.add_argument('--id-columns', default=','.join(DEFAULT_ID_COLUMNS), help="Comma-separated input columns copied to the output.")
+    parser.add_argument('--drift', nargs='?', const=DRIFT_SKETCH_FILE, default=None, metavar='SKETCH_FILE', help="Monitor drift against the sketches saved with the model and report PSI / KS drift.")
+    parser.add_argument('--drift-output', default=None, help="File this run's drift window is saved to (default: <SKETCH_FILE>.window.json; one file per worker, merged with drift_monitor.py).")
+    parser.add_argument('--profile-warmup', default=None, metavar='FILE', help="Fill per-user profile features missing from the input from this transaction file.")
+    parser.add_argument('--max-missing-features', type=int, default=DEFAULT_MAX_MISSING_FEATURES, help="Refuse inputs missing more model features than this.")
+    args = parser.parse_args()
+
+    score_file(
+        args.input, output_path=args.output, model_path=args.model, preprocessor_path=args.preprocessor,
+        chunk_rows=args.chunk_rows, n_jobs=args.n_jobs, id_columns=[c for c in args.id_columns.split(',') if c],
+        engine=args.engine, drift_path=args.drift, drift_output=args.drift_output,
+        profile_warmup=args.profile_warmup, max_missing_features=args.max_missing_features,
+    )
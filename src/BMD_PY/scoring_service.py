@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scoring import RiskScorer, MODEL_FILE, SCORE_COLUMN, DEFAULT_MAX_MISSING_FEATURES
+from preprocessing import PREPROCESSOR_OUTPUT_FILE
+from profile_cache import UserProfileCache, ProfileSnapshotLoader, latest_profiles, DEFAULT_CAPACITY, DEFAULT_TTL_SECONDS
+from drift_monitor import DRIFT_SKETCH_FILE, window_path
+
+#---Global Configuration---
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8088
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2.0
+LATENCY_WINDOW = 100_000 # Most recent request latencies kept for percentile reporting
+STATS_LOG_INTERVAL_S = 10.0
+DEFAULT_MAX_BODY_BYTES = 1 << 20 # Larger request bodies are refused with 413 before being read
+
+
+# Request latency and throughput counters exposed on /stats
+class ServiceStats:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started_at
+        latencies = np.fromiter(self.latencies_ms, dtype=np.float64)
+        p50, p99 = np.percentile(latencies, [50, 99]) if latencies.size else (0.0, 0.0)
+        return {
+            "uptime_s": round(elapsed, 3),
+            "requests": self.requests,
+            "rows_scored": self.rows,
+            "batches": self.batches,
+            "errors": self.errors,
+            "avg_batch_size": round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else 0.0,
+            "latency_p50_ms": round(float(p50), 3),
+            "latency_p99_ms": round(float(p99), 3),
+            "throughput_rows_per_s": round(self.rows / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+# Coalesces concurrent score requests into micro-batches. A batch is flushed when it reaches
+# max_batch_size rows or when max_wait_ms has passed since its first row arrived, and the batched
+# predict_proba runs in an executor so the event loop keeps accepting requests.
+class MicroBatcher:
+    def __init__(self, scorer, stats, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.scorer = scorer
+        self.stats = stats
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='risk-scorer')
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+
+    async def score(self, rows):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def _collect_batch(self):
+        first = await self.queue.get()
+        batch = [first]
+        size = len(first[0])
+        deadline = time.perf_counter() + self.max_wait_s
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _score_separately(self, batch):
+        # A failed micro-batch is retried one request at a time, so a malformed request only fails itself
+        loop = asyncio.get_running_loop()
+        for request_rows, future in batch:
+            try:
+                scores = await loop.run_in_executor(self.executor, self.scorer.score_frame, pd.DataFrame.from_records(request_rows))
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.stats.batches += 1
+            self.stats.batch_sizes.append(len(request_rows))
+            if not future.done():
+                future.set_result(scores.tolist())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            rows = [row for request_rows, _ in batch for row in request_rows]
+            try:
+                scores = await loop.run_in_executor(self.executor, self.scorer.score_frame, pd.DataFrame.from_records(rows))
+            except Exception as e:
+                if len(batch) == 1:
+                    if not batch[0][1].done():
+                        batch[0][1].set_exception(e)
+                    continue
+                await self._score_separately(batch)
+                continue
+            self.stats.batches += 1
+            self.stats.batch_sizes.append(len(rows))
+            offset = 0
+            for request_rows, future in batch:
+                if not future.done():
+                    future.set_result(scores[offset:offset + len(request_rows)].tolist())
+                offset += len(request_rows)
+
+
+#---Minimal HTTP/1.1 JSON Server---
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error'}
+
+
+def _http_response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    headers = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return headers.encode() + body
+
+
+# Raised for requests lacking too many model features to be scored meaningfully (answered with 422)
+class FeatureCoverageError(ValueError):
+    pass
+
+
+class RiskScoringService:
+    def __init__(self, scorer, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS, max_body_bytes=DEFAULT_MAX_BODY_BYTES,
+                 max_missing_features=DEFAULT_MAX_MISSING_FEATURES):
+        self.scorer = scorer
+        self.max_body_bytes = max_body_bytes
+        self.max_missing_features = max_missing_features
+        self.stats = ServiceStats()
+        self.batcher = MicroBatcher(scorer, self.stats, max_batch_size, max_wait_ms)
+
+    async def _score(self, body):
+        # Accepts one transaction object or a list of them
+        payload = json.loads(body)
+        rows = payload if isinstance(payload, list) else [payload]
+        if not rows or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("Expected a transaction object or a non-empty list of transaction objects.")
+        # Same guard score_file applies to file input: a feature counts as present only if every row carries it
+        missing = self.scorer.missing_inputs(set.intersection(*(set(row) for row in rows)))
+        if len(missing) > self.max_missing_features:
+            raise FeatureCoverageError(f"Request is missing {len(missing)} model features ({', '.join(missing)}); "
+                                       f"at most {self.max_missing_features} may be imputed.")
+        start = time.perf_counter()
+        scores = await self.batcher.score(rows)
+        self.stats.latencies_ms.append((time.perf_counter() - start) * 1000.0)
+        self.stats.requests += 1
+        self.stats.rows += len(rows)
+        return {SCORE_COLUMN: scores[0]} if isinstance(payload, dict) else {SCORE_COLUMN + 's': scores}
+
+    async def _route(self, method, path, body):
+        if path == '/score':
+            if method != 'POST':
+                return 405, {"error": "Use POST /score"}
+            try:
+                return 200, await self._score(body)
+            except FeatureCoverageError as e:
+                self.stats.errors += 1
+                return 422, {"error": str(e)}
+            except (ValueError, KeyError) as e:
+                self.stats.errors += 1
+                return 400, {"error": str(e)}
+            except Exception as e:
+                self.stats.errors += 1
+                return 500, {"error": str(e)}
+        if path == '/stats':
+            snapshot = self.stats.snapshot()
+            if self.scorer.profile_cache is not None:
+                snapshot["profile_cache"] = self.scorer.profile_cache.stats()
+            return 200, snapshot
+        if path == '/drift':
+            monitor = self.scorer.drift_monitor
+            if monitor is None:
+                return 404, {"error": "Drift monitoring is not enabled (start the service with --drift)."}
+            return 200, {"rows_seen": monitor.rows_seen, "window_started_at": monitor.window_started_at,
+                         "model_version": monitor.model_version, "features": monitor.drift()}
+        if path == '/health':
+            return 200, {"status": "ok"}
+        return 404, {"error": f"Unknown path {path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    writer.write(_http_response(400, {"error": "Malformed request line"}, False))
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    content_length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    content_length = -1
+                # The connection is closed after these errors since the unread body cannot be skipped reliably
+                if content_length < 0:
+                    self.stats.errors += 1
+                    writer.write(_http_response(400, {"error": "Invalid Content-Length header"}, False))
+                    break
+                if content_length > self.max_body_bytes:
+                    self.stats.errors += 1
+                    writer.write(_http_response(413, {"error": f"Request body exceeds {self.max_body_bytes} bytes"}, False))
+                    break
+                body = await reader.readexactly(content_length)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                status, payload = await self._route(method, path.split('?', 1)[0], body)
+                writer.write(_http_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _log_stats(self):
+        while True:
+            await asyncio.sleep(STATS_LOG_INTERVAL_S)
+            s = self.stats.snapshot()
+            if s["requests"]:
+                print(f"[stats] requests={s['requests']} p50={s['latency_p50_ms']}ms p99={s['latency_p99_ms']}ms "
+                      f"throughput={s['throughput_rows_per_s']} rows/s avg_batch={s['avg_batch_size']}")
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, drift_output=None):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        stats_task = asyncio.get_running_loop().create_task(self._log_stats())
+        print(f"Risk scoring service listening on http://{host}:{port} (POST /score, GET /stats, GET /drift, GET /health)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            stats_task.cancel()
+            await self.batcher.stop()
+            print(f"Final stats: {json.dumps(self.stats.snapshot())}")
+            if self.scorer.drift_monitor is not None and drift_output:
+                print(f"Drift window saved to {self.scorer.drift_monitor.save(drift_output)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local asyncio HTTP/JSON risk scoring service with adaptive micro-batching.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--model', default=MODEL_FILE)
+    parser.add_argument('--preprocessor', default=PREPROCESSOR_OUTPUT_FILE)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE, help="Maximum rows per micro-batch.")
+    parser.add_argument('--max-body-bytes', type=int, default=DEFAULT_MAX_BODY_BYTES, help="Largest accepted request body.")
+    parser.add_argument('--max-missing-features', type=int, default=DEFAULT_MAX_MISSING_FEATURES, help="Refuse requests (422) missing more model features than this.")
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS, help="Maximum time a request waits for its batch to fill.")
+    parser.add_argument('--n-jobs', type=int, default=1, help="n_jobs used by predict_proba (1 is fastest for small batches).")
+    parser.add_argument('--engine', choices=['sklearn', 'flat'], default='flat', help="Flat array forest is much faster for small batches.")
+    parser.add_argument('--profile-warmup', metavar='DATA_FILE', help="Enable the user profile cache and warm it up from this dataset.")
+    parser.add_argument('--profile-capacity', type=int, default=DEFAULT_CAPACITY, help="Maximum users held in the profile cache.")
+    parser.add_argument('--profile-ttl', type=float, default=DEFAULT_TTL_SECONDS, help="Seconds before a cached profile expires.")
+    parser.add_argument('--profile-reload', action='store_true', help="Answer profile cache misses from every user in --profile-warmup (memory grows with the number of users).")
+    parser.add_argument('--drift', nargs='?', const=DRIFT_SKETCH_FILE, default=None, metavar='SKETCH_FILE', help="Update drift sketches from scored requests (GET /drift).")
+    parser.add_argument('--drift-output', default=None, help="File the drift window is saved to on shutdown (default: <SKETCH_FILE>.window.json).")
+    args = parser.parse_args()
+
+    scorer = RiskScorer.load(args.model, args.preprocessor, n_jobs=args.n_jobs, engine=args.engine)
+    if args.profile_warmup:
+        if args.profile_reload:
+            profiles = latest_profiles(args.profile_warmup)
+            scorer.profile_cache = UserProfileCache(args.profile_capacity, args.profile_ttl, loader=ProfileSnapshotLoader(profiles))
+            print(f"Loaded {scorer.profile_cache.warm_up(profiles)} of {len(profiles)} user profiles from {args.profile_warmup}")
+        else:
+            scorer.profile_cache = UserProfileCache(args.profile_capacity, args.profile_ttl)
+            scorer.profile_cache.warm_up_from_file(args.profile_warmup)
+    if args.drift:
+        scorer.attach_drift_monitor(args.drift)
+    service = RiskScoringService(scorer, args.max_batch_size, args.max_wait_ms, args.max_body_bytes, args.max_missing_features)
+    try:
+        asyncio.run(service.serve(args.host, args.port, drift_output=args.drift_output or (window_path(args.drift) if args.drift else None)))
+    except KeyboardInterrupt:
+        print("\nRisk scoring service stopped.")
@@ -0,0 +1,163 @@
+//Arrow IPC export of ETL transaction batches
+
+use super::{batch::TransactionBatch, transaction::Transaction};
+use anyhow::Result;
+use arrow_array::{
+    builder::StringDictionaryBuilder, types::Int32Type, ArrayRef, BinaryArray, BooleanArray, Float64Array,
+    RecordBatch, StringArray,
+};
+use arrow_ipc::writer::StreamWriter;
+use arrow_schema::{DataType, Field, Schema, SchemaRef};
+use std::fs::File;
+use std::io::{BufWriter, Write};
+use std::sync::Arc;
+
+//Arrow schema of exported transactions; the Python reader (BMD_PY/arrow_ipc.py) maps these
+//columns onto the risk model's feature names
+pub fn transaction_schema() -> SchemaRef {
+    Arc::new(Schema::new(vec![
+        Field::new("id", DataType::Utf8, false),
+        Field::new("source_account", DataType::Utf8, false),
+        Field::new("target_account", DataType::Utf8, false),
+        Field::new("amount", DataType::Float64, false),
+        //Few distinct currencies: dictionary-encoded, read as a pandas categorical
+        Field::new("currency", DataType::Dictionary(Box::new(DataType::Int32), Box::new(DataType::Utf8)), false),
+        Field::new("validated", DataType::Boolean, false),
+        Field::new("encrypted_payload", DataType::Binary, false),
+    ]))
+}
+
+//Builds one columnar record batch from a slice of transactions
+pub fn to_record_batch<'a>(transactions: impl IntoIterator<Item = &'a Transaction>) -> Result<RecordBatch> {
+    let transactions: Vec<&Transaction> = transactions.into_iter().collect();
+    let mut currency = StringDictionaryBuilder::<Int32Type>::new();
+    for txn in &transactions {
+        currency.append_value(&txn.currency);
+    }
+
+    let columns: Vec<ArrayRef> = vec![
+        Arc::new(StringArray::from_iter_values(transactions.iter().map(|t| t.id.as_str()))),
+        Arc::new(StringArray::from_iter_values(transactions.iter().map(|t| t.source_account.as_str()))),
+        Arc::new(StringArray::from_iter_values(transactions.iter().map(|t| t.target_account.as_str()))),
+        Arc::new(Float64Array::from_iter_values(transactions.iter().map(|t| t.amount))),
+        Arc::new(currency.finish()),
+        Arc::new(BooleanArray::from(transactions.iter().map(|t| t.validated).collect::<Vec<bool>>())),
+        Arc::new(BinaryArray::from_iter_values(transactions.iter().map(|t| t.encrypted_payload.as_slice()))),
+    ];
+    Ok(RecordBatch::try_new(transaction_schema(), columns)?)
+}
+
+//Streams record batches in the Arrow IPC stream format to any writer: a file (memory-mapped by the
+//reader, or placed on /dev/shm for a shared-memory handoff) or a Unix socket the scorer listens on
+pub struct ArrowBatchExporter<W: Write> {
+    writer: StreamWriter<W>,
+    batches_written: usize,
+    rows_written: usize,
+}
+
+impl<W: Write> ArrowBatchExporter<W> {
+    pub fn new(sink: W) -> Result<Self> {
+        Ok(Self {
+            writer: StreamWriter::try_new(sink, &transaction_schema())?,
+            batches_written: 0,
+            rows_written: 0,
+        })
+    }
+
+    //Writes the given transactions as one record batch
+    pub fn write_transactions<'a>(&mut self, transactions: impl IntoIterator<Item = &'a Transaction>) -> Result<()> {
+        let batch = to_record_batch(transactions)?;
+        if batch.num_rows() == 0 {
+            return Ok(());
+        }
+        self.writer.write(&batch)?;
+        self.batches_written += 1;
+        self.rows_written += batch.num_rows();
+        Ok(())
+    }
+
+    //Writes the current contents of a TransactionBatch without draining it
+    pub fn write_batch(&mut self, batch: &TransactionBatch) -> Result<()> {
+        self.write_transactions(batch.iter())
+    }
+
+    pub fn batches_written(&self) -> usize {
+        self.batches_written
+    }
+
+    pub fn rows_written(&self) -> usize {
+        self.rows_written
+    }
+
+    //Writes the end-of-stream marker and flushes the sink
+    pub fn finish(mut self) -> Result<()> {
+        self.writer.finish()?;
+        self.writer.get_mut().flush()?;
+        Ok(())
+    }
+}
+
+//Exporter over a type-erased sink, as taken by ETLPipeline::with_arrow_export
+pub type BoxedArrowExporter = ArrowBatchExporter<Box<dyn Write + Send>>;
+
+impl BoxedArrowExporter {
+    pub fn to_file(path: &str) -> Result<Self> {
+        Self::new(Box::new(BufWriter::new(File::create(path)?)))
+    }
+
+    //Connects to a scorer listening on `path` (python arrow_ipc.py --score unix:<path>)
+    #[cfg(unix)]
+    pub fn to_unix_socket(path: &str) -> Result<Self> {
+        Self::new(Box::new(BufWriter::new(std::os::unix::net::UnixStream::connect(path)?)))
+    }
+}
+
+//Unit tests
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use arrow_ipc::reader::StreamReader;
+    use std::io::Cursor;
+
+    #[test]
+    fn test_arrow_stream_round_trip() {
+        let mut transactions = vec![
+            Transaction::new("SRC_1".to_string(), "DST_1".to_string(), 100.0, "USD".to_string()),
+            Transaction::new("SRC_2".to_string(), "DST_2".to_string(), 200.0, "EUR".to_string()),
+            Transaction::new("SRC_3".to_string(), "DST_3".to_string(), 300.0, "USD".to_string()),
+        ];
+        transactions[1].encrypted_payload = vec![1, 2, 3];
+
+        let mut buffer = Vec::new();
+        let mut exporter = ArrowBatchExporter::new(&mut buffer).unwrap();
+        exporter.write_transactions(&transactions[..2]).unwrap();
+        exporter.write_transactions(&transactions[2..]).unwrap();
+        assert_eq!(exporter.batches_written(), 2);
+        assert_eq!(exporter.rows_written(), 3);
+        exporter.finish().unwrap();
+
+        let reader = StreamReader::try_new(Cursor::new(buffer), None).unwrap();
+        assert_eq!(reader.schema(), transaction_schema());
+        let batches: Vec<RecordBatch> = reader.map(|batch| batch.unwrap()).collect();
+        assert_eq!(batches.len(), 2);
+        let amounts = batches[0].column(3).as_any().downcast_ref::<Float64Array>().unwrap();
+        assert_eq!(amounts.values().to_vec(), vec![100.0, 200.0]);
+        let payloads = batches[0].column(6).as_any().downcast_ref::<BinaryArray>().unwrap();
+        assert_eq!(payloads.value(1), &[1, 2, 3]);
+    }
+
+    #[test]
+    fn test_file_export_round_trip() {
+        let path = std::env::temp_dir().join(format!("etl_export_{}.arrows", std::process::id()));
+        let transactions = vec![Transaction::new("SRC_1".to_string(), "DST_1".to_string(), 100.0, "PLN".to_string())];
+
+        let mut exporter = BoxedArrowExporter::to_file(path.to_str().unwrap()).unwrap();
+        exporter.write_transactions(&transactions).unwrap();
+        exporter.finish().unwrap();
+
+        let reader = StreamReader::try_new(File::open(&path).unwrap(), None).unwrap();
+        let rows: usize = reader.map(|batch| batch.unwrap().num_rows()).sum();
+        assert_eq!(rows, 1);
+        std::fs::remove_file(&path).unwrap();
+    }
+}
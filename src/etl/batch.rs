@@ -81,6 +81,11 @@ impl TransactionBatch {
     pub fn current_size(&self) -> usize {
         self.transactions.len()
     }
+
+    //Iterates over the queued transactions in insertion order without removing them
+    pub fn iter(&self) -> impl Iterator<Item = &Transaction> {
+        self.transactions.iter()
+    }
 }
 
 //Unit tests
@@ -18,6 +18,7 @@ pub struct BatchMetrics {
     pub start_time: Option<DateTime<Utc>>,
     pub end_time: Option<DateTime<Utc>>,
     pub average_batch_duration: Duration,
+    pub export_error: Option<String>,
 }
 
 impl BatchMetrics {
@@ -3,6 +3,8 @@ pub mod transaction;  //Transaction processing and validation
 pub mod batch;       //Batch operations handling
 pub mod metrics;     //Performance and operational metrics
 pub mod pipeline;    //ETL pipeline implementation
+#[cfg(feature = "arrow_ipc")]
+pub mod arrow_export; //Arrow IPC record batch export for the Python risk scorer
 
 //Private modules
 mod etl_tests;      //Internal testing utilities
\ No newline at end of file
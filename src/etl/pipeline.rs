@@ -14,6 +14,8 @@ use std::time::Instant;
 use indicatif::{ProgressBar, ProgressStyle};
 use std::sync::Arc;
 use chrono::Utc;
+#[cfg(feature = "arrow_ipc")]
+use super::arrow_export::BoxedArrowExporter;
 
 //Returns current timestamp in formatted string
 fn get_formatted_timestamp() -> String {
@@ -27,6 +29,8 @@ pub struct ETLPipeline {
     public_key: Box<dyn PublicKey>,
     processed_count: usize,
     failed_count: usize,
+    #[cfg(feature = "arrow_ipc")]
+    arrow_exporter: Option<BoxedArrowExporter>,
 }
 
 impl ETLPipeline {
@@ -38,9 +42,45 @@ impl ETLPipeline {
             public_key: Box::new(public_key),
             processed_count: 0,
             failed_count: 0,
+            #[cfg(feature = "arrow_ipc")]
+            arrow_exporter: None,
         }
     }
 
+    //Streams every validated transaction as Arrow record batches of `batch_size` rows
+    #[cfg(feature = "arrow_ipc")]
+    pub fn with_arrow_export(mut self, exporter: BoxedArrowExporter) -> Self {
+        self.arrow_exporter = Some(exporter);
+        self
+    }
+
+    //Writes buffered transactions as one record batch. Export is optional, so a failing sink is logged,
+    //recorded in the metrics and dropped instead of aborting the pipeline.
+    #[cfg(feature = "arrow_ipc")]
+    fn export_buffered(&mut self, buffer: &mut Vec<Transaction>, metrics: &mut BatchMetrics) {
+        if buffer.is_empty() {
+            return;
+        }
+        let result = match self.arrow_exporter.as_mut() {
+            Some(exporter) => exporter.write_transactions(buffer.iter()),
+            None => Ok(()),
+        };
+        buffer.clear();
+        if let Err(e) = result {
+            self.disable_arrow_export(e, metrics);
+        }
+    }
+
+    #[cfg(feature = "arrow_ipc")]
+    fn disable_arrow_export(&mut self, error: anyhow::Error, metrics: &mut BatchMetrics) {
+        println!("\n[Arrow Export Failed]");
+        println!("-> Time: {}", get_formatted_timestamp());
+        println!("-> Error: {}", error);
+        println!("-> Export disabled; continuing ETL processing");
+        metrics.export_error = Some(error.to_string());
+        self.arrow_exporter = None;
+    }
+
     //Processes a vector of transactions asynchronously with progress tracking
     pub async fn process_transactions(&mut self, transactions: Vec<Transaction>) -> Result<BatchMetrics> {
         println!("\n[Starting ETL Pipeline]");
@@ -83,11 +123,22 @@ impl ETLPipeline {
         let mut processed = 0;
         let mut failed = 0;
 
+        #[cfg(feature = "arrow_ipc")]
+        let mut export_buffer: Vec<Transaction> = Vec::with_capacity(self.batch_size);
+
         while let Some(mut transaction) = rx.recv().await {
             if transaction.validate() {
                 processed += 1;
                 self.processed_count += 1;
                 metrics.processed_transactions += 1;
+
+                #[cfg(feature = "arrow_ipc")]
+                if self.arrow_exporter.is_some() {
+                    export_buffer.push(transaction);
+                    if export_buffer.len() >= self.batch_size {
+                        self.export_buffered(&mut export_buffer, &mut metrics);
+                    }
+                }
             } else {
                 failed += 1;
                 self.failed_count += 1;
@@ -104,6 +155,18 @@ impl ETLPipeline {
             ));
         }
 
+        #[cfg(feature = "arrow_ipc")]
+        {
+            self.export_buffered(&mut export_buffer, &mut metrics);
+            if let Some(exporter) = self.arrow_exporter.take() {
+                let (rows, batches) = (exporter.rows_written(), exporter.batches_written());
+                match exporter.finish() {
+                    Ok(()) => println!("-> Arrow export: {} rows in {} record batches", rows, batches),
+                    Err(e) => self.disable_arrow_export(e, &mut metrics),
+                }
+            }
+        }
+
         pb.finish_with_message(format!(
             "Processing completed! Processed: {} | Failed: {} | Time: {:?}",
             processed,
@@ -25,6 +25,9 @@ pub use etl::{
     pipeline::ETLPipeline
 };
 
+#[cfg(feature = "arrow_ipc")]
+pub use etl::arrow_export::{ArrowBatchExporter, BoxedArrowExporter};
+
 //Library version
 pub const VERSION: &str = env!("CARGO_PKG_VERSION");
 